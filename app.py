@@ -1,6 +1,7 @@
 # app.py
-from flask import Flask, request, render_template, abort
-from config import QR_SECRET_KEY
+import hmac
+from flask import Flask, request, render_template, abort, jsonify
+from config import QR_SECRET_KEY, NUMERADOR_TOKEN
 from utils.qr_utils import verify_qr_params
 
 app = Flask(__name__, template_folder="Templates")
@@ -22,6 +23,26 @@ def recibo():
 
     return render_template("recibo.html", datos=data_or_err)
 
+@app.route("/api/numero", methods=["POST"])
+def api_numero():
+    """Asigna el próximo número del PV pedido (ver utils/numerador.py)."""
+    from utils.numerador import asignar, LOCALES
+
+    if NUMERADOR_TOKEN:
+        if not hmac.compare_digest(request.headers.get("X-Numerador-Token", ""), NUMERADOR_TOKEN):
+            return jsonify(error="Token inválido."), 403
+    elif request.remote_addr not in LOCALES:
+        return jsonify(error="Sin RECIBOS_NUMERADOR_TOKEN sólo se atienden pedidos de esta PC."), 403
+    body = request.get_json(silent=True) or {}
+    clave = body.get("clave")
+    try:
+        numero = asignar(body.get("pv"), clave=str(clave) if clave else None)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except TimeoutError as e:
+        return jsonify(error=str(e)), 503
+    return jsonify(numero=numero)
+
 @app.errorhandler(400)
 def bad_request(e):
     return f"<h1>Solicitud inválida</h1><p>{e.description}</p>", 400
@@ -22,11 +22,45 @@ RECIBOS_DIR = DATA_DIR / "recibos"
 DB_DIR      = DATA_DIR / "db"
 LOGS_DIR    = DATA_DIR / "logs"
 
+# Datos propios de esta PC, fuera del share (PV de la estación, cachés locales)
+def _pick_local():
+    env = os.getenv("RECIBOS_LOCAL_DIR")
+    if env:
+        return Path(env)
+    base = os.getenv("LOCALAPPDATA")
+    return Path(base) / "RecibosDigitales" if base else Path.home() / ".recibos_digitales"
+
+LOCAL_DIR = _pick_local()
+
 # Donde se guardan los PDFs
 SALIDA_DIR = RECIBOS_DIR
 
-# Contador centralizado
+# Contador centralizado: un contador_<PV>.json por punto de venta en DB_DIR.
+# contador_recibos.json es el contador único anterior (se migra solo).
 CONTADOR_PATH = DB_DIR / "contador_recibos.json"
+# Libro de recibos emitidos (utils/libro_recibos.py)
+RECIBOS_DB = DB_DIR / "recibos.db"
+# Planilla de historial: copia que se genera desde el libro (--planilla)
+HISTORIAL_XLSX = Path(os.getenv("RECIBOS_HISTORIAL_XLSX") or DATA_DIR / "historial" / "recibos.xlsx")
+# Lock del contador: espera máxima y vencimiento de un lock huérfano (segundos)
+CONTADOR_LOCK_TIMEOUT_S = float(os.getenv("RECIBOS_LOCK_TIMEOUT_S", "15"))
+CONTADOR_LOCK_LEASE_S   = float(os.getenv("RECIBOS_LOCK_LEASE_S", "30"))
+# Servicio de numeración (POST /api/numero en app.py). Si se define la URL,
+# las estaciones piden el número ahí y sólo usan el lock del share si no responde.
+NUMERADOR_URL       = os.getenv("RECIBOS_NUMERADOR_URL") or None   # ej: http://192.168.1.80:5000
+NUMERADOR_TIMEOUT_S = float(os.getenv("RECIBOS_NUMERADOR_TIMEOUT_S", "2"))
+NUMERADOR_TOKEN     = os.getenv("RECIBOS_NUMERADOR_TOKEN") or None
+
+# SQLite (utils/db.py): espera ante una base bloqueada por otra estación y
+# modo WAL para las bases compartidas ("auto": nunca en el share, ver db.py)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("RECIBOS_SQLITE_BUSY_MS", "10000"))
+SQLITE_WAL = os.getenv("RECIBOS_SQLITE_WAL", "auto")   # auto | 1 | 0
+# Copia local de clientes.db en LOCAL_DIR para las búsquedas (utils/clientes.py)
+CLIENTES_REPLICA   = os.getenv("RECIBOS_CLIENTES_REPLICA", "1") == "1"
+CLIENTES_REPLICA_S = float(os.getenv("RECIBOS_CLIENTES_REPLICA_S", "60"))
+# Aviso de posible duplicado al generar: mismo cliente e importe con fecha
+# hasta N días antes o después (0 = misma fecha)
+DUPLICADO_DIAS = int(os.getenv("RECIBOS_DUPLICADO_DIAS", "0"))
 
 # Assets (junto al .exe / código)
 def _app_dir():
@@ -42,6 +76,7 @@ LOGO_PATH = None
 FIRMA_ENABLED = True
 FIRMA_PATH_DEFAULT = str(ASSETS_DIR / "firma.png")
 FIRMA_WIDTH_MM, FIRMA_X_MM, FIRMA_Y_MM = 42, 150, 28
+FIRMA_DPI = 300   # resolución máxima de la firma en modo compacto
 
 # QR
 QR_ERROR_CORRECTION, QR_BOX_SIZE, QR_BORDER, QR_TARGET_SIZE_MM = "L", 10, 2, 45
@@ -50,10 +85,21 @@ BASE_QR_URL  = os.getenv("BASE_QR_URL", "http://192.168.1.80:5000/recibo")
 QR_SECRET_KEY = os.getenv("QR_SECRET_KEY", "solo-para-pruebas-locales-cambiar")
 FLASK_DEBUG   = os.getenv("FLASK_DEBUG", "1") == "1"
 
+# Motor de render del PDF: "merge" (PyPDF2) o "xobject" (una pasada de reportlab, requiere pdfrw)
+PDF_MOTOR = os.getenv("RECIBOS_PDF_MOTOR", "merge")
+# Modo compacto: firma reescalada, streams comprimidos y objetos duplicados unificados
+PDF_COMPACTO = os.getenv("RECIBOS_PDF_COMPACTO", "0") == "1"
+
+# Carpeta opcional para guardar en disco la plantilla base (plantilla + capa estática)
+PLANTILLA_CACHE_DIR = os.getenv("RECIBOS_PLANTILLA_CACHE_DIR") or None
+
+# Tiempos por etapa de cada recibo en el log (utils/metricas.py)
+METRICAS = os.getenv("RECIBOS_METRICAS", "0") == "1"
+
 # Tabla forma de pago
 FP_MAX_ROWS = 6
 FP_OVERFLOW_MODE = "resumen"
 
 # Asegurar estructura de datos
-for d in (RECIBOS_DIR, DB_DIR, LOGS_DIR):
+for d in (RECIBOS_DIR, DB_DIR, LOGS_DIR, LOCAL_DIR):
     d.mkdir(parents=True, exist_ok=True)
@@ -11,6 +11,7 @@ from reportlab.lib.pagesizes import A4
 
 from config import SALIDA_DIR, LOGO_PATH, FIRMA_PATH_DEFAULT  # SALIDA_DIR debe existir en config.py
 from utils.recibo_utils import marcar_anulado
+from utils.pdf_generator import dibujo_reportlab
 
 PATRON_NUM_COMPLETO = re.compile(r"^\d{4}-\d{8}$")  # 0001-00000001
 
@@ -67,7 +68,7 @@ def _anular_seleccion(lista):
 
     if numero:
         try:
-            marcar_anulado(numero)
+            marcar_anulado(numero, destino)
         except Exception:
             pass
 
@@ -81,18 +82,19 @@ def _crear_pdf_anulado(origen: Path, destino: Path):
     """Superpone sello 'ANULADO' en todas las páginas del PDF origen y guarda en destino."""
     # Marca de agua en memoria (A4, centrada)
     packet = io.BytesIO()
-    c = canvas.Canvas(packet, pagesize=A4)
-    w, h = A4
-    c.setFont("Helvetica-Bold", 120)
-    try:
-        c.setFillAlpha(0.30)
-    except Exception:
-        pass
-    c.setFillColorRGB(0.85, 0, 0)
-    c.translate(w/2, h/2)
-    c.rotate(30)
-    c.drawCentredString(0, 0, "ANULADO")
-    c.save()
+    with dibujo_reportlab():
+        c = canvas.Canvas(packet, pagesize=A4)
+        w, h = A4
+        c.setFont("Helvetica-Bold", 120)
+        try:
+            c.setFillAlpha(0.30)
+        except Exception:
+            pass
+        c.setFillColorRGB(0.85, 0, 0)
+        c.translate(w/2, h/2)
+        c.rotate(30)
+        c.drawCentredString(0, 0, "ANULADO")
+        c.save()
     packet.seek(0)
 
     marca = PdfReader(packet)
@@ -1,50 +1,215 @@
+import logging
+import queue
+import sqlite3
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
-from pathlib import Path
-import openpyxl
 
-HISTORIAL_PATH = Path("historial/recibos.xlsx")
+from utils import libro_recibos
+
+logger = logging.getLogger("recibos")
+
+POR_PAGINA = 100
+DEBOUNCE_MS = 200
+_TECLAS_SIN_TEXTO = {"Return", "KP_Enter", "Tab", "Up", "Down", "Left", "Right", "Home", "End",
+                     "Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R"}
+COLUMNAS = [
+    # (clave, título, ancho, alineación)
+    ("numero", "Número", 120, "w"),
+    ("fecha", "Fecha", 85, "center"),
+    ("cliente", "Cliente", 260, "w"),
+    ("cuit", "CUIT", 110, "w"),
+    ("total", "Total", 95, "e"),
+    ("estado", "Estado", 80, "center"),
+]
+
+
+def _importe(s):
+    """'1.234,50' / '1234.5' → float; None si está vacío o no es un número."""
+    s = (s or "").strip().replace(" ", "").replace("$", "")
+    if not s:
+        return None
+    if "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return None
 
 
 def crear_pestana_buscar(tabs):
     frame = ttk.Frame(tabs)
     tabs.add(frame, text="🔍 Buscar / Editar")
 
-    ttk.Label(frame, text="Buscar por:").grid(row=0, column=0, sticky="w", pady=5)
-    criterio = ttk.Combobox(frame, values=["Número", "Cliente", "Fecha"])
-    criterio.grid(row=0, column=1)
-    entrada = ttk.Entry(frame, width=30)
-    entrada.grid(row=0, column=2)
+    # ---- Filtros ----
+    filtros = ttk.Frame(frame)
+    filtros.grid(row=0, column=0, sticky="we", pady=5)
+    ttk.Label(filtros, text="Número, cliente o CUIT:").grid(row=0, column=0, sticky="e", padx=4)
+    entrada = ttk.Entry(filtros, width=36)
+    entrada.grid(row=0, column=1, columnspan=3, sticky="w")
 
-    resultados = tk.Listbox(frame, width=80)
-    resultados.grid(row=1, column=0, columnspan=3, pady=10)
+    ttk.Label(filtros, text="Desde (DD/MM/AAAA):").grid(row=1, column=0, sticky="e", padx=4)
+    ent_desde = ttk.Entry(filtros, width=12)
+    ent_desde.grid(row=1, column=1, sticky="w")
+    ttk.Label(filtros, text="Hasta:").grid(row=1, column=2, sticky="e", padx=4)
+    ent_hasta = ttk.Entry(filtros, width=12)
+    ent_hasta.grid(row=1, column=3, sticky="w")
 
-    def buscar():
-        resultados.delete(0, tk.END)
-        if not HISTORIAL_PATH.exists():
-            messagebox.showwarning("Sin historial", "No se encontró historial para buscar.")
-            return
+    ttk.Label(filtros, text="Importe desde ($):").grid(row=2, column=0, sticky="e", padx=4)
+    ent_min = ttk.Entry(filtros, width=12)
+    ent_min.grid(row=2, column=1, sticky="w")
+    ttk.Label(filtros, text="Hasta ($):").grid(row=2, column=2, sticky="e", padx=4)
+    ent_max = ttk.Entry(filtros, width=12)
+    ent_max.grid(row=2, column=3, sticky="w")
+
+    ttk.Label(filtros, text="Estado:").grid(row=0, column=4, sticky="e", padx=4)
+    cmb_estado = ttk.Combobox(filtros, values=["Todos", *libro_recibos.ESTADOS], state="readonly", width=11)
+    cmb_estado.set("Todos")
+    cmb_estado.grid(row=0, column=5, sticky="w")
+
+    # ---- Resultados ----
+    tabla = ttk.Frame(frame)
+    tabla.grid(row=1, column=0, sticky="nsew", padx=4)
+    frame.rowconfigure(1, weight=1)
+    frame.columnconfigure(0, weight=1)
+    arbol = ttk.Treeview(tabla, columns=[c[0] for c in COLUMNAS], show="headings", height=16, selectmode="browse")
+    for clave, titulo, ancho, alinear in COLUMNAS:
+        arbol.heading(clave, text=titulo)
+        arbol.column(clave, width=ancho, anchor=alinear, stretch=(clave == "cliente"))
+    barra = ttk.Scrollbar(tabla, orient="vertical", command=arbol.yview)
+    arbol.configure(yscrollcommand=barra.set)
+    arbol.grid(row=0, column=0, sticky="nsew")
+    barra.grid(row=0, column=1, sticky="ns")
+    tabla.rowconfigure(0, weight=1)
+    tabla.columnconfigure(0, weight=1)
+
+    pie = ttk.Frame(frame)
+    pie.grid(row=2, column=0, sticky="we", pady=6)
+    btn_ant = ttk.Button(pie, text="◀ Anterior", state="disabled")
+    btn_ant.pack(side="left", padx=4)
+    btn_sig = ttk.Button(pie, text="Siguiente ▶", state="disabled")
+    btn_sig.pack(side="left", padx=4)
+    estado_var = tk.StringVar(value="")
+    ttk.Label(pie, textvariable=estado_var).pack(side="left", padx=10)
 
-        libro = openpyxl.load_workbook(HISTORIAL_PATH)
-        hoja = libro.active
+    # ---- Consultas en segundo plano ----
+    # Cada pedido lleva un número de generación; una tecla nueva sube la
+    # generación, corta la consulta en curso (interrupt) y las respuestas
+    # viejas se descartan. La UI lee las respuestas con after().
+    pedidos = queue.Queue()
+    respuestas = queue.Queue()
+    st = {"gen": 0, "pagina": 0, "after": None, "cx": None, "ocupado": False}
+    st_lock = threading.Lock()
 
-        campo = criterio.get()
-        valor = entrada.get().lower()
+    def _worker():
+        while True:
+            gen, params, pagina = pedidos.get()
+            try:
+                while True:   # sólo importa el último pedido
+                    gen, params, pagina = pedidos.get_nowait()
+            except queue.Empty:
+                pass
+            with st_lock:
+                if gen != st["gen"]:
+                    continue
+                st["ocupado"] = True
+            try:
+                st["cx"] = libro_recibos.conexion()
+                filas = libro_recibos.buscar_recibos(
+                    **params, limite=POR_PAGINA + 1, saltear=pagina * POR_PAGINA)
+                respuestas.put((gen, pagina, filas, None))
+            except sqlite3.OperationalError as e:
+                if "interrupt" not in str(e):
+                    logger.exception("Error buscando recibos")
+                    respuestas.put((gen, pagina, None, str(e)))
+            except Exception as e:
+                logger.exception("Error buscando recibos")
+                respuestas.put((gen, pagina, None, str(e)))
+            finally:
+                with st_lock:
+                    st["ocupado"] = False
 
-        col_map = {"Número": 0, "Cliente": 1, "Fecha": 2}
-        idx = col_map.get(campo)
+    threading.Thread(target=_worker, daemon=True, name="buscar-recibos").start()
 
-        for fila in hoja.iter_rows(min_row=2, values_only=True):
-            if valor in str(fila[idx]).lower():
-                resultados.insert(tk.END, " | ".join(str(c) for c in fila))
+    def _parametros():
+        estado = cmb_estado.get()
+        return {
+            "texto": entrada.get(),
+            "desde": ent_desde.get().strip() or None,
+            "hasta": ent_hasta.get().strip() or None,
+            "minimo": _importe(ent_min.get()),
+            "maximo": _importe(ent_max.get()),
+            "estado": None if estado == "Todos" else estado,
+        }
 
-    ttk.Button(frame, text="Buscar", command=buscar).grid(row=0, column=3, padx=5)
+    def buscar(pagina=0):
+        if st["after"]:
+            frame.after_cancel(st["after"])
+            st["after"] = None
+        with st_lock:
+            st["gen"] += 1
+            if st["ocupado"] and st["cx"] is not None:
+                st["cx"].interrupt()
+            gen = st["gen"]
+        estado_var.set("Buscando…")
+        pedidos.put((gen, _parametros(), pagina))
+
+    def _al_escribir(e=None):
+        # una consulta por pausa al tipear, no por tecla
+        if e is not None and e.keysym in _TECLAS_SIN_TEXTO:
+            return
+        if st["after"]:
+            frame.after_cancel(st["after"])
+        st["after"] = frame.after(DEBOUNCE_MS, buscar)
+
+    def _mostrar(pagina, filas):
+        arbol.delete(*arbol.get_children())
+        hay_mas = len(filas) > POR_PAGINA
+        for r in filas[:POR_PAGINA]:
+            arbol.insert("", "end", iid=r["numero"], values=(
+                r["numero"], r["fecha"], r["cliente"], r["cuit"], f"{r['total'] or 0:,.2f}", r["estado"]))
+        st["pagina"] = pagina
+        btn_ant.configure(state="normal" if pagina > 0 else "disabled")
+        btn_sig.configure(state="normal" if hay_mas else "disabled")
+        if not filas:
+            estado_var.set("Sin resultados")
+        else:
+            desde = pagina * POR_PAGINA + 1
+            estado_var.set(f"Página {pagina + 1} · recibos {desde}–{desde + min(len(filas), POR_PAGINA) - 1}")
+
+    def _revisar_respuestas():
+        try:
+            while True:
+                gen, pagina, filas, error = respuestas.get_nowait()
+                if gen != st["gen"]:
+                    continue   # la pisó una búsqueda más nueva
+                if error:
+                    estado_var.set("")
+                    messagebox.showerror("Error al buscar", error)
+                else:
+                    _mostrar(pagina, filas)
+        except queue.Empty:
+            pass
+        frame.after(50, _revisar_respuestas)
+
+    frame.after(50, _revisar_respuestas)
+
+    for ent in (entrada, ent_desde, ent_hasta, ent_min, ent_max):
+        ent.bind("<KeyRelease>", _al_escribir)
+        ent.bind("<Return>", lambda _e: buscar())
+    cmb_estado.bind("<<ComboboxSelected>>", lambda _e: buscar())
+    btn_ant.configure(command=lambda: buscar(st["pagina"] - 1))
+    btn_sig.configure(command=lambda: buscar(st["pagina"] + 1))
+    ttk.Button(filtros, text="Buscar", command=buscar).grid(row=0, column=6, padx=5)
 
     def editar():
-        seleccion = resultados.get(tk.ACTIVE)
+        seleccion = arbol.selection()
         if not seleccion:
             messagebox.showinfo("Seleccionar", "Seleccioná un recibo para editar.")
             return
         messagebox.showinfo("Edición", "Funcionalidad de edición pendiente de implementación.")
 
-    ttk.Button(frame, text="Editar seleccionado", command=editar).grid(row=2, column=0, columnspan=3, pady=10)
+    ttk.Button(pie, text="Editar seleccionado", command=editar).pack(side="right", padx=4)
+
+    # últimos recibos al abrir
+    buscar()
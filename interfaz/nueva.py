@@ -1,15 +1,24 @@
 # interfaz/nueva.py
+import logging
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 from pathlib import Path
 from utils.qr_utils import build_qr_data
-from config import BASE_QR_URL, QR_SECRET_KEY, SALIDA_DIR, ASSETS_DIR
+from config import BASE_QR_URL, QR_SECRET_KEY, SALIDA_DIR, ASSETS_DIR, CLIENTES_REPLICA_S, DUPLICADO_DIAS
 import re
-from utils.clientes import init_db, buscar_por_nombre_o_cuit, upsert_cliente
+from utils.clientes import init_db, buscar_por_nombre_o_cuit, upsert_cliente, sincronizar_replica
+from utils import indice_clientes
 from utils.helpers import validar_fecha_no_futura
-from utils.recibo_utils import posible_duplicado
+from utils.recibo_utils import buscar_duplicados, nombre_pdf
 from utils.pdf_generator import generar_pdf
 from utils.contador import ver_numero_siguiente, incrementar_contador
+from utils.metricas import etapa, medir_recibo
+from utils import libro_recibos
+
+logger = logging.getLogger("recibos")
 
 # Rutas/constantes 
 
@@ -21,9 +30,29 @@ def crear_pestana_nueva(tabs: ttk.Notebook):
     frame = ttk.Frame(tabs)
     tabs.add(frame, text="🧾 Nuevo Recibo")
 
-    # Base de clientes (para autocompletado)
+    # Base de clientes (para autocompletado): réplica local al día e índice
+    # en memoria de sugerencias, en segundo plano
     init_db()
 
+    def _clientes_en_segundo_plano():
+        # Un error (share caído, base bloqueada) no corta el hilo: se reintenta
+        # en la vuelta siguiente, y el índice hasta que se pueda cargar
+        cargado = False
+        while True:
+            try:
+                sincronizar_replica()   # lo nuevo también entra al índice
+            except Exception:
+                logger.exception("No se pudo sincronizar la réplica de clientes")
+            if not cargado:
+                try:
+                    indice_clientes.cargar()
+                    cargado = True
+                except Exception:
+                    logger.exception("No se pudo cargar el índice de sugerencias de clientes")
+            time.sleep(CLIENTES_REPLICA_S)
+
+    threading.Thread(target=_clientes_en_segundo_plano, daemon=True, name="clientes").start()
+
     # ---- Entradas básicas ----
     campos = {}
     filas = [
@@ -257,10 +286,93 @@ def crear_pestana_nueva(tabs: ttk.Notebook):
     ent_cliente.bind("<FocusOut>", _try_autocomplete)
     ent_cuit.bind(   "<FocusOut>", _try_autocomplete)
 
+    # ---- Sugerencias mientras se escribe (Cliente / CUIT) ----
+    # Lista flotante debajo del Entry; se consulta el índice en memoria
+    # (utils.indice_clientes), nunca la base, y recién 150 ms después de la
+    # última tecla.
+    DEBOUNCE_MS = 150
+    sug = {"entry": None, "filas": [], "after": None}
+    sug_win = tk.Toplevel(frame)
+    sug_win.withdraw()
+    sug_win.overrideredirect(True)
+    sug_list = tk.Listbox(sug_win, height=8, width=60, activestyle="dotbox", exportselection=False)
+    sug_list.pack(fill="both", expand=True)
+
+    def _ocultar_sugerencias(_event=None):
+        sug_win.withdraw()
+        sug["filas"] = []
+
+    def _elegir_sugerencia(_event=None):
+        sel = sug_list.curselection()
+        if not sel or not sug["filas"]:
+            return
+        valores = sug["filas"][sel[0]]
+        _ocultar_sugerencias()
+        # Elegir explícitamente pisa lo que hubiera en los campos
+        for ent, valor in zip((ent_cliente, ent_cuit, ent_domicilio, ent_localidad, ent_iva), valores):
+            ent.delete(0, "end")
+            ent.insert(0, valor or "")
+        ent_domicilio.focus_set()
+        return "break"
+
+    def _mostrar_sugerencias():
+        sug["after"] = None
+        ent = sug["entry"]
+        texto = ent.get().strip() if ent is not None else ""
+        filas_sug = indice_clientes.sugerir(texto) if len(texto) >= 2 else []
+        if not filas_sug or ent.focus_get() is not ent:
+            _ocultar_sugerencias()
+            return
+        sug["filas"] = filas_sug
+        sug_list.delete(0, "end")
+        for nombre, cuit, _dom, loc, _iva in filas_sug:
+            sug_list.insert("end", "  ·  ".join(x for x in (nombre, cuit, loc) if x))
+        sug_list.config(height=len(filas_sug))
+        sug_win.geometry(f"+{ent.winfo_rootx()}+{ent.winfo_rooty() + ent.winfo_height()}")
+        sug_win.deiconify()
+        sug_win.lift()
+
+    def _al_escribir(event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab", "Shift_L", "Shift_R"):
+            return
+        sug["entry"] = event.widget
+        if sug["after"] is not None:
+            frame.after_cancel(sug["after"])
+        sug["after"] = frame.after(DEBOUNCE_MS, _mostrar_sugerencias)
+
+    def _mover(delta):
+        def _handler(_event):
+            if not sug["filas"]:
+                return
+            sel = sug_list.curselection()
+            i = (sel[0] + delta) if sel else (0 if delta > 0 else len(sug["filas"]) - 1)
+            i = max(0, min(len(sug["filas"]) - 1, i))
+            sug_list.selection_clear(0, "end")
+            sug_list.selection_set(i)
+            sug_list.see(i)
+            return "break"
+        return _handler
+
+    def _enter(_event):
+        if sug["filas"] and sug_list.curselection():
+            return _elegir_sugerencia()
+
+    for ent in (ent_cliente, ent_cuit):
+        ent.bind("<KeyRelease>", _al_escribir, add="+")
+        ent.bind("<Down>", _mover(+1), add="+")
+        ent.bind("<Up>", _mover(-1), add="+")
+        ent.bind("<Return>", _enter, add="+")
+        ent.bind("<Escape>", _ocultar_sugerencias, add="+")
+        # diferido: un clic en la lista también saca el foco del Entry
+        ent.bind("<FocusOut>", lambda _e: frame.after(200, lambda: (
+            None if sug_list.focus_get() is sug_list else _ocultar_sugerencias())), add="+")
+    sug_list.bind("<ButtonRelease-1>", _elegir_sugerencia)
+    sug_list.bind("<Return>", _elegir_sugerencia)
+    sug_list.bind("<Escape>", _ocultar_sugerencias)
+
     # ---- Generar ----
     def generar():
-        numero_recibo = None  # ← evita UnboundLocalError en cualquier except
-
+        """Valida y confirma en la UI; el recibo se emite en el worker."""
         try:
             if not campos["fecha"].get().strip():
                 messagebox.showerror("Error", "La fecha es obligatoria.")
@@ -299,78 +411,211 @@ def crear_pestana_nueva(tabs: ttk.Notebook):
                 ):
                     return
 
-            # ---- confirmación (AÚN SIN NÚMERO) ----
-            resumen = [
-                f"Fecha: {campos['fecha'].get().strip()}",
-                f"Cliente: {campos['cliente'].get().strip()}",
-                f"Total (bruto): ${bruto:.2f}",
-                f"Retenciones: ${ret_sum:.2f}",
-                f"Pagos esperados (Total - Retenciones): ${neto:.2f}",
-                f"Suma de pagos: ${suma_fp:.2f}",
-            ]
-            if not messagebox.askyesno("Confirmar", "¿Generar el recibo con estos datos?\n\n" + "\n".join(resumen)):
-                return
+            # ---- posible duplicado: en segundo plano (puede releer la planilla y
+            # consulta recibos.db en el share); la respuesta vuelve con after() ----
+            btn_generar.config(state="disabled")
+            estado_var.set("Buscando recibos duplicados…")
+            importes = {"bruto": bruto, "ret": ret, "ret_sum": ret_sum, "neto": neto, "fps": fps, "suma_fp": suma_fp}
+            controles.put((campos["cliente"].get().strip(), campos["fecha"].get().strip(), bruto))
+            frame.after(50, lambda: _esperar_control(importes))
+
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
 
+    # ---- Control de duplicados en segundo plano ----
+    controles = queue.Queue()
+    respuestas_control = queue.Queue()
+
+    def _controlador():
+        while True:
+            cliente, fecha, total = controles.get()
+            try:
+                previos = buscar_duplicados(cliente, fecha, total, DUPLICADO_DIAS)
+            except Exception as e:
+                logger.warning("No se pudo controlar duplicados: %s", e)
+                previos = []
+            respuestas_control.put(previos)
+
+    threading.Thread(target=_controlador, daemon=True, name="control-duplicados").start()
+
+    def _esperar_control(importes: dict):
+        try:
+            previos = respuestas_control.get_nowait()
+        except queue.Empty:
+            frame.after(50, lambda: _esperar_control(importes))
+            return
+        if not pendientes:
+            estado_var.set("")
+        # "Generar" sigue deshabilitado mientras están abiertos los diálogos:
+        # se habilita al cancelar, o cuando el worker termina el recibo
+        encolado = False
+        try:
+            encolado = _confirmar_y_encolar(previos, **importes)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            if not encolado and not pendientes:
+                btn_generar.config(state="normal")
+
+    def _confirmar_y_encolar(previos, bruto, ret, ret_sum, neto, fps, suma_fp) -> bool:
+        """En la UI: avisa duplicados, confirma y manda el recibo al worker (True si lo encoló)."""
+        if previos:
+            lista = "\n".join(f"{r['numero']}  {r['fecha']}  ${r['total']:.2f}  ({r['estado']})" for r in previos)
+            if not messagebox.askyesno(
+                "Posible duplicado",
+                f"Ya hay recibos de este cliente por el mismo importe:\n\n{lista}\n\n¿Generar igual?"
+            ):
+                return False
+
+        # ---- confirmación (AÚN SIN NÚMERO) ----
+        resumen = [
+            f"Fecha: {campos['fecha'].get().strip()}",
+            f"Cliente: {campos['cliente'].get().strip()}",
+            f"Total (bruto): ${bruto:.2f}",
+            f"Retenciones: ${ret_sum:.2f}",
+            f"Pagos esperados (Total - Retenciones): ${neto:.2f}",
+            f"Suma de pagos: ${suma_fp:.2f}",
+        ]
+        if not messagebox.askyesno("Confirmar", "¿Generar el recibo con estos datos?\n\n" + "\n".join(resumen)):
+            return False
+
+        # ---- datos para el PDF (el número lo asigna el worker) ----
+        datos = {
+            "numero_recibo": None,
+            "fecha": campos["fecha"].get().strip(),
+            "cliente": campos["cliente"].get().strip(),
+            "domicilio": campos["domicilio"].get().strip(),
+            "localidad": campos["localidad"].get().strip(),
+            "cuit": campos["cuit"].get().strip(),
+            "iva": campos["iva"].get().strip(),
+            "concepto": concepto_text.get("1.0", tk.END).strip(),
+            "retenciones": ret,
+            "forma_pago": fps,
+            "total": bruto,
+        }
+
+        # ---- a la cola: un trabajo por click confirmado ----
+        progreso.grid()
+        progreso.start(12)
+        estado_var.set("Generando recibo…")
+        trabajos.put(datos)
+        if not pendientes:
+            frame.after(100, _revisar_resultados)
+        pendientes.append(datos)
+        return True
+
+    # ---- Generación en segundo plano ----
+    # Contador (lock), PDF, escritura al share y upsert corren en un hilo
+    # aparte para que la ventana no se congele; el resultado vuelve por una
+    # cola que la UI lee con after() (Tk no se toca desde otro hilo).
+    trabajos = queue.Queue()
+    resultados = queue.Queue()
+    pendientes = []
+
+    def _emitir(datos: dict):
+        """Corre en el worker. Devuelve (ruta_pdf, número siguiente para el preview)."""
+        with medir_recibo() as m:      # tiempos por etapa (sólo con RECIBOS_METRICAS=1)
             # ---- AHORA sí asignamos el número real e incrementamos ----
-            from utils.contador import incrementar_contador, ver_numero_siguiente
-            numero_recibo = incrementar_contador()
-
-            # ---- datos para el PDF (con el número real) ----
-            datos = {
-                "numero_recibo": numero_recibo,
-                "fecha": campos["fecha"].get().strip(),
-                "cliente": campos["cliente"].get().strip(),
-                "domicilio": campos["domicilio"].get().strip(),
-                "localidad": campos["localidad"].get().strip(),
-                "cuit": campos["cuit"].get().strip(),
-                "iva": campos["iva"].get().strip(),
-                "concepto": concepto_text.get("1.0", tk.END).strip(),
-                "retenciones": ret,
-                "forma_pago": fps,
-                "total": bruto,
-            }
+            # (queda Reservado en el libro de recibos con estos datos)
+            with etapa("incrementar_contador"):
+                numero_recibo = incrementar_contador(datos=datos)
+            m["recibo"] = numero_recibo
+            datos["numero_recibo"] = numero_recibo
 
             # ---- QR ----
-            qr_payload = build_qr_data(datos, BASE_QR_URL, QR_SECRET_KEY)
+            with etapa("build_qr_data"):
+                qr_payload = build_qr_data(datos, BASE_QR_URL, QR_SECRET_KEY)
 
             # ---- salida centralizada ----
             output_dir = SALIDA_DIR
             output_dir.mkdir(parents=True, exist_ok=True)
-            cliente_sanit = (datos["cliente"] or "Cliente").replace(" ", "_")
-            ruta_pdf = output_dir / f"Recibo_{numero_recibo}__{cliente_sanit}.pdf"
+            ruta_pdf = output_dir / nombre_pdf(numero_recibo, datos["cliente"])
 
             # ---- generar PDF (assets desde ASSETS_DIR) ----
-            from config import ASSETS_DIR
-            generar_pdf(
-                datos,
-                ruta_pdf,
-                logo_path=None,
-                firma_path=str(ASSETS_DIR / "firma.png"),
-                anulado=False,
-                qr_data=qr_payload,
-                template_pdf=str(ASSETS_DIR / "MODELO 2.pdf"),
-            )
+            try:
+                generar_pdf(
+                    datos,
+                    ruta_pdf,
+                    logo_path=None,
+                    firma_path=str(FIRMA_PATH),
+                    anulado=False,
+                    qr_data=qr_payload,
+                    template_pdf=str(ASSETS_DIR / "MODELO 2.pdf"),
+                )
+            except Exception as e:
+                # El número ya quedó consumido: que figure en el mensaje (y en el libro)
+                try:
+                    libro_recibos.marcar_error(numero_recibo)
+                except Exception:
+                    logger.exception("No se pudo marcar %s con error en el libro", numero_recibo)
+                raise RuntimeError(f"No se pudo generar el recibo {numero_recibo}: {e}") from e
+
+            with etapa("libro_confirmar"):
+                try:
+                    libro_recibos.confirmar(numero_recibo, ruta_pdf)
+                except Exception:
+                    # El PDF ya está; la fila queda Reservado hasta que
+                    # contador.reconciliar() la pase a Emitido
+                    logger.exception("No se pudo confirmar %s en el libro", numero_recibo)
 
             # ---- persistir cliente (best-effort) ----
+            with etapa("upsert_cliente"):
+                try:
+                    upsert_cliente(datos["cliente"], datos["cuit"], datos["domicilio"], datos["localidad"], datos["iva"])
+                except Exception:
+                    logger.exception("No se pudo guardar el cliente %s", datos["cliente"])
+
+        try:
+            siguiente = ver_numero_siguiente()
+        except Exception:
+            siguiente = None
+        return ruta_pdf, siguiente
+
+    def _worker():
+        while True:
+            datos = trabajos.get()
             try:
-                upsert_cliente(datos["cliente"], datos["cuit"], datos["domicilio"], datos["localidad"], datos["iva"])
-            except Exception:
-                pass
+                resultados.put(("ok", _emitir(datos)))
+            except Exception as e:
+                resultados.put(("error", e))
 
-            # ---- refrescar preview del siguiente ----
+    threading.Thread(target=_worker, daemon=True, name="generar-recibo").start()
+
+    def _revisar_resultados():
+        """Corre en el hilo de Tk: muestra lo que terminó y libera el botón."""
+        while True:
             try:
+                tipo, valor = resultados.get_nowait()
+            except queue.Empty:
+                break
+            pendientes.pop(0)
+            if not pendientes:
+                progreso.stop()
+                progreso.grid_remove()
+                estado_var.set("")
+                btn_generar.config(state="normal")
+
+            if tipo == "error":
+                messagebox.showerror("Error", str(valor))
+                continue
+
+            ruta_pdf, siguiente = valor
+            # ---- refrescar preview del siguiente ----
+            if siguiente:
                 campos["numero_recibo"].config(state="normal")
                 campos["numero_recibo"].delete(0, tk.END)
-                campos["numero_recibo"].insert(0, ver_numero_siguiente())
+                campos["numero_recibo"].insert(0, siguiente)
                 campos["numero_recibo"].config(state="readonly")
-            except Exception:
-                pass
-
             messagebox.showinfo("Éxito", f"Recibo generado correctamente:\n{ruta_pdf}")
 
-        except Exception as e:
-            # Si falló antes de asignar el número, no lo referencies
-            messagebox.showerror("Error", str(e))
+        if pendientes:
+            frame.after(100, _revisar_resultados)
+
+    btn_generar = ttk.Button(frame, text="Generar Recibo", command=generar)
+    btn_generar.grid(row=13, column=0, columnspan=2, pady=10)
 
-    ttk.Button(frame, text="Generar Recibo", command=generar)\
-        .grid(row=13, column=0, columnspan=2, pady=10)
+    estado_var = tk.StringVar(value="")
+    ttk.Label(frame, textvariable=estado_var).grid(row=14, column=0, columnspan=2)
+    progreso = ttk.Progressbar(frame, mode="indeterminate", length=240)
+    progreso.grid(row=15, column=0, columnspan=2, pady=(0, 8))
+    progreso.grid_remove()
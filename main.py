@@ -4,12 +4,16 @@ import threading
 import logging, logging.handlers, socket, getpass
 import tkinter as tk
 from tkinter import ttk, messagebox  # si no usás messagebox, podés quitarlo
-from config import SALIDA_DIR, CONTADOR_PATH
+from config import SALIDA_DIR
 from interfaz.nueva import crear_pestana_nueva
 from interfaz.buscar_editar import crear_pestana_buscar
 from interfaz.anular import crear_pestana_anular
 from config import LOGS_DIR
 from config import ASSETS_DIR
+from utils.pdf_generator import precargar_plantilla
+from utils.metricas import activas, texto_resumen, volcar_resumen
+from utils.contador import reconciliar, punto_venta_estacion, ruta_contador
+from utils.db import cerrar_todas
 
 # -------------------------------
 # Logging (rotación por archivo)
@@ -58,7 +62,7 @@ def run_validator_async(logger):
 def main():
     logger = setup_logging()
     logger.info(f"SALIDA_DIR={SALIDA_DIR}")
-    logger.info(f"CONTADOR_PATH={CONTADOR_PATH}")
+    logger.info(f"PUNTO_VENTA={punto_venta_estacion()} CONTADOR={ruta_contador()}")
     logger.info("Aplicación iniciada")
 
     root = tk.Tk()
@@ -77,8 +81,31 @@ def main():
     # Levantar validador Flask en segundo plano
     run_validator_async(logger)
 
+    # Parsear la plantilla en segundo plano (el primer "Generar" no la espera)
+    def _precargar():
+        try:
+            precargar_plantilla()
+        except Exception:
+            logger.exception("No se pudo precargar la plantilla")
+    threading.Thread(target=_precargar, daemon=True, name="precarga").start()
+
+    # Contador vs. PDFs del share: sólo lista la carpeta si cambió su mtime
+    def _reconciliar():
+        try:
+            if reconciliar():
+                logger.info("Contador reconciliado con los PDFs de SALIDA_DIR")
+        except Exception:
+            logger.exception("No se pudo reconciliar el contador")
+    threading.Thread(target=_reconciliar, daemon=True, name="reconciliar").start()
+
+    # Tiempos por etapa (RECIBOS_METRICAS=1): F12 muestra el resumen
+    if activas():
+        root.bind_all("<F12>", lambda _e: messagebox.showinfo("Tiempos por etapa", texto_resumen()))
+
     def _on_close():
         logger.info("Cierre solicitado por el usuario")
+        volcar_resumen()
+        cerrar_todas()
         root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", _on_close)
@@ -0,0 +1,113 @@
+# utils/ajuste_texto.py
+"""
+Motor de ajuste de bloques de texto (tamaño de letra / interlineado).
+
+En vez de probar todas las combinaciones de tamaño × interlineado hasta que
+una entre, se hace búsqueda binaria: el alto de un bloque crece con el tamaño
+de letra y con el interlineado, así que alcanza con ~log2(n) mediciones por
+eje. Las mediciones (Paragraph.wrap / simpleSplit) se memorizan por
+(texto, fuente, tamaño, interlineado, ancho).
+"""
+from __future__ import annotations
+from functools import lru_cache
+from reportlab.lib.enums import TA_LEFT
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.utils import simpleSplit
+from reportlab.platypus import Paragraph
+
+def escala(desde: float, hasta: float, paso: float) -> list[float]:
+    """Valores de desde a hasta (descendente), incluyendo hasta."""
+    n = int(round((desde - hasta) / paso))
+    return [round(desde - paso * i, 2) for i in range(n + 1)]
+
+def _mayor_que_entra(valores, entra) -> int | None:
+    """
+    Índice del primer valor (el más grande, valores en orden descendente)
+    para el que entra(v) es True, suponiendo que si entra un valor entran
+    todos los siguientes. None si no entra ninguno.
+    """
+    lo, hi, res = 0, len(valores) - 1, None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if entra(valores[mid]):
+            res, hi = mid, mid - 1
+        else:
+            lo = mid + 1
+    return res
+
+def mejor_ajuste(medir, tamanos, factores, disponible: float):
+    """
+    Devuelve (tamaño, factor) con el mayor tamaño y, para ese tamaño, el mayor
+    factor tal que medir(tamaño, factor) <= disponible; None si ni la
+    combinación más chica entra. tamanos y factores van en orden descendente
+    y medir debe ser creciente en ambos.
+    """
+    f_min = factores[-1]
+    i = _mayor_que_entra(tamanos, lambda t: medir(t, f_min) <= disponible)
+    if i is None:
+        return None
+    t = tamanos[i]
+    j = _mayor_que_entra(factores, lambda f: medir(t, f) <= disponible)
+    return t, factores[j]
+
+# ----------------------------------------------------------------------
+# Párrafos (platypus)
+# ----------------------------------------------------------------------
+def estilo_parrafo(font: str, size: float, leading: float) -> ParagraphStyle:
+    return ParagraphStyle(
+        "Ajuste",
+        fontName=font,
+        fontSize=size,
+        leading=leading,
+        alignment=TA_LEFT,
+        spaceBefore=0, spaceAfter=0,  # sin márgenes extra
+    )
+
+def interlineado(size: float, factor: float) -> float:
+    # leading mínimo: igual al tamaño; con factor > 1 vamos soltando
+    return max(size, round(size * factor, 2))
+
+@lru_cache(maxsize=4096)
+def alto_parrafo(html: str, font: str, size: float, leading: float, ancho: float) -> float:
+    """Alto (pt) que ocupa el párrafo a ese ancho, sin dibujarlo."""
+    _, h = Paragraph(html, estilo_parrafo(font, size, leading)).wrap(ancho, 1e7)
+    return h
+
+def ajustar_parrafo(html: str, font: str, ancho: float, alto: float,
+                    tamanos, factores, preferido=None) -> Paragraph:
+    """
+    Paragraph con el mayor tamaño/interlineado que entra en ancho × alto.
+    preferido=(tamaño, factor) se prueba primero (caso común: texto corto).
+    Si nada entra, usa el tamaño y factor más chicos.
+    """
+    def medir(t, f):
+        return alto_parrafo(html, font, t, interlineado(t, f), ancho)
+
+    if preferido and medir(*preferido) <= alto:
+        t, f = preferido
+    else:
+        t, f = mejor_ajuste(medir, tamanos, factores, alto) or (tamanos[-1], factores[-1])
+    return Paragraph(html, estilo_parrafo(font, t, interlineado(t, f)))
+
+# ----------------------------------------------------------------------
+# Líneas simples (canvas.drawString)
+# ----------------------------------------------------------------------
+@lru_cache(maxsize=4096)
+def partir_lineas(texto: str, font: str, size: float, ancho: float) -> tuple[str, ...]:
+    return tuple(simpleSplit(texto, font, size, ancho))
+
+def ajustar_lineas(texto: str, font: str, ancho: float, alto: float, tamanos, espacio: float):
+    """
+    (tamaño, líneas) con el mayor tamaño cuyas líneas (alto de línea =
+    tamaño + espacio) entran en alto. Si nada entra, el tamaño más chico con
+    las líneas que quepan.
+    """
+    def medir(t, _f):
+        return len(partir_lineas(texto, font, t, ancho)) * (t + espacio)
+
+    ajuste = mejor_ajuste(medir, tamanos, (0,), alto)
+    if ajuste:
+        t = ajuste[0]
+        return t, partir_lineas(texto, font, t, ancho)
+    t = tamanos[-1]
+    return t, partir_lineas(texto, font, t, ancho)[:max(1, int(alto // (t + espacio)))]
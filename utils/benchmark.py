@@ -0,0 +1,307 @@
+# utils/benchmark.py
+"""
+Benchmarks de render, numeración y búsquedas (offline, sobre un RECIBOS_ROOT
+temporal: no toca datos reales).
+
+    python -m utils.benchmark                          # corre todo → bench.json
+    python -m utils.benchmark --salida base.json       # guardar línea de base
+    python -m utils.benchmark --comparar base.json     # marca regresiones
+    python -m utils.benchmark --solo pdf,qr --rapido   # subconjunto / tamaños chicos
+
+Grupos:
+    pdf        generar_pdf con concepto corto/largo/peor caso × 1/6/40 pagos
+    qr         _build_qr_png_bytes
+    contador   incrementar_contador con N PDFs ya emitidos en SALIDA_DIR
+    clientes   buscar_por_nombre_o_cuit con 10k / 100k clientes
+    duplicado  posible_duplicado con un historial grande
+
+Cada caso guarda n, min, p50, p95 y max en ms. Con --comparar, un caso cuyo
+p50 empeora más que --umbral (default 10%) y más de --minimo-ms es
+regresión y el exit code es 1.
+"""
+from __future__ import annotations
+import argparse, json, math, os, platform, shutil, statistics, sys, tempfile, time
+from datetime import datetime
+from pathlib import Path
+
+GRUPOS = ("pdf", "qr", "contador", "clientes", "duplicado")
+
+CONCEPTOS = {
+    "corto": "Honorarios profesionales mes de marzo.",
+    "largo": " ".join(
+        f"Servicio {i}: mantenimiento preventivo y correctivo de equipos, "
+        f"materiales incluidos según orden de compra N° {1000 + i}."
+        for i in range(12)
+    ),
+    # Palabras larguísimas y muchos saltos: fuerza el ajuste al mínimo
+    "peor": "\n".join(("X" * 90 + " ") * 3 for _ in range(40)),
+}
+PAGOS = (1, 6, 40)
+QR_NO_ENTRA: list[str] = []   # casos cuyo payload no cabe en un QR
+
+# Tamaños (normal, --rapido)
+TAMANOS = {
+    "repeticiones":  (20, 5),
+    "pdfs_emitidos": ((1_000, 10_000), (200, 1_000)),
+    "clientes":      ((10_000, 100_000), (1_000, 10_000)),
+    "historial":     (20_000, 2_000),
+}
+
+# ----------------------------------------------------------------------
+# Medición
+# ----------------------------------------------------------------------
+def _percentil(ordenados: list[float], p: float) -> float:
+    i = max(0, min(len(ordenados), math.ceil(p / 100 * len(ordenados))) - 1)
+    return ordenados[i]
+
+def medir(fn, repeticiones: int, calentamiento: int = 1, preparar=None) -> dict:
+    """
+    Corre fn() calentamiento + repeticiones veces; tiempos en ms.
+    preparar() (opcional) corre antes de cada llamada, fuera del tiempo.
+    """
+    for _ in range(calentamiento):
+        if preparar:
+            preparar()
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return {
+        "n": len(tiempos),
+        "min_ms": round(tiempos[0], 3),
+        "p50_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": round(_percentil(tiempos, 95), 3),
+        "max_ms": round(tiempos[-1], 3),
+    }
+
+def _datos(numero: str, concepto: str, n_pagos: int) -> dict:
+    pagos = [
+        {"tipo": "Cheque", "numero": f"{40000000 + i}", "banco": "Banco Nación",
+         "fecha": "15/03/2024", "importe": 1500.0}
+        for i in range(n_pagos)
+    ]
+    return {
+        "numero_recibo": numero,
+        "fecha": "15/03/2024",
+        "cliente": "Cooperativa de Trabajo Ejemplo Ltda.",
+        "domicilio": "Av. Siempre Viva 742",
+        "localidad": "San Miguel de Tucumán",
+        "cuit": "30-71234567-8",
+        "iva": "Responsable Inscripto",
+        "concepto": concepto,
+        "retenciones": {"Ganancias": 120.0, "SUSS": 0.0, "TEM": 35.5, "IIBB": 80.0},
+        "forma_pago": pagos,
+        "total": 1500.0 * n_pagos + 235.5,
+    }
+
+# ----------------------------------------------------------------------
+# Grupos
+# ----------------------------------------------------------------------
+def bench_pdf(raiz: Path, rep: int, motor: str | None) -> dict:
+    from config import BASE_QR_URL, QR_SECRET_KEY
+    from utils.pdf_generator import generar_pdf, precargar_plantilla, _build_qr
+    from utils.qr_utils import build_qr_data
+
+    precargar_plantilla(motor=motor)
+    destino = raiz / "bench_pdf"
+    destino.mkdir(exist_ok=True)
+    qr_corto = build_qr_data(_datos("0001-00000001", CONCEPTOS["corto"], 1), BASE_QR_URL, QR_SECRET_KEY)
+    res = {}
+    for nombre, concepto in CONCEPTOS.items():
+        for n_pagos in PAGOS:
+            datos = _datos("0001-00000001", concepto, n_pagos)
+            qr = build_qr_data(datos, BASE_QR_URL, QR_SECRET_KEY)
+            try:
+                _build_qr(qr)
+            except ValueError:
+                # El payload completo supera la capacidad de un QR (versión 40):
+                # se mide el render con el QR del caso corto y se deja constancia
+                print(f"[AVISO] pdf/{nombre}/{n_pagos}_pagos: el QR no entra ({len(qr)} caracteres)")
+                QR_NO_ENTRA.append(f"pdf/{nombre}/{n_pagos}_pagos")
+                qr = qr_corto
+            ruta = destino / f"{nombre}_{n_pagos}.pdf"
+            res[f"pdf/{nombre}/{n_pagos}_pagos"] = medir(
+                lambda: generar_pdf(dict(datos), ruta, qr_data=qr, motor=motor), rep)
+    return res
+
+def bench_qr(raiz: Path, rep: int, _motor) -> dict:
+    from config import BASE_QR_URL, QR_SECRET_KEY
+    from utils.pdf_generator import _build_qr_png_bytes
+    from utils.qr_utils import build_qr_data
+
+    qr = build_qr_data(_datos("0001-00000001", "x", 1), BASE_QR_URL, QR_SECRET_KEY)
+    return {"qr/png_bytes": medir(lambda: _build_qr_png_bytes(qr), rep * 5)}
+
+def bench_contador(raiz: Path, rep: int, _motor, emitidos=(1_000, 10_000)) -> dict:
+    from config import SALIDA_DIR
+    from utils.contador import incrementar_contador, ruta_contador
+
+    res, hechos = {}, 0
+    for n in emitidos:
+        # PDFs vacíos: el contador sólo mira los nombres
+        for i in range(hechos + 1, n + 1):
+            (SALIDA_DIR / f"Recibo_0001-{i:08d}__Cliente_{i}.pdf").touch()
+        hechos = n
+        # Sin JSON cada llamada reconstruye desde la carpeta (un listado
+        # completo); con JSON es el camino normal, que no lista nada
+        sin_json = lambda: ruta_contador().unlink(missing_ok=True)
+        res[f"contador/reconstruir/{n}_pdfs"] = medir(incrementar_contador, rep, preparar=sin_json)
+        res[f"contador/incrementar/{n}_pdfs"] = medir(incrementar_contador, rep)
+    return res
+
+def bench_clientes(raiz: Path, rep: int, _motor, cantidades=(10_000, 100_000)) -> dict:
+    import sqlite3
+    from utils import clientes, indice_clientes
+
+    clientes.init_db()
+    res, hechos = {}, 0
+    for n in cantidades:
+        with sqlite3.connect(clientes.DB) as cx:
+            cx.executemany(
+                "INSERT INTO clientes(nombre, cuit, domicilio, localidad, iva, nombre_norm, cuit_digits)"
+                " VALUES(?,?,?,?,?,?,?)",
+                ((f"Cliente Número {i}", f"20-{i:08d}-1", f"Calle {i}", "Tucumán", "Monotributo",
+                  clientes.normalizar_nombre(f"Cliente Número {i}"), f"20{i:08d}1")
+                 for i in range(hechos, n)),
+            )
+        hechos = n
+        medio = n // 2
+        res[f"clientes/nombre/{n}"] = medir(lambda: clientes.buscar_por_nombre_o_cuit(f"cliente número {medio}"), rep)
+        res[f"clientes/cuit/{n}"]   = medir(lambda: clientes.buscar_por_nombre_o_cuit(f"20{medio:08d}1"), rep)
+        res[f"clientes/sin_resultado/{n}"] = medir(lambda: clientes.buscar_por_nombre_o_cuit("No Existe SA"), rep)
+        res[f"clientes/prefijo/{n}"]   = medir(lambda: clientes.buscar_clientes(f"cliente numero {medio // 10}"), rep)
+        res[f"clientes/substring/{n}"] = medir(lambda: clientes.buscar_clientes(f"ero {medio}"), rep)
+        indice_clientes.cargar()
+        res[f"clientes/sugerir/{n}"]   = medir(lambda: indice_clientes.sugerir(f"cliente numero {medio // 10}"), rep)
+    return res
+
+def bench_duplicado(raiz: Path, rep: int, _motor, filas=20_000) -> dict:
+    from openpyxl import Workbook
+    from utils import recibo_utils
+
+    # El historial real vive junto al programa: apuntamos a uno temporal
+    recibo_utils.HISTORIAL_XLSX = raiz / "historial" / "recibos.xlsx"
+    recibo_utils.HISTORIAL_XLSX.parent.mkdir(parents=True, exist_ok=True)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Recibos")
+    ws.append(["Número", "Cliente", "Fecha", "Subtotal", "Total", "Estado"])
+    for i in range(1, filas + 1):
+        ws.append([f"0001-{i:08d}", f"Cliente {i % 3000}", f"{i % 28 + 1:02d}/03/2024",
+                   1000.0 + i, 1000.0 + i, "Emitido"])
+    wb.save(recibo_utils.HISTORIAL_XLSX)
+
+    from utils import libro_recibos
+    libro_recibos.RECIBOS_DB = raiz / "recibos.db"
+    libro_recibos._iniciada = False
+    res = {}
+    # La primera consulta lee la planilla (mtime nuevo); las demás sólo el índice
+    res[f"duplicado/leer_planilla/{filas}"] = \
+        medir(lambda: recibo_utils.posible_duplicado("Nadie", "01/01/2000", 1.0), 1, calentamiento=0)
+    res[f"duplicado/sin_coincidencia/{filas}"] = \
+        medir(lambda: recibo_utils.posible_duplicado("Nadie", "01/01/2000", 1.0), rep)
+    res[f"duplicado/coincidencia/{filas}"] = \
+        medir(lambda: recibo_utils.posible_duplicado("cliente 1234", "07/03/2024", 1000.0 + 4234), rep)
+    res[f"duplicado/ventana_7_dias/{filas}"] = \
+        medir(lambda: recibo_utils.posible_duplicado("Cliente 1234", "10/03/2024", 1000.0 + 4234, dias=7), rep)
+    return res
+
+# ----------------------------------------------------------------------
+# Comparación
+# ----------------------------------------------------------------------
+def comparar(actual: dict, base: dict, umbral: float, minimo_ms: float = 0.5) -> list[str]:
+    """Imprime la tabla actual vs. base; devuelve los casos con regresión."""
+    regresiones = []
+    print(f"\n{'caso':<42}{'base p50':>11}{'actual p50':>12}{'Δ':>9}")
+    for caso, r in actual["resultados"].items():
+        b = base.get("resultados", {}).get(caso)
+        if not b:
+            print(f"{caso:<42}{'-':>11}{r['p50_ms']:>12.2f}{'nuevo':>9}")
+            continue
+        delta = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"] if b["p50_ms"] else 0.0
+        marca = ""
+        # Diferencias de fracciones de ms son ruido, aunque sean +20%
+        if delta > umbral and r["p50_ms"] - b["p50_ms"] > minimo_ms:
+            marca = "  ← REGRESIÓN"
+            regresiones.append(caso)
+        print(f"{caso:<42}{b['p50_ms']:>11.2f}{r['p50_ms']:>12.2f}{delta:>+9.0%}{marca}")
+    return regresiones
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m utils.benchmark", description="Benchmarks de RecibosDigitales.")
+    ap.add_argument("--salida", default="bench.json", help="JSON con los resultados (default: bench.json)")
+    ap.add_argument("--comparar", default=None, help="JSON de una corrida anterior (línea de base)")
+    ap.add_argument("--umbral", type=float, default=0.10, help="empeoramiento de p50 tolerado (default: 0.10)")
+    ap.add_argument("--minimo-ms", type=float, default=0.5, help="diferencia absoluta mínima para contar como regresión")
+    ap.add_argument("--solo", default=None, help=f"grupos separados por coma ({','.join(GRUPOS)})")
+    ap.add_argument("--motor", choices=["merge", "xobject"], default=None, help="motor de render del PDF")
+    ap.add_argument("--rapido", action="store_true", help="menos repeticiones y tamaños chicos")
+    ap.add_argument("--conservar", action="store_true", help="no borrar el RECIBOS_ROOT temporal")
+    args = ap.parse_args(argv)
+
+    grupos = [g.strip() for g in args.solo.split(",")] if args.solo else list(GRUPOS)
+    desconocidos = set(grupos) - set(GRUPOS)
+    if desconocidos:
+        ap.error(f"grupos desconocidos: {', '.join(sorted(desconocidos))}")
+
+    # Antes de importar config: todo (contador, clientes, PDFs) va al temporal
+    raiz = Path(tempfile.mkdtemp(prefix="recibos_bench_"))
+    os.environ["RECIBOS_ROOT"] = str(raiz)
+    os.environ["RECIBOS_LOCAL_DIR"] = str(raiz / "local")
+    os.environ.pop("RECIBOS_PV", None)
+    if "config" in sys.modules:
+        print("[AVISO] config ya estaba importado; RECIBOS_ROOT temporal sin efecto.")
+
+    t = 1 if args.rapido else 0
+    rep = TAMANOS["repeticiones"][t]
+    corridas = {
+        "pdf":       lambda: bench_pdf(raiz, rep, args.motor),
+        "qr":        lambda: bench_qr(raiz, rep, args.motor),
+        "contador":  lambda: bench_contador(raiz, rep, args.motor, TAMANOS["pdfs_emitidos"][t]),
+        "clientes":  lambda: bench_clientes(raiz, rep, args.motor, TAMANOS["clientes"][t]),
+        "duplicado": lambda: bench_duplicado(raiz, rep, args.motor, TAMANOS["historial"][t]),
+    }
+
+    resultados = {}
+    try:
+        for g in grupos:
+            print(f"[bench] {g}…", flush=True)
+            for caso, r in corridas[g]().items():
+                resultados[caso] = r
+                print(f"  {caso:<40} p50 {r['p50_ms']:>9.2f} ms   p95 {r['p95_ms']:>9.2f} ms")
+    finally:
+        if not args.conservar:
+            shutil.rmtree(raiz, ignore_errors=True)
+
+    from config import PDF_MOTOR
+    salida = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "motor": args.motor or PDF_MOTOR,
+            "rapido": args.rapido,
+            "qr_no_entra": QR_NO_ENTRA,
+        },
+        "resultados": resultados,
+    }
+    Path(args.salida).write_text(json.dumps(salida, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nResultados: {args.salida}")
+
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        regresiones = comparar(salida, base, args.umbral, args.minimo_ms)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresión(es) > {args.umbral:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,144 @@
 # utils/clientes.py
+"""
+Clientes para el autocompletado (DATA_DIR/db/clientes.db).
+
+Además de lo que se escribe, cada fila guarda columnas normalizadas e
+indexadas para buscar sin recorrer la tabla:
+    nombre_norm   minúsculas, sin acentos ni puntos, espacios simples
+                  ("JOSÉ PÉREZ S.A." → "jose perez sa")
+    cuit_digits   sólo dígitos ("20-12345678-9" → "20123456789")
+
+buscar_por_nombre_o_cuit() busca igualdad sobre esas columnas.
+buscar_clientes() además encuentra por prefijo (índice) y por substring
+(FTS5 con tokenizer trigram, SQLite ≥ 3.34; si no está, LIKE '%texto%').
+
+init_db() migra solo un clientes.db viejo: agrega las columnas, las completa
+y crea los índices.
+
+Réplica local (RECIBOS_CLIENTES_REPLICA=1, por defecto): una copia de la
+tabla en LOCAL_DIR/clientes_replica.db. Las búsquedas leen de ahí, así no
+dependen del share (ni se traban si el share tarda). upsert_cliente()
+escribe en el share y aplica el mismo cambio en la réplica.
+sincronizar_replica() trae sólo lo que cambió: cada alta o cambio en el
+share sube la columna 'version' (triggers en la base, así también cuentan
+las estaciones con una versión vieja del programa) y la réplica recuerda
+hasta qué versión copió. La app lo llama al abrir y cada
+RECIBOS_CLIENTES_REPLICA_S segundos. Los borrados no se replican (la app
+no borra clientes); para rehacerla alcanza con borrar el archivo.
+"""
+import logging
+import re
 import sqlite3
+import unicodedata
 from pathlib import Path
-from config import DATA_DIR
+from config import DATA_DIR, LOCAL_DIR, CLIENTES_REPLICA
+from utils import db, indice_clientes
+
+logger = logging.getLogger("recibos")
 
 DB = DATA_DIR / "db" / "clientes.db"
 DB.parent.mkdir(parents=True, exist_ok=True)
 DB.parent.mkdir(exist_ok=True)
+REPLICA = LOCAL_DIR / "clientes_replica.db"
+
+COLUMNAS = "nombre, cuit, domicilio, localidad, iva"
+_FTS = None   # None: sin averiguar; True/False según el SQLite instalado
+_replica_lista = False   # la réplica se sincronizó alguna vez con este DB
 
 def _conn():
-    return sqlite3.connect(DB)
+    """Conexión persistente de este hilo (utils.db)."""
+    return db.conectar(DB)
+
+def _lectura():
+    """Réplica local si está lista; si no, la base del share."""
+    if _replica_lista:
+        return db.conectar(REPLICA, privada=True)
+    return _conn()
+
+# ----------------------------------------------------------------------
+# Normalización
+# ----------------------------------------------------------------------
+def normalizar_nombre(texto) -> str:
+    """Minúsculas, sin acentos, sin puntos ni apóstrofos, espacios simples."""
+    s = unicodedata.normalize("NFKD", str(texto or "")).casefold()
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    s = re.sub(r"[.'´`]", "", s)
+    return " ".join(re.sub(r"[^\w]+", " ", s).split())
+
+def solo_digitos(texto) -> str:
+    return re.sub(r"\D", "", str(texto or ""))
+
+# ----------------------------------------------------------------------
+# Esquema / migración
+# ----------------------------------------------------------------------
+_SQL_FTS = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+        nombre_norm, cuit_digits,
+        content='clientes', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+        INSERT INTO clientes_fts(rowid, nombre_norm, cuit_digits)
+        VALUES (new.id, new.nombre_norm, new.cuit_digits);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+        INSERT INTO clientes_fts(clientes_fts, rowid, nombre_norm, cuit_digits)
+        VALUES ('delete', old.id, old.nombre_norm, old.cuit_digits);
+    END""",
+    # Sólo las columnas indexadas: el UPDATE de version que hacen los triggers
+    # clientes_version_* no reescribe la fila del índice
+    """CREATE TRIGGER IF NOT EXISTS clientes_fts_au
+    AFTER UPDATE OF nombre_norm, cuit_digits ON clientes
+    WHEN old.nombre_norm IS NOT new.nombre_norm OR old.cuit_digits IS NOT new.cuit_digits BEGIN
+        INSERT INTO clientes_fts(clientes_fts, rowid, nombre_norm, cuit_digits)
+        VALUES ('delete', old.id, old.nombre_norm, old.cuit_digits);
+        INSERT INTO clientes_fts(rowid, nombre_norm, cuit_digits)
+        VALUES (new.id, new.nombre_norm, new.cuit_digits);
+    END""",
+)
+
+def _crear_fts(cx) -> bool:
+    """Índice de substring (trigram) sobre las columnas normalizadas."""
+    try:
+        existe = cx.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='clientes_fts'").fetchone()
+        viejo = cx.execute(
+            "SELECT sql FROM sqlite_master WHERE type='trigger' AND name='clientes_fts_au'").fetchone()
+        if viejo and "UPDATE OF" not in viejo[0]:
+            cx.execute("DROP TRIGGER clientes_fts_au")   # versión que saltaba con cualquier UPDATE
+        for sql in _SQL_FTS:
+            cx.execute(sql)
+        if not existe:
+            cx.execute("INSERT INTO clientes_fts(clientes_fts) VALUES('rebuild')")
+        return True
+    except sqlite3.OperationalError as e:
+        # SQLite sin FTS5 o sin trigram (< 3.34)
+        print(f"[AVISO] Búsqueda de clientes sin índice de texto ({e}); se usa LIKE.")
+        return False
+
+_SQL_VERSION = (
+    "CREATE INDEX IF NOT EXISTS ix_clientes_version ON clientes(version)",
+    """CREATE TRIGGER IF NOT EXISTS clientes_version_ai AFTER INSERT ON clientes BEGIN
+        UPDATE clientes SET version = (SELECT COALESCE(MAX(version), 0) + 1 FROM clientes)
+        WHERE id = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clientes_version_au
+    AFTER UPDATE OF nombre, cuit, domicilio, localidad, iva ON clientes BEGIN
+        UPDATE clientes SET version = (SELECT COALESCE(MAX(version), 0) + 1 FROM clientes)
+        WHERE id = new.id;
+    END""",
+)
+
+def _columnas_norm(cx) -> None:
+    columnas = {r[1] for r in cx.execute("PRAGMA table_info(clientes)")}
+    for col, tipo in (("nombre_norm", "TEXT"), ("cuit_digits", "TEXT"), ("version", "INTEGER")):
+        if col not in columnas:
+            cx.execute(f"ALTER TABLE clientes ADD COLUMN {col} {tipo}")
+    cx.execute("CREATE INDEX IF NOT EXISTS ix_clientes_nombre_norm ON clientes(nombre_norm)")
+    cx.execute("CREATE INDEX IF NOT EXISTS ix_clientes_cuit_digits ON clientes(cuit_digits)")
 
 def init_db():
-    with _conn() as cx:
+    global _FTS
+    with db.transaccion(DB) as cx:
         cx.execute("""
         CREATE TABLE IF NOT EXISTS clientes(
             id INTEGER PRIMARY KEY,
@@ -22,7 +149,119 @@ def init_db():
             iva TEXT
         );
         """)
+        _columnas_norm(cx)
+
+        # Filas viejas (o cargadas por fuera) sin normalizar
+        pendientes = cx.execute(
+            "SELECT id, nombre, cuit FROM clientes WHERE nombre_norm IS NULL OR cuit_digits IS NULL"
+        ).fetchall()
+        if pendientes:
+            cx.executemany(
+                "UPDATE clientes SET nombre_norm=?, cuit_digits=? WHERE id=?",
+                ((normalizar_nombre(n), solo_digitos(c), i) for i, n, c in pendientes),
+            )
+        cx.execute("UPDATE clientes SET version = id WHERE version IS NULL")
+        for sql in _SQL_VERSION:
+            cx.execute(sql)
+        _FTS = _crear_fts(cx)
+    if CLIENTES_REPLICA:
+        _init_replica()
 
+def _hay_fts(cx) -> bool:
+    global _FTS
+    if _FTS is None:
+        _FTS = cx.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='clientes_fts'").fetchone() is not None
+    return _FTS
+
+# ----------------------------------------------------------------------
+# Réplica local
+# ----------------------------------------------------------------------
+def _init_replica() -> None:
+    global _replica_lista
+    try:
+        with db.transaccion(REPLICA, privada=True) as cx:
+            # Sin UNIQUE: manda el share; acá sólo se copia por id
+            cx.execute("""
+            CREATE TABLE IF NOT EXISTS clientes(
+                id INTEGER PRIMARY KEY,
+                nombre TEXT,
+                cuit   TEXT,
+                domicilio TEXT,
+                localidad TEXT,
+                iva TEXT
+            )""")
+            _columnas_norm(cx)
+            cx.execute("CREATE TABLE IF NOT EXISTS replica(clave TEXT PRIMARY KEY, valor TEXT)")
+            _crear_fts(cx)
+            origen = cx.execute("SELECT valor FROM replica WHERE clave='origen'").fetchone()
+            if origen is None or origen[0] != str(DB):
+                # Primera vez, o cambió RECIBOS_ROOT: se copia todo de nuevo
+                cx.execute("DELETE FROM clientes")
+                cx.execute("DELETE FROM replica")
+                cx.execute("INSERT INTO replica(clave, valor) VALUES('origen', ?)", [str(DB)])
+            _replica_lista = cx.execute(
+                "SELECT 1 FROM replica WHERE clave='version'").fetchone() is not None
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Réplica de clientes no disponible (%s): se lee del share", e)
+        _replica_lista = False
+
+_SQL_REPLICA_UPSERT = """
+    INSERT INTO clientes(id, nombre, cuit, domicilio, localidad, iva, nombre_norm, cuit_digits, version)
+    VALUES(?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(id) DO UPDATE SET
+      nombre=excluded.nombre, cuit=excluded.cuit, domicilio=excluded.domicilio,
+      localidad=excluded.localidad, iva=excluded.iva, nombre_norm=excluded.nombre_norm,
+      cuit_digits=excluded.cuit_digits, version=excluded.version
+"""
+
+def _a_replica(cx, filas) -> None:
+    # (id, nombre, cuit, dom, loc, iva, version); lo normalizado se recalcula
+    # porque una estación vieja pudo dejarlo vacío en el share
+    cx.executemany(_SQL_REPLICA_UPSERT, (
+        (i, n, c, d, l, iva, normalizar_nombre(n), solo_digitos(c), v)
+        for i, n, c, d, l, iva, v in filas
+    ))
+
+def sincronizar_replica(lote: int = 5000) -> int:
+    """
+    Copia a la réplica las filas del share con version mayor a la última
+    copiada. Devuelve cuántas filas trajo. Si el share no responde, deja la
+    réplica como está y devuelve 0.
+    """
+    global _replica_lista
+    if not CLIENTES_REPLICA:
+        return 0
+    total = 0
+    try:
+        rep = db.conectar(REPLICA, privada=True)
+        fila = rep.execute("SELECT valor FROM replica WHERE clave='version'").fetchone()
+        desde = int(fila[0]) if fila else 0
+        while True:
+            filas = _conn().execute(f"""
+                SELECT id, {COLUMNAS}, version FROM clientes
+                WHERE version > ? ORDER BY version LIMIT ?
+            """, [desde, lote]).fetchall()
+            if not filas and fila is not None:
+                break
+            with db.transaccion(REPLICA, privada=True) as cx:
+                _a_replica(cx, filas)
+                desde = filas[-1][-1] if filas else desde
+                cx.execute("INSERT OR REPLACE INTO replica(clave, valor) VALUES('version', ?)", [str(desde)])
+            fila = (desde,)
+            _replica_lista = True
+            total += len(filas)
+            for r in filas:
+                indice_clientes.actualizar(*r[1:6])
+            if len(filas) < lote:
+                break
+    except (sqlite3.Error, OSError) as e:   # share caído o desconectado
+        logger.warning("No se pudo sincronizar la réplica de clientes: %s", e)
+    return total
+
+# ----------------------------------------------------------------------
+# Búsquedas
+# ----------------------------------------------------------------------
 def buscar_por_nombre_o_cuit(q: str):
     """
     Devuelve tupla (nombre, cuit, domicilio, localidad, iva) o None
@@ -30,28 +269,93 @@ def buscar_por_nombre_o_cuit(q: str):
     q = (q or "").strip()
     if not q:
         return None
-    with _conn() as cx:
-        cur = cx.execute("""
-            SELECT nombre, cuit, domicilio, localidad, iva
-            FROM clientes
-            WHERE lower(nombre) = lower(?)
-               OR replace(cuit,'-','') = replace(?,'-','')
-            LIMIT 1;
-        """, [q, q])
-        return cur.fetchone()
+    nombre, digitos = normalizar_nombre(q), solo_digitos(q)
+    cur = _lectura().execute(f"""
+        SELECT {COLUMNAS}
+        FROM clientes
+        WHERE nombre_norm = ?
+           OR (? <> '' AND cuit_digits = ?)
+        LIMIT 1;
+    """, [nombre, digitos, digitos])
+    return cur.fetchone()
+
+def _escapar_like(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def buscar_clientes(texto: str, limite: int = 20) -> list[tuple]:
+    """
+    Clientes cuyo nombre o CUIT contiene 'texto' (sin importar mayúsculas,
+    acentos ni guiones). Primero coincidencias exactas, después las que
+    empiezan con el texto y al final las que lo contienen; máximo 'limite'.
+    """
+    nombre = normalizar_nombre(texto)
+    digitos = solo_digitos(texto)
+    # "20-123" busca por CUIT; "Pérez 2" por nombre
+    if digitos and not re.sub(r"[\d\s\-./]", "", str(texto or "")):
+        col, q = "cuit_digits", digitos
+    else:
+        col, q = "nombre_norm", nombre
+    if not q or limite <= 0:
+        return []
+
+    vistos, filas = set(), []
+    def agregar(cur):
+        for fila in cur:
+            if fila[0] not in vistos:
+                vistos.add(fila[0])
+                filas.append(fila[1:])
+
+    cx = _lectura()
+    # Igualdad y prefijo: rango sobre el índice (LIKE 'x%' no lo usaría:
+    # LIKE ignora mayúsculas y el índice es BINARY)
+    agregar(cx.execute(
+        f"SELECT id, {COLUMNAS} FROM clientes WHERE {col} = ? LIMIT ?", [q, limite]))
+    agregar(cx.execute(
+        f"SELECT id, {COLUMNAS} FROM clientes WHERE {col} > ? AND {col} < ? ORDER BY {col} LIMIT ?",
+        [q, q + "\U0010ffff", limite]))
+    falta = len(filas) < limite
+    if falta and _hay_fts(cx):
+        # trigram: la frase entre comillas se busca como substring (≥ 3 letras)
+        if len(q) >= 3:
+            frase = '"' + q.replace('"', '""') + '"'
+            agregar(cx.execute(f"""
+                SELECT c.id, c.nombre, c.cuit, c.domicilio, c.localidad, c.iva
+                FROM clientes_fts f JOIN clientes c ON c.id = f.rowid
+                WHERE clientes_fts MATCH ? LIMIT ?
+            """, [f"{col} : {frase}", limite]))
+    elif falta:
+        agregar(cx.execute(
+            f"SELECT id, {COLUMNAS} FROM clientes WHERE {col} LIKE ? ESCAPE '\\' LIMIT ?",
+            ["%" + _escapar_like(q) + "%", limite]))
+    return filas[:limite]
 
+# ----------------------------------------------------------------------
+# Altas / cambios
+# ----------------------------------------------------------------------
 def upsert_cliente(nombre, cuit, domicilio, localidad, iva):
     """
     Inserta o actualiza por nombre (único) los datos del cliente.
+    También actualiza la réplica local y el índice en memoria de las sugerencias.
     """
     nombre = (nombre or "").strip()
-    with _conn() as cx:
+    with db.transaccion(DB) as cx:
         cx.execute("""
-            INSERT INTO clientes(nombre, cuit, domicilio, localidad, iva)
-            VALUES(?,?,?,?,?)
+            INSERT INTO clientes(nombre, cuit, domicilio, localidad, iva, nombre_norm, cuit_digits)
+            VALUES(?,?,?,?,?,?,?)
             ON CONFLICT(nombre) DO UPDATE SET
               cuit=excluded.cuit,
               domicilio=excluded.domicilio,
               localidad=excluded.localidad,
-              iva=excluded.iva;
-        """, [nombre, cuit, domicilio, localidad, iva])
+              iva=excluded.iva,
+              cuit_digits=excluded.cuit_digits;
+        """, [nombre, cuit, domicilio, localidad, iva, normalizar_nombre(nombre), solo_digitos(cuit)])
+        fila = cx.execute(f"SELECT id, {COLUMNAS}, version FROM clientes WHERE nombre = ?", [nombre]).fetchone()
+    if _replica_lista and fila:
+        # No toca la versión sincronizada: lo de otras estaciones intermedio
+        # llega en la próxima sincronización
+        try:
+            with db.transaccion(REPLICA, privada=True) as cx:
+                _a_replica(cx, [fila])
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("No se pudo actualizar la réplica de clientes: %s", e)
+    indice_clientes.actualizar(nombre, cuit, domicilio, localidad, iva)
@@ -1,97 +1,507 @@
 # utils/contador.py
+"""
+Numeración de recibos: una secuencia independiente por punto de venta.
+
+Cada PV tiene su archivo (DB_DIR/contador_0001.json, contador_0002.json, …)
+con su propio lock, así dos estaciones con distinto PV nunca se esperan
+entre sí. El PV de esta estación sale de RECIBOS_PV, o de
+LOCAL_DIR/estacion.json ({"punto_venta": "0002"}), o del contador único
+anterior (contador_recibos.json), que se migra solo la primera vez.
+"""
 from __future__ import annotations
 from pathlib import Path
 import json, os, time, re
-from config import CONTADOR_PATH, SALIDA_DIR  # <- rutas centralizadas
+import getpass, logging, random, socket, threading, uuid
+from collections import deque
+from config import CONTADOR_PATH, SALIDA_DIR, LOCAL_DIR  # <- rutas centralizadas
+from config import CONTADOR_LOCK_TIMEOUT_S, CONTADOR_LOCK_LEASE_S, NUMERADOR_URL
+from utils.metricas import etapa
 import re, json
 _PATRON = re.compile(r"(\d{4})-(\d{8})")
 
+logger = logging.getLogger("recibos")
+_HOST = socket.gethostname()
+try:
+    _USUARIO = getpass.getuser()
+except Exception:
+    _USUARIO = "?"
+
 DEF_PUNTO_VENTA = "0001"
 DEF_ULTIMO_NUM  = 0
+ESTACION_PATH = LOCAL_DIR / "estacion.json"
 
-def _scan_max_from_pdfs():
-    mayor = 0; pv = "0001"
-    for f in SALIDA_DIR.glob("*.pdf"):
-        m = _PATRON.search(f.name)
-        if m:
-            pv = m.group(1); mayor = max(mayor, int(m.group(2)))
-    return pv, mayor
-
-def _init_if_missing():
-    """Si no existe el JSON, lo crea tomando como base los PDFs ya guardados."""
-    if not CONTADOR_PATH.exists():
-        pv, mayor = _scan_max_from_pdfs()
-        data = {"punto_venta": pv, "ultimo_numero": mayor}
-        CONTADOR_PATH.parent.mkdir(parents=True, exist_ok=True)
-        CONTADOR_PATH.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-
-def _leer():
-    if not CONTADOR_PATH.exists():
-        pv, mayor = _scan_max_from_pdfs()
-        data = {"punto_venta": pv, "ultimo_numero": mayor}
-        CONTADOR_PATH.parent.mkdir(parents=True, exist_ok=True)
-        CONTADOR_PATH.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-        return data
+# ----------------------------------------------------------------------
+# Punto de venta de la estación
+# ----------------------------------------------------------------------
+def _pv(valor) -> str:
+    pv = str(valor or "").strip()
+    if not pv.isdigit() or len(pv) > 4:
+        raise ValueError(f"Punto de venta inválido: {valor!r} (hasta 4 dígitos)")
+    return pv.zfill(4)
+
+def punto_venta_estacion() -> str:
+    """RECIBOS_PV > LOCAL_DIR/estacion.json > PV del contador único anterior > 0001."""
+    env = os.getenv("RECIBOS_PV")
+    if env:
+        return _pv(env)
+    for ruta in (ESTACION_PATH, CONTADOR_PATH):
+        try:
+            return _pv(json.loads(ruta.read_text(encoding="utf-8"))["punto_venta"])
+        except Exception:
+            continue
+    return DEF_PUNTO_VENTA
+
+def set_punto_venta(nuevo_pv: str) -> None:
+    """Fija el PV de *esta* estación (no toca ninguna secuencia)."""
+    ESTACION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    ESTACION_PATH.write_text(json.dumps({"punto_venta": _pv(nuevo_pv)}), encoding="utf-8")
+
+def ruta_contador(pv: str | None = None) -> Path:
+    return CONTADOR_PATH.with_name(f"contador_{_pv(pv or punto_venta_estacion())}.json")
+
+# ----------------------------------------------------------------------
+# Escaneo de PDFs (reconciliación)
+# ----------------------------------------------------------------------
+def _scan_max_from_pdfs() -> dict[str, int]:
+    """{pv: mayor número} de SALIDA_DIR (un listado completo: caro en el share)."""
+    mayores: dict[str, int] = {}
+    try:
+        entradas = os.scandir(SALIDA_DIR)
+    except FileNotFoundError:
+        return mayores
+    with entradas:
+        for e in entradas:
+            if not e.name.lower().endswith(".pdf"):
+                continue
+            m = _PATRON.search(e.name)
+            if m:
+                pv, n = m.group(1), int(m.group(2))
+                if n > mayores.get(pv, 0):
+                    mayores[pv] = n
+    return mayores
+
+def _mtime_salida() -> int | None:
+    """mtime de SALIDA_DIR: cambia cuando se crea/borra un PDF (un solo stat)."""
+    try:
+        return os.stat(SALIDA_DIR).st_mtime_ns
+    except OSError:
+        return None
+
+def _desde_pdfs(pv: str) -> dict:
+    mt = _mtime_salida()
+    mayor = _scan_max_from_pdfs().get(pv, 0)
+    data = {"punto_venta": pv, "ultimo_numero": mayor, "escaneo": {"mtime_ns": mt, "maximo": mayor}}
+    # Migración: el contador único anterior puede ir por delante de los PDFs
+    try:
+        viejo = json.loads(CONTADOR_PATH.read_text(encoding="utf-8"))
+        if _pv(viejo.get("punto_venta")) == pv and int(viejo["ultimo_numero"]) > mayor:
+            data["ultimo_numero"] = int(viejo["ultimo_numero"])
+            logger.info("Contador %s migrado desde %s (%d)", pv, CONTADOR_PATH.name, data["ultimo_numero"])
+    except Exception:
+        pass
+    return data
+
+def _reconstruir(pv: str) -> dict:
+    """
+    Marca del PV cuando falta el JSON o está dañado: el mayor entre los PDFs
+    y el libro de recibos (que también tiene los números sin PDF: Reservado,
+    Error).
+    """
+    data = _desde_pdfs(pv)
+    try:
+        from utils import libro_recibos
+        en_libro = libro_recibos.ultimo_numero(pv)
+    except Exception as e:
+        logger.warning("No se pudo leer el libro de recibos para reconstruir el contador %s: %s", pv, e)
+        en_libro = 0
+    if en_libro > data["ultimo_numero"]:
+        data["ultimo_numero"] = en_libro
+    return data
+
+def _init_if_missing(pv: str | None = None):
+    """Si no existe el JSON del PV, lo crea (con el lock) desde PDFs y libro."""
+    pv = _pv(pv or punto_venta_estacion())
+    if not ruta_contador(pv).exists():
+        _with_lock(lambda: _leer(pv, bajo_lock=True), pv)
+
+def _leer(pv: str, bajo_lock: bool = False):
+    """
+    El JSON es la marca más alta ya emitida en ese PV: no se listan los PDFs
+    salvo que falte o esté dañado (ver reconciliar()). En ese caso se
+    reconstruye, pero sólo se escribe con bajo_lock=True (dentro de
+    _with_lock): una lectura sin lock nunca pisa lo que otra estación está
+    guardando.
+    """
+    ruta = ruta_contador(pv)
     try:
-        data = json.loads(CONTADOR_PATH.read_text(encoding="utf-8"))
+        data = json.loads(ruta.read_text(encoding="utf-8"))
+        int(data["ultimo_numero"])
+        return data
+    except FileNotFoundError:
+        pass
     except Exception:
-        data = {"punto_venta": "0001", "ultimo_numero": 0}
-    pv_pdf, mayor_pdf = _scan_max_from_pdfs()
-    if mayor_pdf > int(data.get("ultimo_numero", 0)):
-        if pv_pdf: data["punto_venta"] = pv_pdf
-        data["ultimo_numero"] = mayor_pdf
-        _guardar(data)
+        logger.warning("Contador %s dañado: se reconstruye desde PDFs y libro de recibos", ruta.name)
+    data = _reconstruir(pv)
+    if bajo_lock:
+        _guardar(data, pv)
     return data
 
-def _guardar(data: dict) -> None:
-    CONTADOR_PATH.parent.mkdir(parents=True, exist_ok=True)
-    tmp = CONTADOR_PATH.with_suffix(".json.tmp")
+def _guardar(data: dict, pv: str) -> None:
+    ruta = ruta_contador(pv)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ruta.with_suffix(".json.tmp")
     tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-    tmp.replace(CONTADOR_PATH)
+    tmp.replace(ruta)
 
 def _zfill8(n: int) -> str:
     return str(n).zfill(8)
 
-def _with_lock(func):
-    """Lock por archivo: evita que dos procesos incrementen al mismo tiempo."""
-    lock = CONTADOR_PATH.with_suffix(".lock")
-    for _ in range(30):  # ~3s máximo
+# ----------------------------------------------------------------------
+# Lock entre procesos/estaciones: archivo .lock con dueño y vencimiento
+# ----------------------------------------------------------------------
+_STATS = {"tomas": 0, "con_espera": 0, "espera_total_s": 0.0, "espera_max_s": 0.0, "vencidos_rotos": 0}
+_STATS_LOCK = threading.Lock()
+_ESPERAS = deque(maxlen=10_000)   # últimas esperas (s), para percentiles
+
+def _pid_vivo(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        # os.kill(pid, 0) en Windows *termina* el proceso: se consulta con OpenProcess
+        import ctypes
+        k32 = ctypes.windll.kernel32
+        h = k32.OpenProcess(0x1000, False, pid)   # PROCESS_QUERY_LIMITED_INFORMATION
+        if not h:
+            return ctypes.GetLastError() == 5     # acceso denegado → existe
+        try:
+            code = ctypes.c_ulong()
+            k32.GetExitCodeProcess(h, ctypes.byref(code))
+            return code.value == 259              # STILL_ACTIVE
+        finally:
+            k32.CloseHandle(h)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def _leer_dueno(ruta: Path) -> dict | None:
+    try:
+        return json.loads(ruta.read_text(encoding="utf-8"))
+    except Exception:
+        return None   # a medio escribir o ya liberado
+
+# Vencimiento con el reloj monotónico de *esta* PC: un lock vence cuando se
+# lo viene viendo sin cambios (mismo token, o mismo archivo si no se puede
+# leer) durante más de su lease. No se compara con el "ts" del dueño ni con
+# el mtime del share: las PCs pueden tener los relojes corridos.
+_VISTOS: dict[str, tuple] = {}   # ruta → (firma, monotonic de la primera vez)
+_VISTOS_LOCK = threading.Lock()
+
+def _visto_hace(ruta: Path, firma) -> float:
+    """Segundos que lleva 'ruta' con la misma firma según esta PC (0 la primera vez)."""
+    ahora = time.monotonic()
+    with _VISTOS_LOCK:
+        previo = _VISTOS.get(str(ruta))
+        if previo is None or previo[0] != firma:
+            _VISTOS[str(ruta)] = (firma, ahora)
+            return 0.0
+        return ahora - previo[1]
+
+def _firma_archivo(ruta: Path):
+    st = ruta.stat()
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _vencido(dueno: dict | None, lock: Path) -> bool:
+    """Lock huérfano: el proceso dueño (en esta PC) ya no existe, o lleva más que su lease sin cambiar."""
+    if dueno is None:
+        # Sin datos legibles: vale que el archivo no cambie
+        try:
+            firma = ("archivo", _firma_archivo(lock))
+        except OSError:
+            return False
+        return _visto_hace(lock, firma) > CONTADOR_LOCK_LEASE_S
+    if dueno.get("host") == _HOST and not _pid_vivo(int(dueno.get("pid", 0))):
+        return True
+    lease = float(dueno.get("lease_s", CONTADOR_LOCK_LEASE_S))
+    return _visto_hace(lock, ("token", dueno.get("token"))) > lease
+
+def _tomar_romper(romper: Path) -> bool:
+    """
+    Toma <lock>.romper (O_EXCL). Si quedó de alguien que murió a mitad (se
+    tiene tomado un instante) se limpia cuando esta PC lo vio sin cambios
+    más que el lease.
+    """
+    try:
+        fd = os.open(str(romper), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            firma = _firma_archivo(romper)
+            if _visto_hace(romper, firma) > CONTADOR_LOCK_LEASE_S and _firma_archivo(romper) == firma:
+                os.remove(romper)
+        except OSError:
+            pass
+        return False
+    except OSError:
+        return False
+    os.close(fd)
+    return True
+
+def _soltar_romper(romper: Path) -> None:
+    try:
+        os.remove(romper)
+    except OSError:
+        pass
+
+def _romper(lock: Path, visto: dict | None) -> bool:
+    """
+    Borra un lock vencido. Quien rompe y quien suelta su propio lock
+    (_soltar_lock) se turnan con un segundo archivo exclusivo
+    (<lock>.romper): con ese tomado el lock sólo puede cambiar de dueño si
+    alguien lo crea de cero, cosa imposible mientras exista. Se vuelve a leer
+    el dueño y se borra sólo si sigue siendo el mismo que se vio vencido; un
+    lock con otro token (lo tomó alguien mientras tanto) nunca se toca.
+    """
+    romper = lock.with_name(lock.name + ".romper")
+    if not _tomar_romper(romper):
+        return False
+    try:
+        actual = _leer_dueno(lock)
+        if visto is None or actual is None:
+            mismo = visto is None and actual is None
+        else:
+            mismo = actual.get("token") == visto.get("token")
+        if not mismo or not _vencido(actual, lock):
+            return False
+        try:
+            os.remove(lock)
+        except OSError:
+            return False
+    finally:
+        _soltar_romper(romper)
+    logger.warning("Lock del contador vencido liberado: %s (dueño %s)", lock.name, actual)
+    with _STATS_LOCK:
+        _STATS["vencidos_rotos"] += 1
+    return True
+
+def _tomar_lock(lock: Path) -> str:
+    """
+    Espera con backoff exponencial + jitter; TimeoutError si no se consigue.
+    La espera nunca es menor que el lease: un lock huérfano de otra PC se
+    rompe recién después de verlo ese tiempo sin cambios.
+    """
+    token = uuid.uuid4().hex
+    dueno = json.dumps({
+        "host": _HOST, "pid": os.getpid(), "usuario": _USUARIO,
+        "ts": time.time(), "lease_s": CONTADOR_LOCK_LEASE_S, "token": token,
+    })
+    t0 = time.monotonic()
+    limite = t0 + max(CONTADOR_LOCK_TIMEOUT_S, CONTADOR_LOCK_LEASE_S + 1)
+    pausa = 0.005
+    while True:
         try:
             fd = os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            os.close(fd)
-            try:
-                return func()
-            finally:
-                try:
-                    os.remove(lock)
-                except OSError:
-                    pass
         except FileExistsError:
-            time.sleep(0.1)
-    # fallback si no se pudo bloquear
-    return func()
-
-def ver_numero_siguiente() -> str:
-    """No incrementa; muestra el siguiente (preview)."""
-    data = _leer()
-    pv = str(data.get("punto_venta", DEF_PUNTO_VENTA)).zfill(4)
+            visto = _leer_dueno(lock)
+            if _vencido(visto, lock) and _romper(lock, visto):
+                continue
+            if time.monotonic() >= limite:
+                raise TimeoutError(
+                    f"El contador sigue bloqueado después de {time.monotonic() - t0:.0f} s "
+                    f"por {visto.get('usuario', '?')}@{visto.get('host', '?')} (pid {visto.get('pid', '?')})"
+                    if visto else f"No se pudo bloquear el contador ({lock})"
+                )
+            time.sleep(pausa * random.uniform(0.5, 1.5))
+            pausa = min(pausa * 2, 0.25)
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(dueno)
+        break
+
+    espera = time.monotonic() - t0
+    with _STATS_LOCK:
+        _STATS["tomas"] += 1
+        _STATS["espera_total_s"] += espera
+        _STATS["espera_max_s"] = max(_STATS["espera_max_s"], espera)
+        if espera > 0.05:
+            _STATS["con_espera"] += 1
+        _ESPERAS.append(espera)
+    if espera > 0.05:
+        logger.info("Lock del contador: espera %.0f ms", espera * 1000)
+    return token
+
+def _soltar_lock(lock: Path, token: str) -> None:
+    """
+    Borra el lock si sigue siendo propio, con <lock>.romper tomado (ver
+    _romper()). Si no se consigue a tiempo se deja: vence solo.
+    """
+    romper = lock.with_name(lock.name + ".romper")
+    limite = time.monotonic() + CONTADOR_LOCK_TIMEOUT_S
+    pausa = 0.002
+    while not _tomar_romper(romper):
+        if time.monotonic() >= limite:
+            logger.warning("No se pudo liberar el lock del contador %s: queda hasta que venza", lock.name)
+            return
+        time.sleep(pausa * random.uniform(0.5, 1.5))
+        pausa = min(pausa * 2, 0.1)
+    try:
+        dueno = _leer_dueno(lock)
+        if dueno is not None and dueno.get("token") != token:
+            # Nos lo rompieron por vencido (sección crítica más larga que el lease)
+            logger.warning("Lock del contador ya no era propio al liberarlo: %s", dueno)
+            return
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+    finally:
+        _soltar_romper(romper)
+
+def _with_lock(func, pv: str):
+    """Lock por archivo (uno por PV): evita que dos procesos incrementen al mismo tiempo."""
+    lock = ruta_contador(pv).with_suffix(".lock")
+    with etapa("lock_contador"):
+        token = _tomar_lock(lock)
+    try:
+        return func()
+    finally:
+        _soltar_lock(lock, token)
+
+def estadisticas_lock() -> dict:
+    """Contención del lock en este proceso (tomas, esperas > 50 ms, tiempos en s)."""
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+def esperas_lock() -> list[float]:
+    """Últimas esperas por el lock (s) en este proceso, en orden de llegada."""
+    with _STATS_LOCK:
+        return list(_ESPERAS)
+
+def ver_numero_siguiente(pv: str | None = None) -> str:
+    """No incrementa ni escribe; muestra el siguiente del PV (preview)."""
+    pv = _pv(pv or punto_venta_estacion())
+    data = _leer(pv)
     siguiente = int(data.get("ultimo_numero", DEF_ULTIMO_NUM)) + 1
     return f"{pv}-{_zfill8(siguiente)}"
 
-def incrementar_contador() -> str:
-    """Incrementa y devuelve el nuevo número ya formateado (con lock)."""
+def incrementar_contador(pv: str | None = None, datos: dict | None = None) -> str:
+    """
+    Incrementa la secuencia del PV (default: el de la estación) y devuelve el
+    número. Con RECIBOS_NUMERADOR_URL se pide al servicio de numeración
+    (utils/numerador.py); si no se puede conectar o rechaza el pedido, se usa
+    el archivo del share. Si el pedido llegó y la respuesta no, se propaga el
+    error: numerar por archivo dejaría salteado el que el servicio asignó.
+    Con 'datos' (los del recibo) el número queda además registrado como
+    Reservado en el libro de recibos (utils/libro_recibos.py).
+    """
+    pv = _pv(pv or punto_venta_estacion())
+    if NUMERADOR_URL:
+        from utils.numerador import pedir_numero
+        try:
+            with etapa("numerador_remoto"):
+                numero = pedir_numero(pv, url=NUMERADOR_URL)
+        except ConnectionError as e:
+            logger.warning("Numerador %s no disponible (%s): se usa el contador del share", NUMERADOR_URL, e)
+        else:
+            if datos is not None:
+                # El número ya es nuestro: si el libro falla queda salteado
+                from utils import libro_recibos
+                with etapa("libro_reservar"):
+                    libro_recibos.reservar(numero, datos)
+            return numero
+    return incrementar_en_archivo(pv, datos)
+
+def incrementar_en_archivo(pv: str | None = None, datos: dict | None = None) -> str:
+    """incrementar_contador() directo sobre contador_<PV>.json (con lock)."""
+    pv = _pv(pv or punto_venta_estacion())
+    if datos is not None:
+        from utils import libro_recibos
+        libro_recibos.init_db()   # fuera del lock
+
     def _update():
-        data = _leer()
-        data["ultimo_numero"] = int(data.get("ultimo_numero", DEF_ULTIMO_NUM)) + 1
-        _guardar(data)
-        pv = str(data.get("punto_venta", DEF_PUNTO_VENTA)).zfill(4)
-        return f"{pv}-{_zfill8(data['ultimo_numero'])}"
-    return _with_lock(_update)
+        data = _leer(pv, bajo_lock=True)
+        anterior = int(data.get("ultimo_numero", DEF_ULTIMO_NUM))
+        data["ultimo_numero"] = anterior + 1
+        _guardar(data, pv)
+        if datos is None:
+            return f"{pv}-{_zfill8(data['ultimo_numero'])}"
+        # Mismo lock: el número y su fila del libro van juntos
+        try:
+            with etapa("libro_reservar"):
+                return _reservar(data, pv, datos)
+        except Exception:
+            data["ultimo_numero"] = anterior
+            _guardar(data, pv)
+            raise
+    return _with_lock(_update, pv)
 
-def set_punto_venta(nuevo_pv: str) -> None:
-    """Cambia el PV; no toca el contador."""
-    def _set():
-        data = _leer()
-        data["punto_venta"] = str(nuevo_pv).zfill(4)
-        _guardar(data)
-    _with_lock(_set)
+def _reservar(data: dict, pv: str, datos: dict) -> str:
+    import sqlite3
+    from utils import libro_recibos
+    numero = f"{pv}-{_zfill8(data['ultimo_numero'])}"
+    try:
+        libro_recibos.reservar(numero, datos)
+        return numero
+    except sqlite3.IntegrityError:
+        # El libro ya tiene ese número: el contador quedó atrás (JSON de un
+        # backup, PDFs borrados). Se sigue desde el último del libro.
+        ultimo = libro_recibos.ultimo_numero(pv)
+        logger.warning("Contador %s atrás del libro de recibos (%s < %s): se ajusta",
+                       pv, data["ultimo_numero"], ultimo + 1)
+        data["ultimo_numero"] = max(ultimo, data["ultimo_numero"]) + 1
+        _guardar(data, pv)
+        numero = f"{pv}-{_zfill8(data['ultimo_numero'])}"
+        libro_recibos.reservar(numero, datos)
+        return numero
+
+def reconciliar(forzar: bool = False, pv: str | None = None) -> bool:
+    """
+    Sube el contador del PV si en SALIDA_DIR hay PDFs de ese PV con un número
+    mayor (copiados a mano, emitidos con otra versión, JSON restaurado de un
+    backup…). Sólo lista la carpeta si su mtime cambió desde el último
+    escaneo o con forzar=True. Devuelve True si el contador cambió.
+    De paso cierra en el libro los números que quedaron Reservado.
+    """
+    pv = _pv(pv or punto_venta_estacion())
+    try:
+        from utils import libro_recibos
+        cerrados = libro_recibos.reconciliar_reservados()
+        if any(cerrados.values()):
+            logger.info("Libro de recibos: reservados cerrados %s", cerrados)
+    except Exception:
+        logger.exception("No se pudieron reconciliar los reservados del libro")
+    data = _leer(pv)
+    mt = _mtime_salida()
+    if not forzar and mt is not None and (data.get("escaneo") or {}).get("mtime_ns") == mt:
+        return False
+
+    mayor = _scan_max_from_pdfs().get(pv, 0)   # fuera del lock: es lo lento
+
+    def _aplicar():
+        d = _leer(pv, bajo_lock=True)
+        cambio = mayor > int(d.get("ultimo_numero", DEF_ULTIMO_NUM))
+        if cambio:
+            d["ultimo_numero"] = mayor
+        d["escaneo"] = {"mtime_ns": mt, "maximo": mayor}
+        _guardar(d, pv)
+        return cambio
+    return _with_lock(_aplicar, pv)
+
+def resincronizar(pv: str | None = None) -> str:
+    """Reconciliación completa a pedido; devuelve el próximo número."""
+    reconciliar(forzar=True, pv=pv)
+    return ver_numero_siguiente(pv)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m utils.contador",
+                                 description="Resincroniza el contador con los PDFs y muestra el próximo número.")
+    ap.add_argument("--pv", default=None, help="punto de venta (default: el de esta estación)")
+    ap.add_argument("--fijar-pv", default=None, help="guarda el PV de esta estación en estacion.json")
+    args = ap.parse_args()
+    if args.fijar_pv:
+        set_punto_venta(args.fijar_pv)
+        print(f"PV de esta estación: {punto_venta_estacion()}")
+    print(f"Próximo número: {resincronizar(args.pv)}")
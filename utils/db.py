@@ -0,0 +1,139 @@
+# utils/db.py
+"""
+Conexiones SQLite reutilizables (clientes.db y las demás bases de DB_DIR).
+
+    cx = conectar(DB)                    # lecturas
+    with transaccion(DB) as cx:          # escrituras (BEGIN IMMEDIATE)
+        cx.execute("INSERT ...")
+
+Una conexión por hilo y por archivo, que queda abierta: abrir la base en el
+share cuesta varios viajes por la red (abrir, leer el encabezado, locks).
+Cada conexión mantiene su caché de sentencias preparadas, así que conviene
+usar siempre el mismo texto SQL con parámetros '?'.
+
+Modo de journal según dónde está el archivo:
+    share (SMB/NFS)   DELETE + synchronous=FULL. WAL usa memoria compartida
+                      entre procesos de una misma PC y se corrompe si dos PCs
+                      abren la base por la red.
+    disco local       WAL + synchronous=NORMAL sólo para bases privadas de
+                      esta PC (privada=True) o con RECIBOS_SQLITE_WAL=1; una
+                      base compartida puede estar en el disco local de la PC
+                      que la publica en la red.
+Con RECIBOS_SQLITE_WAL=0 nunca se usa WAL.
+
+Si otra estación está escribiendo, busy_timeout (RECIBOS_SQLITE_BUSY_MS)
+hace que SQLite espere y reintente en vez de fallar con "database is locked".
+Las escrituras arrancan con BEGIN IMMEDIATE: se espera el lock al empezar y
+no a mitad de la transacción, donde SQLite no puede esperar sin riesgo de
+deadlock y falla de inmediato.
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+from config import SQLITE_BUSY_TIMEOUT_MS, SQLITE_WAL
+
+_local = threading.local()
+
+FS_RED = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "9p", "fuse.sshfs", "davfs"}
+
+@lru_cache(maxsize=32)
+def en_red(carpeta: str) -> bool:
+    """True si la carpeta está en un share de red (UNC, unidad de red, cifs/nfs)."""
+    s = str(carpeta)
+    if s.startswith(("\\\\", "//")):
+        return True
+    if os.name == "nt":
+        import ctypes
+        unidad = Path(s).drive
+        if not unidad:
+            return False
+        DRIVE_REMOTE = 4
+        return ctypes.windll.kernel32.GetDriveTypeW(unidad + "\\") == DRIVE_REMOTE
+    # POSIX: tipo de filesystem del punto de montaje más largo que la contiene
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            montajes = [l.split()[1:3] for l in f if len(l.split()) >= 3]
+    except OSError:
+        return False
+    tipo, largo = "", -1
+    for punto, fs in montajes:
+        punto = punto.replace("\\040", " ")
+        if (s == punto or s.startswith(punto.rstrip("/") + "/")) and len(punto) > largo:
+            tipo, largo = fs, len(punto)
+    return tipo in FS_RED
+
+def _usar_wal(ruta: Path, privada: bool) -> bool:
+    if SQLITE_WAL == "0" or en_red(str(ruta.parent)):
+        return False
+    return privada or SQLITE_WAL == "1"
+
+def _abrir(ruta: Path, privada: bool) -> sqlite3.Connection:
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # isolation_level=None: las transacciones las abre transaccion() a mano
+    cx = sqlite3.connect(ruta, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                         isolation_level=None, check_same_thread=True,
+                         cached_statements=256)
+    cx.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+    if _usar_wal(ruta, privada):
+        cx.execute("PRAGMA journal_mode = WAL")
+        cx.execute("PRAGMA synchronous = NORMAL")
+    else:
+        try:
+            # Una base que quedó en WAL no se puede abrir bien desde otra PC
+            if cx.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                cx.execute("PRAGMA journal_mode = DELETE")
+        except sqlite3.OperationalError:
+            pass   # otra estación la tiene abierta; se reintenta en la próxima
+        cx.execute("PRAGMA synchronous = FULL")
+    cx.execute("PRAGMA temp_store = MEMORY")
+    cx.execute("PRAGMA cache_size = -8000")   # 8 MB: menos lecturas por la red
+    return cx
+
+def conectar(ruta: Path | str, privada: bool = False) -> sqlite3.Connection:
+    """
+    Conexión de este hilo a 'ruta' (se abre la primera vez). privada=True
+    para bases que sólo usa esta PC (réplicas en LOCAL_DIR).
+    """
+    ruta = Path(ruta)
+    conexiones = getattr(_local, "conexiones", None)
+    # Después de un fork la conexión heredada no se puede usar
+    if conexiones is None or getattr(_local, "pid", None) != os.getpid():
+        conexiones = _local.conexiones = {}
+        _local.pid = os.getpid()
+    cx = conexiones.get(ruta)
+    if cx is None:
+        cx = conexiones[ruta] = _abrir(ruta, privada)
+    return cx
+
+@contextmanager
+def transaccion(ruta: Path | str, privada: bool = False):
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK si hay excepción)."""
+    cx = conectar(ruta, privada)
+    if cx.in_transaction:
+        # anidada: la maneja la transacción de afuera
+        yield cx
+        return
+    cx.execute("BEGIN IMMEDIATE")
+    try:
+        yield cx
+    except BaseException:
+        cx.execute("ROLLBACK")
+        raise
+    else:
+        cx.execute("COMMIT")
+
+def cerrar(ruta: Path | str) -> None:
+    """Cierra la conexión de este hilo a 'ruta' (p. ej. antes de reemplazar el archivo)."""
+    cx = getattr(_local, "conexiones", {}).pop(Path(ruta), None)
+    if cx is not None:
+        cx.close()
+
+def cerrar_todas() -> None:
+    """Al salir de la app. Sólo cierra las de este hilo; las demás se sueltan al terminar."""
+    for ruta in list(getattr(_local, "conexiones", {})):
+        cerrar(ruta)
@@ -0,0 +1,225 @@
+# utils/estres_contador.py
+"""
+Prueba de estrés de la numeración: N procesos pidiendo M números cada uno
+contra un RECIBOS_ROOT temporal, todos a la vez.
+
+    python -m utils.estres_contador --procesos 8 --numeros 200
+    python -m utils.estres_contador --falla lock_huerfano
+    python -m utils.estres_contador --falla json_corrupto
+    python -m utils.estres_contador --numerador        # vía POST /api/numero
+    python -m utils.estres_contador --libro            # con fila en recibos.db
+
+Al final verifica que no haya números repetidos ni salteados y muestra
+números/segundo, latencia de incrementar_contador() y espera por el lock
+(p50/p95/p99/máx). Exit code 1 si hay repetidos, huecos o errores.
+Con --numerador la espera por el lock queda en el servidor (este proceso)
+y no se reporta.
+
+Fallas que se pueden inyectar:
+    lock_huerfano   un proceso toma el lock y muere sin soltarlo (kill -9)
+    lock_vencido    queda un lock de "otra PC" que nadie suelta; vence cuando
+                    cada worker lo vio sin cambios más que el lease
+    json_corrupto   se pisa contador_<PV>.json con basura (sin lock)
+Las de lock quedan puestas antes de la largada, así los workers siempre las
+encuentran. json_corrupto se inyecta a mitad de la corrida (pasada --demora
+y con al menos un cuarto de los números asignados); cada worker deja un PDF
+vacío por número, como la app, para que el contador se pueda reconstruir
+desde SALIDA_DIR. Si la falla no tuvo efecto (ningún lock vencido roto, o el
+JSON sigue dañado al final) también sale con exit code 1.
+La corrida usa un lease corto (RECIBOS_LOCK_LEASE_S=2 si no está definido)
+para que el lock vencido se rompa en segundos y no en medio minuto.
+"""
+from __future__ import annotations
+import argparse, json, math, multiprocessing, os, shutil, sys, tempfile, time
+from pathlib import Path
+
+FALLAS = ("ninguna", "lock_huerfano", "lock_vencido", "json_corrupto")
+PV = "0001"
+
+def _percentiles(valores: list[float]) -> dict:
+    if not valores:
+        return {}
+    v = sorted(valores)
+    def p(q):
+        return v[max(0, min(len(v), math.ceil(q / 100 * len(v))) - 1)] * 1000
+    return {"p50": round(p(50), 2), "p95": round(p(95), 2), "p99": round(p(99), 2), "max": round(v[-1] * 1000, 2)}
+
+# ----------------------------------------------------------------------
+# Procesos
+# ----------------------------------------------------------------------
+_DATOS_LIBRO = {"fecha": "01/01/2024", "cliente": "Estrés", "total": 100.0}
+
+def _worker(cantidad: int, largada, con_pdfs: bool, con_libro: bool = False):
+    from config import SALIDA_DIR
+    from utils.contador import incrementar_contador, esperas_lock, estadisticas_lock
+
+    numeros, latencias, errores = [], [], []
+    largada.wait()
+    for _ in range(cantidad):
+        t0 = time.perf_counter()
+        try:
+            n = incrementar_contador(datos=dict(_DATOS_LIBRO) if con_libro else None)
+        except Exception as e:
+            errores.append(f"{type(e).__name__}: {e}")
+            continue
+        latencias.append(time.perf_counter() - t0)
+        numeros.append(n)
+        if con_pdfs:
+            (SALIDA_DIR / f"Recibo_{n}__Estres.pdf").touch()
+    return numeros, latencias, esperas_lock(), estadisticas_lock(), errores
+
+def _morir_con_el_lock():
+    """Toma el lock del PV y se mata sin soltarlo (como un crash a mitad de _guardar)."""
+    from utils.contador import _tomar_lock, ruta_contador
+    _tomar_lock(ruta_contador(PV).with_suffix(".lock"))
+    os.kill(os.getpid(), 9) if os.name != "nt" else os._exit(1)
+
+def _inyectar_lock(falla: str, ctx) -> str:
+    """Deja el lock del PV tomado por un dueño que nunca lo va a soltar."""
+    from config import CONTADOR_LOCK_LEASE_S
+    from utils.contador import ruta_contador
+
+    if falla == "lock_huerfano":
+        p = ctx.Process(target=_morir_con_el_lock)
+        p.start()
+        p.join()
+        return f"proceso {p.pid} murió con el lock tomado (exit {p.exitcode})"
+    lock = ruta_contador(PV).with_suffix(".lock")
+    lock.parent.mkdir(parents=True, exist_ok=True)
+    dueno = {"host": "otra-pc", "pid": 1, "usuario": "estres", "token": "estres",
+             "ts": time.time(), "lease_s": CONTADOR_LOCK_LEASE_S}
+    lock.write_text(json.dumps(dueno), encoding="utf-8")
+    return f"lock de otra PC sin renovar (lease {CONTADOR_LOCK_LEASE_S:g} s)"
+
+def _corromper_json(demora: float, total: int) -> str:
+    """Pisa el JSON con basura cuando ya hay un cuarto de los números asignados."""
+    from utils.contador import ruta_contador
+    ruta = ruta_contador(PV)
+
+    time.sleep(demora)
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        try:
+            ultimo = int(json.loads(ruta.read_text(encoding="utf-8"))["ultimo_numero"])
+        except Exception:
+            ultimo = 0   # todavía no existe, o a medio reemplazar
+        if ultimo >= total // 4:
+            break
+        time.sleep(0.001)
+    ruta.write_text('{"punto_venta": "0001", "ultimo_nu', encoding="utf-8")
+    return f"{ruta.name} pisado con JSON truncado (iba por {ultimo} de {total})"
+
+def _json_sano() -> bool:
+    from utils.contador import ruta_contador
+    try:
+        int(json.loads(ruta_contador(PV).read_text(encoding="utf-8"))["ultimo_numero"])
+        return True
+    except Exception:
+        return False
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m utils.estres_contador", description="Estrés de incrementar_contador().")
+    ap.add_argument("--procesos", type=int, default=8)
+    ap.add_argument("--numeros", type=int, default=200, help="números por proceso")
+    ap.add_argument("--falla", choices=FALLAS, default="ninguna")
+    ap.add_argument("--demora", type=float, default=0.0, help="json_corrupto: segundos mínimos hasta pisar el JSON")
+    ap.add_argument("--pdfs", action="store_true", help="dejar un PDF vacío por número (como la app)")
+    ap.add_argument("--numerador", action="store_true", help="pedir los números a un servicio local (utils.numerador)")
+    ap.add_argument("--libro", action="store_true", help="registrar cada número en el libro de recibos (recibos.db)")
+    ap.add_argument("--json", default=None, help="guardar el resumen en este archivo")
+    args = ap.parse_args(argv)
+
+    raiz = Path(tempfile.mkdtemp(prefix="recibos_estres_"))
+    os.environ.update(RECIBOS_ROOT=str(raiz), RECIBOS_LOCAL_DIR=str(raiz / "local"), RECIBOS_PV=PV)
+    os.environ.pop("RECIBOS_NUMERADOR_URL", None)
+    os.environ.setdefault("RECIBOS_LOCK_LEASE_S", "2")
+    con_pdfs = args.pdfs or args.falla == "json_corrupto"
+
+    # spawn: cada worker arranca de cero, como otra estación
+    ctx = multiprocessing.get_context("spawn")
+    servidor = None
+    try:
+        if args.numerador:
+            from utils.numerador import servidor_local
+            servidor = servidor_local()
+            os.environ["RECIBOS_NUMERADOR_URL"] = servidor.__enter__()
+
+        largada = ctx.Manager().Event()
+        with ctx.Pool(args.procesos) as pool:
+            pendientes = [pool.apply_async(_worker, (args.numeros, largada, con_pdfs, args.libro)) for _ in range(args.procesos)]
+            time.sleep(0.5)   # que todos estén esperando la largada
+            falla = ""
+            if args.falla in ("lock_huerfano", "lock_vencido"):
+                falla = _inyectar_lock(args.falla, ctx)
+            t0 = time.perf_counter()
+            largada.set()
+            if args.falla == "json_corrupto":
+                falla = _corromper_json(args.demora, args.procesos * args.numeros)
+            resultados = [r.get() for r in pendientes]
+            duracion = time.perf_counter() - t0
+        json_sano = _json_sano()
+        en_libro = None
+        if args.libro:
+            import sqlite3
+            from config import RECIBOS_DB
+            with sqlite3.connect(RECIBOS_DB) as cx:
+                en_libro = cx.execute("SELECT COUNT(*) FROM recibos").fetchone()[0]
+    finally:
+        if servidor is not None:
+            servidor.__exit__(None, None, None)
+        shutil.rmtree(raiz, ignore_errors=True)
+
+    numeros = [n for r in resultados for n in r[0]]
+    latencias = [x for r in resultados for x in r[1]]
+    esperas = [x for r in resultados for x in r[2]]
+    errores = [e for r in resultados for e in r[4]]
+    rotos = sum(r[3]["vencidos_rotos"] for r in resultados)
+    if args.numerador:
+        # el lock lo toma el servidor, que corre en este proceso
+        from utils.contador import estadisticas_lock
+        rotos += estadisticas_lock()["vencidos_rotos"]
+    sin_efecto = None
+    if args.falla in ("lock_huerfano", "lock_vencido") and not rotos:
+        sin_efecto = "ningún worker rompió el lock"
+    elif args.falla == "json_corrupto" and not json_sano:
+        sin_efecto = "el JSON sigue dañado: nadie numeró después de pisarlo"
+
+    valores = sorted(int(n.split("-")[1]) for n in numeros)
+    repetidos = len(valores) - len(set(valores))
+    huecos = sorted(set(range(1, valores[-1] + 1)) - set(valores)) if valores else []
+
+    resumen = {
+        "procesos": args.procesos, "numeros_por_proceso": args.numeros,
+        "falla": args.falla, "detalle_falla": falla, "numerador": args.numerador,
+        "asignados": len(numeros), "errores": len(errores),
+        "repetidos": repetidos, "huecos": len(huecos),
+        "por_segundo": round(len(numeros) / duracion, 1) if duracion else None,
+        "latencia_ms": _percentiles(latencias),
+        "espera_lock_ms": _percentiles(esperas),
+        "locks_vencidos_rotos": rotos,
+        "en_libro": en_libro,
+        "falla_sin_efecto": sin_efecto,
+    }
+
+    print(f"Procesos: {args.procesos} × {args.numeros} | falla: {args.falla} {('— ' + falla) if falla else ''}")
+    print(f"Asignados: {len(numeros)} en {duracion:.2f} s ({resumen['por_segundo']}/s) | errores: {len(errores)}")
+    print(f"Latencia ms:    {resumen['latencia_ms']}")
+    print(f"Espera lock ms: {resumen['espera_lock_ms']} | locks vencidos rotos: {rotos}")
+    print(f"Repetidos: {repetidos} | huecos: {len(huecos)}" + (f" (ej. {huecos[:10]})" if huecos else ""))
+    if en_libro is not None:
+        print(f"Filas en el libro de recibos: {en_libro} (esperadas {len(numeros)})")
+    if sin_efecto:
+        print(f"[ERROR] La falla no tuvo efecto: {sin_efecto}")
+    for e in sorted(set(errores))[:5]:
+        print(f"  [ERROR] {e}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(resumen, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    libro_mal = en_libro is not None and en_libro != len(numeros)
+    return 1 if repetidos or huecos or errores or libro_mal or sin_efecto else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# utils/exportar.py
+"""
+Exporta el libro de recibos (recibos.db) a XLSX, CSV o JSONL, filtrando por
+rango de fechas, cliente, CUIT, PV o estado.
+
+    python -m utils.exportar recibos_2024.xlsx --desde 01/01/2024 --hasta 31/12/2024
+    python -m utils.exportar pv2.csv --pv 0002 --estado Emitido
+    python -m utils.exportar - --formato jsonl --cliente perez    # a la consola
+
+Las filas se leen del cursor de a LOTE y se escriben a medida que llegan, así
+la memoria no crece con la cantidad de recibos: el XLSX usa openpyxl en modo
+write_only (cada fila va directo al archivo, la hoja no queda en memoria).
+Se escribe a un temporal junto al destino y se renombra al terminar; si se
+corta a mitad, el archivo anterior queda como estaba.
+
+El CSV sale con ';' y coma decimal, como lo abre Excel en español.
+"""
+from __future__ import annotations
+import argparse, csv, json, os, sys
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+FORMATOS = ("xlsx", "csv", "jsonl")
+LOTE = 500
+RETENCIONES = ("Ganancias", "SUSS", "TEM", "IIBB")
+
+ENCABEZADO = [
+    "Número", "Fecha", "Cliente", "CUIT", "Domicilio", "Localidad", "IVA", "Concepto",
+    "Total", *RETENCIONES, "Total retenciones", "Neto", "Formas de pago", "Estado", "PDF",
+]
+_SQL_COLUMNAS = ("numero, fecha_iso, fecha, cliente, cuit, domicilio, localidad, iva, concepto,"
+                 " total, retenciones, total_retenciones, neto, forma_pago, estado, pdf")
+
+# ----------------------------------------------------------------------
+# Consulta
+# ----------------------------------------------------------------------
+def consulta(desde=None, hasta=None, cliente=None, cuit=None, pv=None, estado=None) -> tuple[str, list]:
+    """
+    SQL y parámetros para los filtros (todos opcionales). Fechas DD/MM/AAAA,
+    inclusive; cliente compara el comienzo del nombre normalizado; cuit, los
+    dígitos completos.
+    """
+    from utils.clientes import normalizar_nombre, solo_digitos
+    from utils.libro_recibos import fecha_iso
+
+    donde, params = [], []
+    for valor, op in ((desde, ">="), (hasta, "<=")):
+        if valor:
+            iso = fecha_iso(valor)
+            if iso is None:
+                raise ValueError(f"Fecha inválida: {valor!r} (DD/MM/AAAA)")
+            donde.append(f"fecha_iso {op} ?")
+            params.append(iso)
+    if cliente:
+        # rango sobre el índice en vez de LIKE, que no lo usa
+        norm = normalizar_nombre(cliente)
+        donde.append("cliente_norm >= ? AND cliente_norm < ?")
+        params += [norm, norm + "\U0010ffff"]
+    if cuit:
+        donde.append("cuit_digits = ?")
+        params.append(solo_digitos(cuit))
+    if pv:
+        donde.append("pv = ?")
+        params.append(str(pv).zfill(4))
+    if estado:
+        donde.append("estado = ?")
+        params.append(estado)
+    sql = f"SELECT {_SQL_COLUMNAS} FROM recibos"
+    if donde:
+        sql += " WHERE " + " AND ".join(donde)
+    return sql + " ORDER BY fecha_iso, pv, nro", params
+
+def registros(**filtros):
+    """Genera un dict por recibo (retenciones y formas de pago ya decodificadas)."""
+    from utils import libro_recibos
+
+    sql, params = consulta(**filtros)
+    cur = libro_recibos.conexion().execute(sql, params)
+    nombres = [c[0] for c in cur.description]
+    while True:
+        lote = cur.fetchmany(LOTE)
+        if not lote:
+            return
+        for fila in lote:
+            r = dict(zip(nombres, fila))
+            for k, vacio in (("retenciones", {}), ("forma_pago", [])):
+                try:
+                    r[k] = json.loads(r[k]) if r[k] else vacio
+                except ValueError:
+                    r[k] = vacio
+            yield r
+
+def _pagos(forma_pago: list, coma: bool = False) -> str:
+    """Formas de pago en una celda; coma=True para el CSV (coma decimal)."""
+    def importe(p):
+        txt = f"{float(p.get('importe') or 0):.2f}"
+        return txt.replace(".", ",") if coma else txt
+    return " | ".join(
+        " ".join(str(p.get(k) or "") for k in ("tipo", "numero", "banco")).strip()
+        + f" ${importe(p)}"
+        for p in forma_pago)
+
+def _fila(r: dict, coma: bool = False) -> list:
+    ret = r["retenciones"]
+    return [
+        r["numero"], date.fromisoformat(r["fecha_iso"]) if r["fecha_iso"] else r["fecha"],
+        r["cliente"], r["cuit"], r["domicilio"], r["localidad"], r["iva"], r["concepto"],
+        r["total"], *(float(ret.get(k) or 0) for k in RETENCIONES),
+        r["total_retenciones"], r["neto"], _pagos(r["forma_pago"], coma), r["estado"], r["pdf"],
+    ]
+
+# ----------------------------------------------------------------------
+# Escritura
+# ----------------------------------------------------------------------
+@contextmanager
+def _temporal(destino: Path):
+    """Archivo temporal junto al destino; lo reemplaza sólo si todo salió bien."""
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(destino.stem + ".tmp" + destino.suffix)
+    try:
+        yield tmp
+        try:
+            os.replace(tmp, destino)
+        except PermissionError as e:
+            # en Windows, el destino abierto en Excel no se deja reemplazar
+            raise PermissionError(f"{destino} está abierto (¿Excel?); cerralo y reintentá") from e
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def escribir_xlsx(destino, encabezado: list, filas, hoja: str = "Recibos") -> int:
+    """Escribe filas (iterable de listas) con openpyxl write_only. Devuelve cuántas."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    destino = Path(destino)
+    n = 0
+    with _temporal(destino) as tmp:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(hoja)
+        ws.append(encabezado)
+        for fila in filas:
+            celdas = []
+            for v in fila:
+                if isinstance(v, date):
+                    c = WriteOnlyCell(ws, v)
+                    c.number_format = "DD/MM/YYYY"
+                    v = c
+                celdas.append(v)
+            ws.append(celdas)
+            n += 1
+        wb.save(tmp)
+    return n
+
+def _texto_csv(v) -> str:
+    if isinstance(v, float):
+        return f"{v:.2f}".replace(".", ",")
+    if isinstance(v, date):
+        return v.strftime("%d/%m/%Y")
+    return "" if v is None else str(v)
+
+def _escribir_csv(f, filas) -> int:
+    w = csv.writer(f, delimiter=";")
+    w.writerow(ENCABEZADO)
+    n = 0
+    for r in filas:
+        w.writerow([_texto_csv(v) for v in _fila(r, coma=True)])
+        n += 1
+    return n
+
+def _escribir_jsonl(f, filas) -> int:
+    n = 0
+    for r in filas:
+        f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+def exportar(destino, formato: str | None = None, **filtros) -> int:
+    """
+    Exporta los recibos que cumplen los filtros (ver consulta()) a 'destino'
+    ("-" = salida estándar, sólo csv/jsonl). El formato sale de la extensión
+    si no se indica. Devuelve cuántos recibos escribió.
+    """
+    formato = (formato or Path(str(destino)).suffix.lstrip(".")).lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato!r} (xlsx, csv o jsonl)")
+    filas = registros(**filtros)
+
+    if formato == "xlsx":
+        if str(destino) == "-":
+            raise ValueError("El XLSX no se puede escribir a la consola; indicá un archivo")
+        return escribir_xlsx(destino, ENCABEZADO, (_fila(r) for r in filas))
+
+    escribir = _escribir_csv if formato == "csv" else _escribir_jsonl
+    if str(destino) == "-":
+        return escribir(sys.stdout, filas)
+    destino = Path(destino)
+    with _temporal(destino) as tmp:
+        with open(tmp, "w", encoding="utf-8-sig" if formato == "csv" else "utf-8", newline="") as f:
+            n = escribir(f, filas)
+    return n
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main(argv=None) -> int:
+    from utils.libro_recibos import ESTADOS
+
+    ap = argparse.ArgumentParser(prog="python -m utils.exportar", description="Exporta el libro de recibos.")
+    ap.add_argument("destino", help="archivo .xlsx/.csv/.jsonl, o - para la consola")
+    ap.add_argument("--formato", choices=FORMATOS, default=None, help="si no, según la extensión")
+    ap.add_argument("--desde", help="fecha inicial DD/MM/AAAA (inclusive)")
+    ap.add_argument("--hasta", help="fecha final DD/MM/AAAA (inclusive)")
+    ap.add_argument("--cliente", help="nombre del cliente o su comienzo")
+    ap.add_argument("--cuit")
+    ap.add_argument("--pv", help="punto de venta (0001)")
+    ap.add_argument("--estado", choices=ESTADOS)
+    args = ap.parse_args(argv)
+
+    try:
+        n = exportar(args.destino, args.formato, desde=args.desde, hasta=args.hasta,
+                     cliente=args.cliente, cuit=args.cuit, pv=args.pv, estado=args.estado)
+    except (ValueError, PermissionError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    if args.destino != "-":
+        print(f"{args.destino}: {n} recibos")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
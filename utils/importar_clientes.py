@@ -0,0 +1,281 @@
+# utils/importar_clientes.py
+"""
+Importación masiva de clientes (padrón de obras sociales, prestadores).
+
+    python -m utils.importar_clientes padron.xlsx
+    python -m utils.importar_clientes padron.csv --simular      # no escribe nada
+
+Columnas reconocidas (el encabezado puede variar en mayúsculas/acentos):
+    nombre      nombre, cliente, razón social, denominación
+    cuit        cuit, cuil, cuit/cuil
+    domicilio   domicilio, dirección
+    localidad   localidad, ciudad
+    iva         iva, condición iva, condición frente al iva
+
+El archivo se lee en streaming (CSV fila a fila, XLSX con openpyxl en modo
+read_only) y se escribe en transacciones de --lote filas. Cada fila:
+    - se normaliza: espacios sobrantes fuera, CUIT como XX-XXXXXXXX-X;
+    - se rechaza si no tiene nombre, si el CUIT no tiene 11 dígitos o falla
+      el dígito verificador, o si repite un CUIT/nombre de una fila anterior
+      del archivo;
+    - si el CUIT ya está en la base (o, sin CUIT en la base, el nombre) se
+      actualizan domicilio, localidad e IVA con lo que traiga el archivo; el
+      nombre queda como estaba (es como se imprime en los recibos);
+    - si no, se inserta.
+Los rechazos van a <archivo>.rechazados.csv con la fila y el motivo.
+"""
+from __future__ import annotations
+import argparse, csv, sys
+from pathlib import Path
+
+from utils import db
+from utils.clientes import DB, init_db, normalizar_nombre, solo_digitos, sincronizar_replica
+
+ALIAS = {
+    "nombre":    ("nombre", "cliente", "razon social", "razonsocial", "denominacion", "nombre o razon social"),
+    "cuit":      ("cuit", "cuil", "cuit cuil", "nro cuit", "numero de cuit"),
+    "domicilio": ("domicilio", "direccion"),
+    "localidad": ("localidad", "ciudad"),
+    "iva":       ("iva", "condicion iva", "condicion de iva", "condicion frente al iva", "cond iva"),
+}
+CAMPOS = tuple(ALIAS)
+RECHAZOS_COLUMNAS = ["fila", "motivo", *CAMPOS]
+
+# ----------------------------------------------------------------------
+# Lectura (siempre en streaming)
+# ----------------------------------------------------------------------
+def _mapear_encabezado(encabezado) -> dict[int, str]:
+    """{posición de la columna: campo} según ALIAS."""
+    por_alias = {normalizar_nombre(a): campo for campo, alias in ALIAS.items() for a in alias}
+    mapa = {}
+    for i, titulo in enumerate(encabezado):
+        campo = por_alias.get(normalizar_nombre(str(titulo or "").replace("_", " ")))
+        if campo and campo not in mapa.values():
+            mapa[i] = campo
+    if "nombre" not in mapa.values():
+        raise ValueError(f"No se encontró la columna del nombre en el encabezado: {list(encabezado)}")
+    return mapa
+
+def _filas_csv(ruta: Path):
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(f, dialect=dialecto)
+
+def _filas_xlsx(ruta: Path):
+    from openpyxl import load_workbook
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        for fila in wb.worksheets[0].iter_rows(values_only=True):
+            # Un CUIT cargado como número puede venir como 20123456789.0
+            yield ["" if v is None else str(int(v) if isinstance(v, float) and v.is_integer() else v)
+                   for v in fila]
+    finally:
+        wb.close()
+
+def leer_clientes(ruta: Path | str):
+    """Genera (número de fila en el archivo, {campo: valor}) desde la fila 2."""
+    ruta = Path(ruta)
+    ext = ruta.suffix.lower()
+    if ext == ".csv":
+        filas = _filas_csv(ruta)
+    elif ext in (".xlsx", ".xlsm"):
+        filas = _filas_xlsx(ruta)
+    else:
+        raise ValueError(f"Formato no soportado: {ruta.suffix} (usar .csv o .xlsx)")
+    mapa = None
+    for nro, fila in enumerate(filas, start=1):
+        if mapa is None:
+            mapa = _mapear_encabezado(fila)
+            continue
+        if not any(str(v).strip() for v in fila):
+            continue
+        yield nro, {campo: str(fila[i]).strip() if i < len(fila) else "" for i, campo in mapa.items()}
+
+# ----------------------------------------------------------------------
+# Normalización
+# ----------------------------------------------------------------------
+def cuit_valido(digitos: str) -> bool:
+    """Dígito verificador de CUIT/CUIL (módulo 11)."""
+    if len(digitos) != 11 or not digitos.isdigit():
+        return False
+    suma = sum(int(d) * p for d, p in zip(digitos[:10], (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)))
+    dv = 11 - suma % 11
+    dv = 0 if dv == 11 else dv
+    return dv != 10 and dv == int(digitos[10])
+
+def normalizar_fila(fila: dict) -> dict:
+    """Lanza ValueError con el motivo si la fila no se puede importar."""
+    datos = {k: " ".join(str(fila.get(k) or "").split()) for k in CAMPOS}
+    if not datos["nombre"]:
+        raise ValueError("sin nombre")
+    digitos = solo_digitos(datos["cuit"])
+    if datos["cuit"] and not digitos:
+        raise ValueError(f"CUIT inválido: {datos['cuit']!r}")
+    if digitos:
+        if len(digitos) != 11:
+            raise ValueError(f"CUIT con {len(digitos)} dígitos: {datos['cuit']!r}")
+        if not cuit_valido(digitos):
+            raise ValueError(f"CUIT con dígito verificador incorrecto: {datos['cuit']!r}")
+        datos["cuit"] = f"{digitos[:2]}-{digitos[2:10]}-{digitos[10]}"
+    datos["cuit"] = datos["cuit"] or None
+    datos["nombre_norm"] = normalizar_nombre(datos["nombre"])
+    datos["cuit_digits"] = digitos
+    return datos
+
+# ----------------------------------------------------------------------
+# Escritura por lotes
+# ----------------------------------------------------------------------
+_SQL_INSERT = """
+    INSERT INTO clientes(nombre, cuit, domicilio, localidad, iva, nombre_norm, cuit_digits)
+    VALUES(:nombre, :cuit, :domicilio, :localidad, :iva, :nombre_norm, :cuit_digits)
+    ON CONFLICT(nombre) DO UPDATE SET
+      cuit=COALESCE(excluded.cuit, cuit),
+      domicilio=COALESCE(NULLIF(excluded.domicilio, ''), domicilio),
+      localidad=COALESCE(NULLIF(excluded.localidad, ''), localidad),
+      iva=COALESCE(NULLIF(excluded.iva, ''), iva),
+      cuit_digits=COALESCE(NULLIF(excluded.cuit_digits, ''), cuit_digits)
+"""
+_SQL_UPDATE = """
+    UPDATE clientes SET
+      cuit=:cuit, cuit_digits=:cuit_digits,
+      domicilio=:domicilio, localidad=:localidad, iva=:iva
+    WHERE id=:id
+"""
+
+def _existentes(cx, columna: str, valores: list[str]) -> dict[str, tuple]:
+    """{valor: (id, nombre, cuit, domicilio, localidad, iva, cuit_digits)} para 'valores'."""
+    salida = {}
+    valores = [v for v in valores if v]
+    for i in range(0, len(valores), 500):
+        parte = valores[i:i + 500]
+        marcas = ",".join("?" * len(parte))
+        for fila in cx.execute(
+            f"SELECT {columna}, id, nombre, cuit, domicilio, localidad, iva, cuit_digits "
+            f"FROM clientes WHERE {columna} IN ({marcas})", parte):
+            salida.setdefault(fila[0], fila[1:])
+    return salida
+
+class _Simulacion(Exception):
+    """Corta la transacción del lote para que haga ROLLBACK."""
+
+def _escribir_lote(lote: list[tuple[int, dict]], resumen: dict, al_rechazar, simular: bool) -> None:
+    try:
+        _escribir(lote, resumen, al_rechazar, simular)
+    except _Simulacion:
+        pass
+
+def _escribir(lote, resumen, al_rechazar, simular) -> None:
+    with db.transaccion(DB) as cx:
+        # Las búsquedas van dentro de la transacción (BEGIN IMMEDIATE): nadie
+        # más escribe entre la consulta y el INSERT/UPDATE
+        por_cuit = _existentes(cx, "cuit_digits", [d["cuit_digits"] for _, d in lote])
+        por_nombre = _existentes(cx, "nombre_norm", [d["nombre_norm"] for _, d in lote])
+        inserts, updates = [], []
+        for nro, d in lote:
+            actual = por_cuit.get(d["cuit_digits"]) if d["cuit_digits"] else None
+            if actual is None:
+                actual = por_nombre.get(d["nombre_norm"])
+                if actual is not None and actual[6] and d["cuit_digits"] and actual[6] != d["cuit_digits"]:
+                    resumen["rechazados"] += 1
+                    al_rechazar(nro, f"el nombre ya existe con otro CUIT ({actual[2]})", d)
+                    continue
+            if actual is None:
+                inserts.append(d)
+                continue
+            id_, _nombre, cuit, dom, loc, iva, cuit_digits = actual
+            nuevo = {
+                "id": id_,
+                "cuit": d["cuit"] or cuit,
+                "cuit_digits": d["cuit_digits"] or cuit_digits,
+                "domicilio": d["domicilio"] or dom,
+                "localidad": d["localidad"] or loc,
+                "iva": d["iva"] or iva,
+            }
+            if (nuevo["cuit"], nuevo["domicilio"], nuevo["localidad"], nuevo["iva"]) == (cuit, dom, loc, iva):
+                resumen["sin_cambios"] += 1
+            else:
+                updates.append(nuevo)
+        cx.executemany(_SQL_INSERT, inserts)
+        cx.executemany(_SQL_UPDATE, updates)
+        resumen["insertados"] += len(inserts)
+        resumen["actualizados"] += len(updates)
+        if simular:
+            raise _Simulacion()
+
+def importar_clientes(filas, tamano_lote: int = 5000, simular: bool = False, al_rechazar=None) -> dict:
+    """
+    Importa (nro_fila, {nombre, cuit, domicilio, localidad, iva}) en lotes.
+    al_rechazar(nro_fila, motivo, fila) se llama por cada fila descartada.
+    Devuelve {"leidos", "insertados", "actualizados", "sin_cambios", "rechazados"}.
+    """
+    al_rechazar = al_rechazar or (lambda *_: None)
+    init_db()
+    resumen = {"leidos": 0, "insertados": 0, "actualizados": 0, "sin_cambios": 0, "rechazados": 0}
+    vistos_cuit: dict[str, int] = {}
+    vistos_nombre: dict[str, int] = {}
+    lote: list[tuple[int, dict]] = []
+
+    for nro, fila in filas:
+        resumen["leidos"] += 1
+        try:
+            d = normalizar_fila(fila)
+            previa = vistos_cuit.get(d["cuit_digits"]) if d["cuit_digits"] else None
+            if previa:
+                raise ValueError(f"CUIT repetido en el archivo (fila {previa})")
+            previa = vistos_nombre.get(d["nombre_norm"])
+            if previa:
+                raise ValueError(f"nombre repetido en el archivo (fila {previa})")
+        except ValueError as e:
+            resumen["rechazados"] += 1
+            al_rechazar(nro, str(e), fila)
+            continue
+        if d["cuit_digits"]:
+            vistos_cuit[d["cuit_digits"]] = nro
+        vistos_nombre[d["nombre_norm"]] = nro
+        lote.append((nro, d))
+        if len(lote) >= tamano_lote:
+            _escribir_lote(lote, resumen, al_rechazar, simular)
+            lote = []
+    if lote:
+        _escribir_lote(lote, resumen, al_rechazar, simular)
+    if not simular:
+        sincronizar_replica()
+    return resumen
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m utils.importar_clientes", description="Importa clientes desde CSV o XLSX.")
+    ap.add_argument("archivo", help="padrón (.csv o .xlsx)")
+    ap.add_argument("--lote", type=int, default=5000, help="filas por transacción")
+    ap.add_argument("--simular", action="store_true", help="validar y contar sin escribir en la base")
+    ap.add_argument("--rechazados", default=None, help="CSV de filas rechazadas (default: <archivo>.rechazados.csv)")
+    args = ap.parse_args(argv)
+
+    salida = Path(args.rechazados) if args.rechazados else Path(args.archivo).with_suffix(".rechazados.csv")
+    with open(salida, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=RECHAZOS_COLUMNAS, delimiter=";", extrasaction="ignore")
+        w.writeheader()
+
+        def _rechazo(nro, motivo, fila):
+            w.writerow({"fila": nro, "motivo": motivo, **{k: fila.get(k) or "" for k in CAMPOS}})
+
+        r = importar_clientes(leer_clientes(args.archivo), tamano_lote=args.lote,
+                              simular=args.simular, al_rechazar=_rechazo)
+
+    print(f"{'[SIMULACIÓN] ' if args.simular else ''}Leídos: {r['leidos']} | Insertados: {r['insertados']} | "
+          f"Actualizados: {r['actualizados']} | Sin cambios: {r['sin_cambios']} | Rechazados: {r['rechazados']}")
+    if r["rechazados"]:
+        print(f"Detalle de rechazos: {salida}")
+    else:
+        salida.unlink(missing_ok=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
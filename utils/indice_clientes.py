@@ -0,0 +1,136 @@
+# utils/indice_clientes.py
+"""
+Índice en memoria de clientes para sugerir mientras se escribe.
+
+Se carga una vez de clientes.db o su réplica local (cargar(), en un hilo al
+abrir la pestaña) y después cada tecla se resuelve con bisect sobre listas
+ordenadas, sin tocar SQLite ni el share. upsert_cliente() lo mantiene al
+día con actualizar(). Mientras no terminó de cargar, sugerir() devuelve [].
+
+Orden de las sugerencias:
+    1. nombre igual al texto        ("perez" → "Pérez")
+    2. nombre que empieza con él    ("pere"  → "Pérez Hnos")
+    3. alguna palabra empieza       ("gue"   → "Clínica Güemes")
+    4. CUIT que empieza con los dígitos escritos
+Nombres y CUITs se comparan normalizados (clientes.normalizar_nombre /
+solo_digitos).
+"""
+from __future__ import annotations
+import threading
+from bisect import bisect_left, insort
+
+_LOCK = threading.Lock()
+_cargado = threading.Event()
+
+_registros: dict[str, tuple] = {}          # nombre → (nombre, cuit, dom, loc, iva)
+_nombres: list[tuple[str, str]] = []      # (nombre_norm, nombre)
+_palabras: list[tuple[str, str]] = []     # (palabra, nombre), sin la primera
+_cuits: list[tuple[str, str]] = []        # (cuit_digits, nombre)
+_pendientes: list[tuple] = []             # upserts que llegaron durante la carga
+_cargando = False
+
+def _claves(registro: tuple):
+    from utils.clientes import normalizar_nombre, solo_digitos
+    nombre, cuit = registro[0], registro[1]
+    norm = normalizar_nombre(nombre)
+    palabras = {(p, nombre) for p in norm.split()[1:]}
+    return (norm, nombre), palabras, ((solo_digitos(cuit), nombre) if solo_digitos(cuit) else None)
+
+def _quitar(lista: list, clave: tuple) -> None:
+    i = bisect_left(lista, clave)
+    if i < len(lista) and lista[i] == clave:
+        del lista[i]
+
+def cargar() -> int:
+    """Lee todos los clientes de clientes.db. Devuelve cuántos cargó."""
+    from utils.clientes import _lectura, COLUMNAS
+
+    global _registros, _nombres, _palabras, _cuits, _cargando
+    with _LOCK:
+        _cargando = True
+    try:
+        filas = _lectura().execute(f"SELECT {COLUMNAS} FROM clientes WHERE nombre IS NOT NULL").fetchall()
+    except Exception:
+        with _LOCK:
+            _cargando = False
+            _pendientes.clear()
+        raise
+
+    registros, nombres, palabras, cuits = {}, [], [], []
+    for r in filas:
+        registros[r[0]] = r
+        n, ps, c = _claves(r)
+        nombres.append(n)
+        palabras.extend(ps)
+        if c:
+            cuits.append(c)
+    nombres.sort(); palabras.sort(); cuits.sort()
+
+    with _LOCK:
+        _cargando = False
+        _registros, _nombres, _palabras, _cuits = registros, nombres, palabras, cuits
+        for r in _pendientes:
+            _aplicar(r)
+        _pendientes.clear()
+        _cargado.set()
+    return len(registros)
+
+def cargado() -> bool:
+    return _cargado.is_set()
+
+def actualizar(nombre, cuit, domicilio, localidad, iva) -> None:
+    """Refleja un upsert_cliente() (alta o cambio por nombre)."""
+    nuevo = (nombre, cuit, domicilio, localidad, iva)
+    with _LOCK:
+        if _cargado.is_set():
+            _aplicar(nuevo)
+        elif _cargando:
+            _pendientes.append(nuevo)
+        # sin índice cargado (lote, importación) no hay nada que mantener
+
+def _aplicar(nuevo: tuple) -> None:
+    # con _LOCK tomado
+    viejo = _registros.get(nuevo[0])
+    if viejo is not None:
+        n, ps, c = _claves(viejo)
+        _quitar(_nombres, n)
+        for p in ps:
+            _quitar(_palabras, p)
+        if c:
+            _quitar(_cuits, c)
+    n, ps, c = _claves(nuevo)
+    insort(_nombres, n)
+    for p in ps:
+        insort(_palabras, p)
+    if c:
+        insort(_cuits, c)
+    _registros[nuevo[0]] = nuevo
+
+def _con_prefijo(lista: list, prefijo: str, limite: int):
+    i = bisect_left(lista, (prefijo, ""))
+    while i < len(lista) and limite > 0 and lista[i][0].startswith(prefijo):
+        yield lista[i]
+        i += 1
+        limite -= 1
+
+def sugerir(texto: str, limite: int = 8) -> list[tuple]:
+    """Hasta 'limite' clientes (nombre, cuit, domicilio, localidad, iva) para 'texto'."""
+    from utils.clientes import normalizar_nombre, solo_digitos
+
+    norm, digitos = normalizar_nombre(texto), solo_digitos(texto)
+    if not norm or not _cargado.is_set():
+        return []
+    vistos, salida = set(), []
+    with _LOCK:
+        # exacto y prefijo salen de la misma lista, el exacto primero
+        candidatos = list(_con_prefijo(_nombres, norm, limite))
+        candidatos += _con_prefijo(_palabras, norm, limite)
+        if digitos:
+            candidatos += _con_prefijo(_cuits, digitos, limite)
+        for _, nombre in candidatos:
+            if nombre not in vistos and nombre in _registros:
+                vistos.add(nombre)
+                salida.append(_registros[nombre])
+                if len(salida) >= limite:
+                    break
+    return salida
@@ -0,0 +1,593 @@
+# utils/libro_recibos.py
+"""
+Libro de recibos emitidos (DB_DIR/recibos.db): una fila por número asignado.
+
+Es la fuente de verdad de lo emitido; historial/recibos.xlsx es una copia
+que se genera desde acá (regenerar_planilla, --planilla) y ya no se edita
+al emitir ni al anular. Búsquedas, control de duplicados y reportes
+consultan esta tabla por índice en vez de abrir la planilla o listar la
+carpeta de PDFs.
+
+Ciclo de un número:
+    Reservado   incrementar_contador(datos=...) lo inserta dentro del mismo
+                lock del contador en el que sube el número: si la fila no se
+                puede escribir, el contador vuelve atrás y no queda número
+                sin registro. (Con el servicio de numeración remoto el número
+                lo asigna otra PC y la fila se escribe apenas llega.)
+    Emitido     confirmar(numero, ruta_pdf) cuando el PDF quedó escrito.
+    Error       marcar_error(): el PDF falló; el número quedó consumido.
+    Anulado     anular(numero).
+
+Cada cambio de estado se agrega además a la tabla eventos (diario: sólo
+INSERT, costo fijo por cambio sin importar cuántos recibos haya).
+
+Duplicados: buscar_duplicados() resuelve (cliente normalizado, importe en
+centavos, fecha ± días) con el índice ix_recibos_duplicado, que se mantiene
+solo con cada alta y cambio de estado. La planilla se vuelve a leer sólo
+si cambió su mtime (sincronizar_planilla), por si otra estación con una
+versión anterior la sigue escribiendo.
+
+    python -m utils.libro_recibos --importar     # planilla + PDFs existentes
+    python -m utils.libro_recibos 0001-00000042  # muestra una fila y sus eventos
+    python -m utils.libro_recibos --planilla     # regenera historial/recibos.xlsx
+"""
+from __future__ import annotations
+import argparse, json, re, socket, sqlite3, sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import RECIBOS_DB, SALIDA_DIR
+from utils import db
+from utils.clientes import normalizar_nombre, solo_digitos
+
+ESTADOS = ("Reservado", "Emitido", "Error", "Anulado")
+_PATRON = re.compile(r"^(\d{4})-(\d{8})$")
+_PATRON_PDF = re.compile(r"^Recibo_(\d{4}-\d{8})__(.*)\.pdf$", re.IGNORECASE)
+_HOST = socket.gethostname()
+RESERVA_VENCIDA_S = 3600   # un Reservado sin PDF después de esto quedó colgado
+
+COLUMNAS = (
+    "numero", "pv", "nro", "fecha", "fecha_iso", "cliente", "cuit", "domicilio",
+    "localidad", "iva", "concepto", "total", "total_retenciones", "neto",
+    "retenciones", "forma_pago", "estado", "pdf", "estacion", "creado", "actualizado",
+)
+
+_SQL_ESQUEMA = (
+    """CREATE TABLE IF NOT EXISTS recibos(
+        numero TEXT PRIMARY KEY,          -- 0001-00000042
+        pv TEXT NOT NULL,
+        nro INTEGER NOT NULL,
+        fecha TEXT,                       -- como se imprime (DD/MM/AAAA)
+        fecha_iso TEXT,                   -- AAAA-MM-DD, para rangos y orden
+        cliente TEXT,
+        cliente_norm TEXT,                -- clientes.normalizar_nombre
+        cuit TEXT,
+        cuit_digits TEXT,
+        domicilio TEXT,
+        localidad TEXT,
+        iva TEXT,
+        concepto TEXT,
+        total REAL,                       -- bruto
+        total_centavos INTEGER,
+        total_retenciones REAL,
+        neto REAL,                        -- total - retenciones
+        retenciones TEXT,                 -- JSON {Ganancias, SUSS, TEM, IIBB}
+        forma_pago TEXT,                  -- JSON [{tipo, numero, banco, fecha, importe}]
+        estado TEXT NOT NULL,
+        pdf TEXT,
+        estacion TEXT,
+        creado TEXT,
+        actualizado TEXT
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_recibos_pv_nro ON recibos(pv, nro)",
+    # control de duplicados: (cliente, importe) exactos y rango de fechas
+    "DROP INDEX IF EXISTS ix_recibos_cliente",
+    "CREATE INDEX IF NOT EXISTS ix_recibos_duplicado ON recibos(cliente_norm, total_centavos, fecha_iso)",
+    "CREATE INDEX IF NOT EXISTS ix_recibos_cuit ON recibos(cuit_digits)",
+    "CREATE INDEX IF NOT EXISTS ix_recibos_fecha ON recibos(fecha_iso)",
+    "CREATE INDEX IF NOT EXISTS ix_recibos_nro ON recibos(nro)",
+    "CREATE INDEX IF NOT EXISTS ix_recibos_estado ON recibos(estado)",
+    "CREATE TABLE IF NOT EXISTS libro(clave TEXT PRIMARY KEY, valor TEXT)",
+    # Diario de cambios de estado: sólo se agregan filas, nunca se editan
+    """CREATE TABLE IF NOT EXISTS eventos(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT NOT NULL,
+        estado TEXT NOT NULL,
+        pdf TEXT,
+        estacion TEXT,
+        momento TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_eventos_numero ON eventos(numero)",
+)
+
+# Substring (trigram) sobre número, cliente y CUIT para la pestaña Buscar.
+# Tabla FTS con su propia copia de las columnas: recibos no tiene un rowid
+# estable (VACUUM lo puede renumerar), así que la fila se identifica con
+# pv * 10^8 + nro.
+_SQL_FTS = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS recibos_fts USING fts5(
+        numero, cliente_norm, cuit_digits, tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS recibos_fts_ai AFTER INSERT ON recibos BEGIN
+        INSERT INTO recibos_fts(rowid, numero, cliente_norm, cuit_digits)
+        VALUES (CAST(new.pv AS INTEGER) * 100000000 + new.nro, new.numero, new.cliente_norm, new.cuit_digits);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS recibos_fts_ad AFTER DELETE ON recibos BEGIN
+        DELETE FROM recibos_fts WHERE rowid = CAST(old.pv AS INTEGER) * 100000000 + old.nro;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS recibos_fts_au AFTER UPDATE OF cliente_norm, cuit_digits ON recibos BEGIN
+        UPDATE recibos_fts SET cliente_norm = new.cliente_norm, cuit_digits = new.cuit_digits
+        WHERE rowid = CAST(new.pv AS INTEGER) * 100000000 + new.nro;
+    END""",
+)
+
+_iniciada = False
+_fts = False
+
+def _crear_fts(cx) -> bool:
+    try:
+        existe = cx.execute("SELECT 1 FROM sqlite_master WHERE name='recibos_fts'").fetchone()
+        for sql in _SQL_FTS:
+            cx.execute(sql)
+        if not existe:
+            cx.execute("""INSERT INTO recibos_fts(rowid, numero, cliente_norm, cuit_digits)
+                SELECT CAST(pv AS INTEGER) * 100000000 + nro, numero, cliente_norm, cuit_digits FROM recibos""")
+        return True
+    except sqlite3.OperationalError as e:
+        # SQLite sin FTS5 o sin trigram (< 3.34)
+        print(f"[AVISO] Búsqueda de recibos sin índice de texto ({e}); se usa LIKE.")
+        return False
+
+def init_db() -> None:
+    global _iniciada, _fts
+    with db.transaccion(RECIBOS_DB) as cx:
+        for sql in _SQL_ESQUEMA:
+            cx.execute(sql)
+        _fts = _crear_fts(cx)
+    _iniciada = True
+
+def _cx():
+    if not _iniciada:
+        init_db()
+    return db.conectar(RECIBOS_DB)
+
+def conexion():
+    """
+    Conexión de este hilo al libro. Otro hilo puede cortar una consulta
+    larga con conexion().interrupt() (la pestaña Buscar, ante una tecla nueva).
+    """
+    return _cx()
+
+def _ahora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+def fecha_iso(fecha) -> str | None:
+    """'05/03/2024' → '2024-03-05'; None si no es una fecha válida."""
+    try:
+        return datetime.strptime(str(fecha or "").strip(), "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return None
+
+def _num(valor) -> float:
+    try:
+        return float(valor or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _fila(numero: str, datos: dict, estado: str) -> dict:
+    m = _PATRON.match(numero or "")
+    if not m:
+        raise ValueError(f"Número de recibo inválido: {numero!r}")
+    ret = {k: _num(v) for k, v in (datos.get("retenciones") or {}).items()}
+    total = _num(datos.get("total"))
+    ret_total = round(sum(ret.values()), 2)
+    ahora = _ahora()
+    return {
+        "numero": numero, "pv": m.group(1), "nro": int(m.group(2)),
+        "fecha": datos.get("fecha") or "", "fecha_iso": fecha_iso(datos.get("fecha")),
+        "cliente": datos.get("cliente") or "",
+        "cliente_norm": normalizar_nombre(datos.get("cliente")),
+        "cuit": datos.get("cuit") or "", "cuit_digits": solo_digitos(datos.get("cuit")),
+        "domicilio": datos.get("domicilio") or "", "localidad": datos.get("localidad") or "",
+        "iva": datos.get("iva") or "", "concepto": datos.get("concepto") or "",
+        "total": total, "total_centavos": int(round(total * 100)),
+        "total_retenciones": ret_total, "neto": round(total - ret_total, 2),
+        "retenciones": json.dumps(ret, ensure_ascii=False),
+        "forma_pago": json.dumps(datos.get("forma_pago") or [], ensure_ascii=False, default=str),
+        "estado": estado, "pdf": datos.get("pdf"),
+        "estacion": datos.get("estacion", _HOST), "creado": ahora, "actualizado": ahora,
+    }
+
+_SQL_INSERT = """
+    INSERT INTO recibos(numero, pv, nro, fecha, fecha_iso, cliente, cliente_norm, cuit, cuit_digits,
+        domicilio, localidad, iva, concepto, total, total_centavos, total_retenciones, neto,
+        retenciones, forma_pago, estado, pdf, estacion, creado, actualizado)
+    VALUES(:numero, :pv, :nro, :fecha, :fecha_iso, :cliente, :cliente_norm, :cuit, :cuit_digits,
+        :domicilio, :localidad, :iva, :concepto, :total, :total_centavos, :total_retenciones, :neto,
+        :retenciones, :forma_pago, :estado, :pdf, :estacion, :creado, :actualizado)
+"""
+
+_SQL_INSERT_SI_FALTA = _SQL_INSERT.replace("INSERT INTO", "INSERT OR IGNORE INTO", 1)
+
+_SQL_EVENTO = "INSERT INTO eventos(numero, estado, pdf, estacion, momento) VALUES(?, ?, ?, ?, ?)"
+
+def _evento(cx, f: dict) -> None:
+    cx.execute(_SQL_EVENTO, [f["numero"], f["estado"], f["pdf"], f["estacion"], f["actualizado"]])
+
+# ----------------------------------------------------------------------
+# Escritura
+# ----------------------------------------------------------------------
+def reservar(numero: str, datos: dict) -> None:
+    """Registra un número recién asignado (estado Reservado)."""
+    f = _fila(numero, datos, "Reservado")
+    _cx()
+    with db.transaccion(RECIBOS_DB) as cx:
+        cx.execute(_SQL_INSERT, f)
+        _evento(cx, f)
+
+def _estado(numero: str, estado: str, pdf: str | None = None, si_estaba: str | None = None) -> bool:
+    """Cambia el estado (y anota el evento); con si_estaba, sólo desde ese estado."""
+    pdf, ahora = (str(pdf) if pdf else None), _ahora()
+    sql = "UPDATE recibos SET estado = ?, pdf = COALESCE(?, pdf), actualizado = ? WHERE numero = ?"
+    params = [estado, pdf, ahora, numero]
+    if si_estaba:
+        sql += " AND estado = ?"
+        params.append(si_estaba)
+    _cx()
+    with db.transaccion(RECIBOS_DB) as cx:
+        cur = cx.execute(sql, params)
+        if cur.rowcount:
+            cx.execute(_SQL_EVENTO, [numero, estado, pdf, _HOST, ahora])
+        return cur.rowcount > 0
+
+def confirmar(numero: str, ruta_pdf) -> bool:
+    return _estado(numero, "Emitido", ruta_pdf)
+
+def marcar_error(numero: str) -> bool:
+    return _estado(numero, "Error")
+
+def anular(numero: str, ruta_pdf=None) -> bool:
+    """
+    Pasa el número a Anulado. Si no estaba en el libro (emitido antes y sin
+    importar) lo agrega ya anulado y devuelve False.
+    """
+    if _estado(numero, "Anulado", ruta_pdf):
+        return True
+    f = _fila(numero, {"pdf": str(ruta_pdf) if ruta_pdf else None}, "Anulado")
+    with db.transaccion(RECIBOS_DB) as cx:
+        if cx.execute(_SQL_INSERT_SI_FALTA, f).rowcount:
+            _evento(cx, f)
+        else:
+            # otra estación lo insertó recién: se anula encima
+            _estado(numero, "Anulado", ruta_pdf)
+    return False
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+def _a_dict(cur, fila) -> dict:
+    d = dict(zip((c[0] for c in cur.description), fila))
+    for k in ("retenciones", "forma_pago"):
+        if isinstance(d.get(k), str):
+            try:
+                d[k] = json.loads(d[k])
+            except ValueError:
+                pass
+    return d
+
+def ultimo_numero(pv: str) -> int:
+    """Mayor número registrado para el PV (0 si no hay)."""
+    fila = _cx().execute("SELECT MAX(nro) FROM recibos WHERE pv = ?", [pv]).fetchone()
+    return int(fila[0] or 0)
+
+def obtener(numero: str) -> dict | None:
+    cur = _cx().execute(f"SELECT {', '.join(COLUMNAS)} FROM recibos WHERE numero = ?", [numero])
+    fila = cur.fetchone()
+    return _a_dict(cur, fila) if fila else None
+
+def eventos(numero: str) -> list[dict]:
+    """Cambios de estado del número, en el orden en que ocurrieron."""
+    cur = _cx().execute(
+        "SELECT estado, pdf, estacion, momento FROM eventos WHERE numero = ? ORDER BY id", [numero])
+    return [_a_dict(cur, f) for f in cur.fetchall()]
+
+# ----------------------------------------------------------------------
+# Importación de lo emitido antes del libro
+# ----------------------------------------------------------------------
+def _filas_planilla(historial: Path):
+    """Filas del libro armadas desde la planilla de historial."""
+    if not historial.exists():
+        return
+    from openpyxl import load_workbook
+    wb = load_workbook(historial, read_only=True, data_only=True)
+    try:
+        for fila in wb.worksheets[0].iter_rows(min_row=2, values_only=True):
+            numero, cliente, fecha, _sub, total, estado = (list(fila) + [None] * 6)[:6]
+            if not _PATRON.match(str(numero or "")):
+                continue
+            if hasattr(fecha, "strftime"):
+                fecha = fecha.strftime("%d/%m/%Y")
+            try:
+                total = float(str(total).replace(",", ".")) if total not in (None, "") else 0.0
+            except ValueError:
+                total = 0.0
+            estado = estado if estado in ESTADOS else "Emitido"
+            yield _fila(str(numero), {
+                "cliente": cliente, "fecha": str(fecha or ""), "total": total, "estacion": "",
+            }, estado)
+    finally:
+        wb.close()
+
+def importar_existentes(historial_xlsx=None, salida_dir=None) -> dict:
+    """
+    Carga en el libro los números que todavía no están: primero las filas
+    de la planilla de historial (con cliente, fecha, total y estado), después
+    los PDFs de SALIDA_DIR (sólo número, cliente del nombre del archivo y
+    ruta). No pisa filas existentes. Al final cierra los Reservado colgados
+    (reconciliar_reservados). Devuelve {"planilla": n, "pdfs": n, ...}.
+    """
+    from utils.recibo_utils import HISTORIAL_XLSX
+    historial = Path(historial_xlsx or HISTORIAL_XLSX)
+    salida = Path(salida_dir or SALIDA_DIR)
+    cuenta = {"planilla": 0, "pdfs": 0}
+    filas = [("planilla", f) for f in _filas_planilla(historial)]
+
+    if salida.exists():
+        import os
+        for e in os.scandir(salida):
+            m = _PATRON_PDF.match(e.name)
+            if not m:
+                continue
+            anulado = m.group(2).upper() == "ANULADO"
+            filas.append(("pdfs", _fila(m.group(1), {
+                "cliente": "" if anulado else m.group(2).replace("_", " "),
+                "pdf": e.path, "estacion": "",
+            }, "Anulado" if anulado else "Emitido")))
+
+    _cx()
+    with db.transaccion(RECIBOS_DB) as cx:
+        for origen, f in filas:
+            if cx.execute(_SQL_INSERT_SI_FALTA, f).rowcount:
+                _evento(cx, f)
+                cuenta[origen] += 1
+    cuenta.update(reconciliar_reservados(salida))
+    return cuenta
+
+def reconciliar_reservados(salida_dir=None, vencido_s: float = RESERVA_VENCIDA_S) -> dict:
+    """
+    Cierra los números que quedaron Reservado: el PDF se escribió pero
+    confirmar() falló, o la app se cerró entre reservar y generar. Con PDF
+    en SALIDA_DIR pasan a Emitido (o Anulado si es el PDF anulado); sin PDF
+    y con más de 'vencido_s' segundos, a Error. Los recientes se dejan: otra
+    estación puede estar generándolos. Devuelve {"emitidos", "anulados", "error"}.
+    """
+    import os
+    cuenta = {"emitidos": 0, "anulados": 0, "error": 0}
+    reservados = _cx().execute(
+        "SELECT numero, pdf, creado FROM recibos WHERE estado = 'Reservado'").fetchall()
+    if not reservados:
+        return cuenta
+
+    # un solo listado de la carpeta, y sólo si hay algo pendiente
+    pdfs = {}
+    try:
+        with os.scandir(Path(salida_dir or SALIDA_DIR)) as entradas:
+            for e in entradas:
+                m = _PATRON_PDF.match(e.name)
+                if m:
+                    pdfs[m.group(1)] = (e.path, m.group(2).upper() == "ANULADO")
+    except OSError as e:
+        print(f"[AVISO] No se pudo listar {salida_dir or SALIDA_DIR}: {e}")
+        return cuenta
+
+    limite = (datetime.now() - timedelta(seconds=vencido_s)).isoformat(timespec="seconds")
+    for numero, pdf, creado in reservados:
+        if pdf and Path(pdf).exists():
+            ruta, anulado = pdf, False
+        else:
+            ruta, anulado = pdfs.get(numero, (None, False))
+        if ruta:
+            estado = "Anulado" if anulado else "Emitido"
+            if _estado(numero, estado, ruta, si_estaba="Reservado"):
+                cuenta["anulados" if anulado else "emitidos"] += 1
+        elif (creado or "") < limite:
+            if _estado(numero, "Error", si_estaba="Reservado"):
+                cuenta["error"] += 1
+    return cuenta
+
+def _mtime(historial: Path) -> str | None:
+    try:
+        return str(historial.stat().st_mtime_ns)
+    except OSError:
+        return None
+
+def sincronizar_planilla(historial_xlsx=None) -> int | None:
+    """
+    Si la planilla cambió desde la última lectura (mtime), agrega al libro
+    los números que falten y pasa a Anulado los que la planilla marca así.
+    Devuelve cuántas filas cambió, o None si no hizo falta leerla.
+    """
+    from utils.recibo_utils import HISTORIAL_XLSX
+    historial = Path(historial_xlsx or HISTORIAL_XLSX)
+    mtime = _mtime(historial)
+    visto = _cx().execute("SELECT valor FROM libro WHERE clave = 'planilla_mtime'").fetchone()
+    if mtime is None or (visto and visto[0] == mtime):
+        return None
+
+    filas = list(_filas_planilla(historial))
+    cambios = 0
+    with db.transaccion(RECIBOS_DB) as cx:
+        for f in filas:
+            n = cx.execute(_SQL_INSERT_SI_FALTA, f).rowcount
+            if not n and f["estado"] == "Anulado":
+                n = cx.execute(
+                    "UPDATE recibos SET estado = 'Anulado', actualizado = ? WHERE numero = ? AND estado != 'Anulado'",
+                    [f["actualizado"], f["numero"]]).rowcount
+            if n:
+                _evento(cx, f)
+            cambios += n
+        cx.execute("INSERT OR REPLACE INTO libro(clave, valor) VALUES('planilla_mtime', ?)", [mtime])
+    return cambios
+
+def planilla_escrita(historial_xlsx=None) -> None:
+    """
+    Después de guardar la planilla con algo que ya está en el libro
+    (marcar_anulado): anota el mtime nuevo para no volver a leerla.
+    """
+    from utils.recibo_utils import HISTORIAL_XLSX
+    mtime = _mtime(Path(historial_xlsx or HISTORIAL_XLSX))
+    if mtime is None:
+        return
+    _cx()
+    with db.transaccion(RECIBOS_DB) as cx:
+        cx.execute("INSERT OR REPLACE INTO libro(clave, valor) VALUES('planilla_mtime', ?)", [mtime])
+
+PLANILLA_COLUMNAS = ["Número", "Cliente", "Fecha", "Subtotal", "Total", "Estado"]
+
+def regenerar_planilla(historial_xlsx=None) -> int:
+    """
+    Vuelve a escribir la planilla de historial desde el libro, fila por fila
+    (exportar.escribir_xlsx: write_only, a un temporal que después reemplaza
+    al archivo). Devuelve cuántas filas escribió.
+    """
+    from utils.exportar import escribir_xlsx
+    from utils.recibo_utils import HISTORIAL_XLSX
+    historial = Path(historial_xlsx or HISTORIAL_XLSX)
+    sincronizar_planilla(historial)   # por si una versión anterior escribió algo
+
+    cur = _cx().execute("SELECT numero, cliente, fecha, total, total, estado FROM recibos ORDER BY pv, nro")
+    n = escribir_xlsx(historial, PLANILLA_COLUMNAS, cur)
+    planilla_escrita(historial)
+    return n
+
+# ----------------------------------------------------------------------
+# Duplicados
+# ----------------------------------------------------------------------
+def buscar_duplicados(cliente: str, fecha: str, total: float, dias: int = 0, limite: int = 5) -> list[dict]:
+    """
+    Recibos vigentes (no Anulado ni Error) del mismo cliente y el mismo
+    importe con fecha dentro de ±dias de 'fecha'. Más recientes primero.
+    """
+    iso = fecha_iso(fecha)
+    sql = ("SELECT numero, fecha, cliente, total, estado FROM recibos"
+           " WHERE cliente_norm = ? AND total_centavos = ? AND {} AND estado IN ('Reservado', 'Emitido')"
+           " ORDER BY fecha_iso DESC, nro DESC LIMIT ?")
+    params = [normalizar_nombre(cliente), int(round(_num(total) * 100))]
+    if iso:
+        dia = datetime.strptime(iso, "%Y-%m-%d")
+        params += [(dia - timedelta(days=dias)).date().isoformat(),
+                   (dia + timedelta(days=dias)).date().isoformat()]
+        sql = sql.format("fecha_iso BETWEEN ? AND ?")
+    else:
+        params.append((fecha or "").strip())
+        sql = sql.format("fecha = ?")
+    cur = _cx().execute(sql, params + [limite])
+    return [_a_dict(cur, f) for f in cur.fetchall()]
+
+# ----------------------------------------------------------------------
+# Búsqueda (pestaña Buscar / Editar)
+# ----------------------------------------------------------------------
+_FIN = "\U0010ffff"
+
+def _coincidencias(texto: str) -> tuple[list[str], list]:
+    """
+    Subconsultas (unidas con UNION) de los números que coinciden con 'texto',
+    cada una resuelta por un índice:
+        0001-0000         número que empieza así
+        42                nro 42 de cualquier PV
+        ≥ 3 caracteres    número, cliente o CUIT que lo contienen (trigram)
+        menos, o sin FTS  cliente o CUIT que empiezan así (y LIKE sin FTS)
+    """
+    from utils.clientes import _escapar_like
+
+    solo_numeros = bool(solo_digitos(texto)) and not re.sub(r"[\d\s\-./]", "", texto)
+    q = solo_digitos(texto) if solo_numeros else normalizar_nombre(texto)
+    col = "cuit_digits" if solo_numeros else "cliente_norm"
+    partes, params = [], []
+
+    if re.match(r"^\d{4}-\d*$", texto):
+        partes.append("SELECT numero FROM recibos WHERE numero >= ? AND numero < ?")
+        params += [texto, texto + _FIN]
+    if solo_numeros and len(q) <= 8:
+        partes.append("SELECT numero FROM recibos WHERE nro = ?")
+        params.append(int(q))
+    if len(q) >= 3 and _fts:
+        frase = '"' + q.replace('"', '""') + '"'
+        partes.append("SELECT numero FROM recibos_fts WHERE recibos_fts MATCH ?")
+        params.append(f"{{numero cliente_norm cuit_digits}} : {frase}")
+    else:
+        partes.append(f"SELECT numero FROM recibos WHERE {col} >= ? AND {col} < ?")
+        params += [q, q + _FIN]
+        if len(q) >= 3:
+            partes.append(f"SELECT numero FROM recibos WHERE {col} LIKE ? ESCAPE '\\'")
+            params.append("%" + _escapar_like(q) + "%")
+    return partes, params
+
+def buscar_recibos(texto: str = "", desde=None, hasta=None, minimo=None, maximo=None,
+                   estado=None, limite: int = 50, saltear: int = 0) -> list[dict]:
+    """
+    Recibos que coinciden con 'texto' (número, cliente o CUIT; ver
+    _coincidencias) y con los filtros opcionales: fechas DD/MM/AAAA
+    inclusive, importe total entre minimo y maximo, estado. Más recientes
+    primero; 'limite' filas a partir de la 'saltear' (paginado).
+    """
+    donde, params = [], []
+    texto = (texto or "").strip()
+    if texto:
+        partes, p = _coincidencias(texto)
+        donde.append(f"numero IN ({' UNION '.join(partes)})")
+        params += p
+    for valor, op in ((desde, ">="), (hasta, "<=")):
+        iso = fecha_iso(valor) if valor else None
+        if iso:
+            donde.append(f"fecha_iso {op} ?")
+            params.append(iso)
+    for valor, op in ((minimo, ">="), (maximo, "<=")):
+        if valor is not None:
+            donde.append(f"total_centavos {op} ?")
+            params.append(int(round(_num(valor) * 100)))
+    if estado:
+        donde.append("estado = ?")
+        params.append(estado)
+
+    sql = "SELECT numero, fecha, cliente, cuit, total, neto, estado, pdf FROM recibos"
+    if donde:
+        sql += " WHERE " + " AND ".join(donde)
+    sql += " ORDER BY fecha_iso DESC, numero DESC LIMIT ? OFFSET ?"
+    cur = _cx().execute(sql, params + [limite, saltear])
+    return [_a_dict(cur, f) for f in cur.fetchall()]
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m utils.libro_recibos", description="Libro de recibos emitidos (recibos.db).")
+    ap.add_argument("numero", nargs="?", help="mostrar un recibo (0001-00000042)")
+    ap.add_argument("--importar", action="store_true", help="cargar planilla de historial y PDFs existentes")
+    ap.add_argument("--planilla", action="store_true", help="regenerar historial/recibos.xlsx desde el libro")
+    args = ap.parse_args(argv)
+
+    init_db()
+    if args.importar:
+        c = importar_existentes()
+        print(f"Importados: {c['planilla']} de la planilla, {c['pdfs']} de PDFs ({RECIBOS_DB})")
+        print(f"Reservados cerrados: {c['emitidos']} emitidos, {c['anulados']} anulados, {c['error']} con error")
+    if args.planilla:
+        from utils.recibo_utils import HISTORIAL_XLSX
+        try:
+            n = regenerar_planilla()
+        except PermissionError as e:
+            print(f"[ERROR] {e}")
+            return 1
+        print(f"{HISTORIAL_XLSX}: {n} recibos")
+    if args.numero:
+        r = obtener(args.numero)
+        if r is None:
+            print(f"{args.numero}: no está en el libro")
+            return 1
+        r["eventos"] = eventos(args.numero)
+        print(json.dumps(r, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
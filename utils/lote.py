@@ -0,0 +1,313 @@
+# utils/lote.py
+"""
+Generación de recibos en lote (cierres de mes, obras sociales).
+
+Uso desde código:
+    for r in generar_pdfs_lote(filas, workers=4):
+        print(r["indice"], r["ok"], r["numero"], r["error"])
+
+Uso por línea de comandos:
+    python -m utils.lote recibos.jsonl --workers 4
+    python -m utils.lote recibos.csv --reporte reporte.csv
+
+Los números se asignan en el proceso principal con utils.contador (en orden
+de lectura, registrados en el libro de recibos) y los PDFs se renderizan en
+un pool de procesos. Cada worker precarga plantilla, firma y fuentes una sola
+vez. Los resultados salen a medida que terminan y nunca hay más de
+2×workers recibos en memoria.
+"""
+from __future__ import annotations
+import argparse, csv, json, logging, os, re, sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from config import SALIDA_DIR, BASE_QR_URL, QR_SECRET_KEY
+from utils.contador import incrementar_contador, reconciliar
+from utils import libro_recibos
+from utils.pdf_generator import generar_pdf, precargar_plantilla, _to_num
+from utils.qr_utils import build_qr_data
+from utils.recibo_utils import nombre_pdf
+
+logger = logging.getLogger("recibos")
+
+RET_LABELS = ("Ganancias", "SUSS", "TEM", "IIBB")
+FP_CAMPOS  = ("tipo", "numero", "banco", "fecha", "importe")
+REPORTE_COLUMNAS = ["indice", "estado", "numero", "cliente", "ruta", "error", "aviso"]
+
+# ----------------------------------------------------------------------
+# Lectura de archivos de entrada (JSONL / CSV), siempre en streaming
+# ----------------------------------------------------------------------
+def leer_jsonl(ruta: Path | str):
+    """Un dict por línea; las líneas inválidas se devuelven como error."""
+    with open(ruta, encoding="utf-8-sig") as f:
+        for nro, linea in enumerate(f, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield {"_error": f"Línea {nro}: JSON inválido ({e.msg})"}
+
+def leer_csv(ruta: Path | str):
+    """
+    Columnas: fecha, cliente, domicilio, localidad, cuit, iva, concepto, total,
+    Ganancias, SUSS, TEM, IIBB y forma de pago como JSON en 'forma_pago' o
+    en columnas fp_tipo, fp_numero, fp_banco, fp_fecha, fp_importe.
+    Separador ',', ';' o tab (se detecta solo).
+    """
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        for fila in csv.DictReader(f, dialect=dialecto):
+            yield {(k or "").strip(): (v or "").strip() for k, v in fila.items()}
+
+def leer_datos(ruta: Path | str):
+    ruta = Path(ruta)
+    if ruta.suffix.lower() in (".jsonl", ".ndjson", ".json"):
+        return leer_jsonl(ruta)
+    if ruta.suffix.lower() == ".csv":
+        return leer_csv(ruta)
+    raise ValueError(f"Formato no soportado: {ruta.suffix} (usar .jsonl o .csv)")
+
+# ----------------------------------------------------------------------
+# Normalización / validación de una fila
+# ----------------------------------------------------------------------
+def _num(valor, campo: str) -> float:
+    """Como _to_num, pero un texto no numérico es error (no 0.0 silencioso)."""
+    n = _to_num(valor)
+    if n == 0.0 and re.sub(r"[\s0.,$-]", "", str(valor or "")):
+        raise ValueError(f"{campo}: importe inválido {valor!r}")
+    return n
+
+def _normalizar(fila: dict) -> dict:
+    if fila.get("_error"):
+        raise ValueError(fila["_error"])
+
+    def txt(k):
+        return str(fila.get(k) or "").strip()
+
+    if not txt("fecha"):
+        raise ValueError("La fecha es obligatoria.")
+    if not txt("cliente"):
+        raise ValueError("El cliente es obligatorio.")
+
+    rets_in = fila.get("retenciones") or {}
+    if not isinstance(rets_in, dict):
+        raise ValueError("retenciones debe ser un objeto {Ganancias, SUSS, TEM, IIBB}")
+    ret = {k: _num(rets_in.get(k, fila.get(k)), k) for k in RET_LABELS}
+
+    fps = fila.get("forma_pago")
+    if isinstance(fps, str) and fps.strip():
+        try:
+            fps = json.loads(fps)
+        except json.JSONDecodeError:
+            raise ValueError("forma_pago: JSON inválido")
+    if isinstance(fps, dict):
+        fps = [fps]
+    if not fps and any(fila.get(f"fp_{k}") for k in FP_CAMPOS):
+        fps = [{k: fila.get(f"fp_{k}") for k in FP_CAMPOS}]
+    if not isinstance(fps or [], list):
+        raise ValueError("forma_pago debe ser una lista de pagos")
+    pagos = []
+    for i, fp in enumerate(fps or [], start=1):
+        pago = {k: str(fp.get(k) or "").strip() for k in FP_CAMPOS[:4]}
+        pago["importe"] = _num(fp.get("importe"), f"forma_pago[{i}].importe")
+        pagos.append(pago)
+
+    return {
+        "fecha": txt("fecha"),
+        "cliente": txt("cliente"),
+        "domicilio": txt("domicilio"),
+        "localidad": txt("localidad"),
+        "cuit": txt("cuit"),
+        "iva": txt("iva"),
+        "concepto": txt("concepto"),
+        "retenciones": ret,
+        "forma_pago": pagos,
+        "total": _num(fila.get("total"), "total"),
+    }
+
+# ----------------------------------------------------------------------
+# Worker (corre en cada proceso del pool)
+# ----------------------------------------------------------------------
+_WORKER: dict = {}
+
+_DATOS_CALENTAMIENTO = {
+    "numero_recibo": "0000-00000000", "fecha": "01/01/2000", "cliente": "-",
+    "concepto": "-", "retenciones": {}, "forma_pago": [], "total": 0.0,
+}
+
+def _init_worker(template_pdf, firma_path, motor):
+    _WORKER.update(template_pdf=template_pdf, firma_path=firma_path, motor=motor)
+    precargar_plantilla(template_pdf, motor, firma_path)
+    # Un recibo descartable deja cargadas firma, fuentes y qrcode en este proceso
+    try:
+        generar_pdf(dict(_DATOS_CALENTAMIENTO), os.devnull,
+                    firma_path=firma_path, qr_data="calentamiento",
+                    template_pdf=template_pdf, motor=motor)
+    except Exception:
+        # No corta el pool (cada recibo informa su propio error), pero la
+        # causa de fondo (firma, plantilla, fuentes) queda en el log una vez
+        logger.exception("Worker %d: falló el recibo de calentamiento", os.getpid())
+
+def _render_item(datos: dict, ruta: str) -> None:
+    qr_payload = build_qr_data(datos, BASE_QR_URL, QR_SECRET_KEY)
+    generar_pdf(
+        datos,
+        ruta,
+        logo_path=None,
+        firma_path=_WORKER.get("firma_path"),
+        anulado=False,
+        qr_data=qr_payload,
+        template_pdf=_WORKER.get("template_pdf"),
+        motor=_WORKER.get("motor"),
+    )
+
+# ----------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------
+def _resultado(indice, fila, numero=None, ruta=None, error=None, aviso=None) -> dict:
+    return {
+        "indice": indice,
+        "ok": error is None,
+        "numero": numero,
+        "cliente": str((fila or {}).get("cliente") or ""),
+        "ruta": str(ruta) if ruta else None,
+        "error": error,
+        "aviso": aviso,   # el PDF salió, pero algo secundario falló (libro, cliente)
+    }
+
+def generar_pdfs_lote(
+    iterable_de_datos,
+    workers: int | None = None,
+    salida_dir: Path | str | None = None,
+    template_pdf: Path | str | None = None,
+    firma_path: Path | str | None = None,
+    motor: str | None = None,
+    guardar_clientes: bool = True,
+):
+    """
+    Genera un recibo por cada dict de iterable_de_datos (mismas claves que
+    arma la pestaña Nuevo Recibo, sin numero_recibo).
+
+    Es un generador: devuelve un dict por ítem a medida que termina (no en
+    orden) con indice (1-based), ok, numero, cliente, ruta, error y aviso
+    (el libro de recibos o el cliente no se pudieron actualizar). Una fila
+    inválida o un render que falla sólo afecta a ese ítem. Las filas que no
+    pasan la validación no consumen número.
+    """
+    from utils.clientes import init_db, upsert_cliente
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    salida = Path(salida_dir) if salida_dir else SALIDA_DIR
+    salida.mkdir(parents=True, exist_ok=True)
+    if guardar_clientes:
+        init_db()
+    reconciliar()   # una vez por lote, no por número
+
+    en_vuelo = {}   # future -> (indice, datos, ruta)
+
+    def _cosechar(fut):
+        indice, datos, ruta = en_vuelo.pop(fut)
+        numero = datos["numero_recibo"]
+        err = fut.exception()
+        avisos = []
+        try:
+            if err is not None:
+                libro_recibos.marcar_error(numero)
+            else:
+                libro_recibos.confirmar(numero, ruta)
+        except Exception as e:
+            # la fila queda Reservado hasta contador.reconciliar()
+            logger.exception("No se pudo actualizar %s en el libro", numero)
+            avisos.append(f"libro de recibos sin actualizar: {e}")
+        if err is not None:
+            return _resultado(indice, datos, numero, error=f"{type(err).__name__}: {err}",
+                              aviso="; ".join(avisos) or None)
+        if guardar_clientes:
+            try:
+                upsert_cliente(datos["cliente"], datos["cuit"], datos["domicilio"], datos["localidad"], datos["iva"])
+            except Exception as e:
+                logger.exception("No se pudo guardar el cliente %s", datos["cliente"])
+                avisos.append(f"cliente sin guardar: {e}")
+        return _resultado(indice, datos, numero, ruta, aviso="; ".join(avisos) or None)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(
+            str(template_pdf) if template_pdf else None,
+            str(firma_path) if firma_path else None,
+            motor,
+        ),
+    ) as pool:
+        for indice, fila in enumerate(iterable_de_datos, start=1):
+            try:
+                datos = _normalizar(fila)
+            except Exception as e:
+                yield _resultado(indice, fila, error=str(e))
+                continue
+            try:
+                datos["numero_recibo"] = incrementar_contador(datos=datos)
+            except Exception as e:
+                yield _resultado(indice, fila, error=f"No se pudo asignar número: {e}")
+                continue
+
+            ruta = salida / nombre_pdf(datos["numero_recibo"], datos["cliente"])
+            en_vuelo[pool.submit(_render_item, datos, str(ruta))] = (indice, datos, ruta)
+
+            # Memoria acotada: no leemos más filas hasta que algo termine
+            if len(en_vuelo) >= workers * 2:
+                hechos, _ = wait(list(en_vuelo), return_when=FIRST_COMPLETED)
+                for fut in hechos:
+                    yield _cosechar(fut)
+
+        while en_vuelo:
+            hechos, _ = wait(list(en_vuelo), return_when=FIRST_COMPLETED)
+            for fut in hechos:
+                yield _cosechar(fut)
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m utils.lote", description="Genera recibos en lote desde JSONL o CSV.")
+    ap.add_argument("archivo", help="datos de entrada (.jsonl o .csv)")
+    ap.add_argument("--workers", type=int, default=None, help="procesos de render (default: núcleos de CPU)")
+    ap.add_argument("--salida", default=None, help=f"carpeta de PDFs (default: {SALIDA_DIR})")
+    ap.add_argument("--motor", choices=["merge", "xobject"], default=None, help="motor de render del PDF")
+    ap.add_argument("--reporte", default=None, help="CSV con el resultado por ítem (default: <archivo>.reporte.csv)")
+    args = ap.parse_args(argv)
+
+    reporte = Path(args.reporte) if args.reporte else Path(args.archivo).with_suffix(".reporte.csv")
+    ok = errores = 0
+    with open(reporte, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=REPORTE_COLUMNAS, delimiter=";")
+        w.writeheader()
+        for r in generar_pdfs_lote(leer_datos(args.archivo), workers=args.workers,
+                                   salida_dir=args.salida, motor=args.motor):
+            w.writerow({
+                "indice": r["indice"], "estado": "OK" if r["ok"] else "ERROR",
+                "numero": r["numero"] or "", "cliente": r["cliente"],
+                "ruta": r["ruta"] or "", "error": r["error"] or "", "aviso": r["aviso"] or "",
+            })
+            if r["ok"]:
+                ok += 1
+                print(f"[OK]    #{r['indice']} {r['numero']} {r['cliente']}"
+                      + (f"  (aviso: {r['aviso']})" if r["aviso"] else ""))
+            else:
+                errores += 1
+                print(f"[ERROR] #{r['indice']} {r['cliente']}: {r['error']}")
+
+    print(f"\nGenerados: {ok} | Con error: {errores} | Reporte: {reporte}")
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
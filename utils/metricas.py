@@ -0,0 +1,131 @@
+# utils/metricas.py
+"""
+Tiempos por etapa del flujo de un recibo (opcional: RECIBOS_METRICAS=1).
+
+    with medir_recibo() as m:          # un registro por recibo
+        with etapa("incrementar_contador"):
+            m["recibo"] = incrementar_contador()
+        ...
+
+Al cerrar medir_recibo() se escribe una línea en el logger "recibos":
+    metricas {"recibo": "0001-00000042", "total_ms": 61.3, "etapas": {...}}
+y los tiempos se acumulan para resumen() (n, p50, p95 y máximo por etapa).
+
+Sin RECIBOS_METRICAS (y sin activar()) etapa() y medir_recibo() no miden
+nada. Fuera de un medir_recibo() activo, etapa() tampoco mide.
+"""
+from __future__ import annotations
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import METRICAS
+
+logger = logging.getLogger("recibos")
+
+MAX_MUESTRAS = 2000   # por etapa, para el resumen
+
+_activo = METRICAS
+_actual: ContextVar[dict | None] = ContextVar("recibo_medido", default=None)
+_muestras: dict[str, deque] = {}
+_LOCK = threading.Lock()
+
+def activar(valor: bool = True) -> None:
+    """Prende/apaga la medición en runtime (benchmarks, consola)."""
+    global _activo
+    _activo = bool(valor)
+
+def activas() -> bool:
+    return _activo
+
+@contextmanager
+def medir_recibo(**campos):
+    """
+    Abre el registro de un recibo. Devuelve un dict donde se pueden agregar
+    campos (p. ej. m["recibo"] = numero). Si ya hay uno abierto en este
+    hilo se reutiliza (generar_pdf dentro del flujo de la GUI).
+    """
+    registro = _actual.get()
+    if not _activo or registro is not None:
+        yield registro if registro is not None else dict(campos)
+        return
+
+    registro = {**campos, "etapas": {}}
+    token = _actual.set(registro)
+    t0 = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro["error"] = type(e).__name__
+        raise
+    finally:
+        _actual.reset(token)
+        registro["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        _acumular("total", registro["total_ms"])
+        for nombre, ms in registro["etapas"].items():
+            _acumular(nombre, ms)
+        logger.info("metricas %s", json.dumps(registro, ensure_ascii=False, default=str))
+
+@contextmanager
+def etapa(nombre: str):
+    """Suma al recibo actual el tiempo (ms) del bloque bajo 'nombre'."""
+    registro = _actual.get() if _activo else None
+    if registro is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        etapas = registro["etapas"]
+        etapas[nombre] = round(etapas.get(nombre, 0.0) + ms, 2)
+
+def _acumular(nombre: str, ms: float) -> None:
+    with _LOCK:
+        _muestras.setdefault(nombre, deque(maxlen=MAX_MUESTRAS)).append(ms)
+
+# ----------------------------------------------------------------------
+# Resumen
+# ----------------------------------------------------------------------
+def _percentil(ordenados: list[float], p: float) -> float:
+    # nearest-rank: suficiente para unos cientos/miles de muestras
+    i = max(0, min(len(ordenados), math.ceil(p / 100 * len(ordenados))) - 1)
+    return ordenados[i]
+
+def resumen() -> dict:
+    """{etapa: {"n", "p50", "p95", "max"}} en ms, de las últimas MAX_MUESTRAS."""
+    with _LOCK:
+        copia = {k: sorted(v) for k, v in _muestras.items() if v}
+    return {
+        k: {
+            "n": len(v),
+            "p50": round(_percentil(v, 50), 2),
+            "p95": round(_percentil(v, 95), 2),
+            "max": round(v[-1], 2),
+        }
+        for k, v in copia.items()
+    }
+
+def texto_resumen() -> str:
+    datos = resumen()
+    if not datos:
+        return "Sin mediciones (activar con RECIBOS_METRICAS=1)."
+    filas = [f"{'etapa':<22}{'n':>6}{'p50':>10}{'p95':>10}{'max':>10}"]
+    # "total" al final; el resto en orden de mayor p95
+    orden = sorted((k for k in datos if k != "total"), key=lambda k: -datos[k]["p95"])
+    for k in orden + (["total"] if "total" in datos else []):
+        d = datos[k]
+        filas.append(f"{k:<22}{d['n']:>6}{d['p50']:>10.1f}{d['p95']:>10.1f}{d['max']:>10.1f}")
+    return "\n".join(filas) + "\n(ms)"
+
+def volcar_resumen() -> None:
+    """Deja el resumen en el log (al cerrar la app)."""
+    datos = resumen()
+    if datos:
+        logger.info("metricas_resumen %s", json.dumps(datos, ensure_ascii=False))
@@ -0,0 +1,167 @@
+# utils/numerador.py
+"""
+Servicio de numeración por HTTP (alternativa al lock de archivo en el share).
+
+Servidor: app.py expone POST /api/numero {"pv": "0002", "clave": "..."} →
+{"numero": "0002-00000043"}. Las pedidas se serializan con un lock en
+memoria y el número se guarda en el mismo contador_<PV>.json de siempre, a
+propósito: es la única marca que comparten el servicio y las estaciones que
+vuelven al archivo. Con un almacén propio del servidor, una estación que no
+llega al servicio numeraría desde un JSON atrasado y repetiría números.
+Por eso el servicio corre en la PC que tiene el share en disco local, con
+RECIBOS_ROOT apuntando a la ruta local (no a \\\\PC\\share): ahí el lock es un
+archivo en disco local (sin round trips SMB) y, con el lock en memoria, los
+hilos del servidor nunca esperan por él; sólo puede haber espera si una
+estación está numerando por archivo en ese momento.
+
+Sin RECIBOS_NUMERADOR_TOKEN el endpoint sólo atiende pedidos de la misma PC
+(127.0.0.1): nadie en la LAN puede consumir números sin el token.
+
+Cliente: con RECIBOS_NUMERADOR_URL, incrementar_contador() llama a
+pedir_numero() con timeout corto (RECIBOS_NUMERADOR_TIMEOUT_S). Vuelve al
+archivo sólo si el servicio seguro no asignó nada (no se pudo conectar, o
+respondió con error). Si el pedido llegó y la respuesta no, se reintenta con
+la misma clave y el servidor devuelve el mismo número; si tampoco, se
+informa el error y no se numera por archivo, para no dejar un hueco.
+
+Prueba local:
+    with servidor_local() as url:      # http://127.0.0.1:<puerto libre>
+        pedir_numero("0001", url=url)
+    python -m utils.numerador --puerto 5050
+"""
+from __future__ import annotations
+import argparse, json, re, threading, uuid
+import urllib.error, urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import NUMERADOR_URL, NUMERADOR_TIMEOUT_S, NUMERADOR_TOKEN
+from utils.contador import incrementar_en_archivo
+
+_LOCK = threading.Lock()
+_NUMERO = re.compile(r"^(\d{4})-\d{8}$")
+_ENTREGADOS: OrderedDict[str, str] = OrderedDict()   # clave del pedido → número
+_MAX_ENTREGADOS = 10_000
+LOCALES = ("127.0.0.1", "::1")
+
+# ----------------------------------------------------------------------
+# Servidor
+# ----------------------------------------------------------------------
+def asignar(pv: str | None = None, clave: str | None = None) -> str:
+    """
+    Un número por llamada; los hilos del servidor no compiten por el archivo.
+    Con 'clave', un reintento del mismo pedido devuelve el mismo número (se
+    recuerdan las últimas _MAX_ENTREGADOS claves, en memoria).
+    """
+    with _LOCK:
+        if clave and clave in _ENTREGADOS:
+            return _ENTREGADOS[clave]
+        numero = incrementar_en_archivo(pv)
+        if clave:
+            _ENTREGADOS[clave] = numero
+            while len(_ENTREGADOS) > _MAX_ENTREGADOS:
+                _ENTREGADOS.popitem(last=False)
+        return numero
+
+# ----------------------------------------------------------------------
+# Cliente
+# ----------------------------------------------------------------------
+def pedir_numero(pv: str, url: str | None = None, timeout: float | None = None,
+                 clave: str | None = None, intentos: int = 3) -> str:
+    """
+    Pide un número al servicio.
+    ConnectionError: el servicio no asignó nada (no se pudo conectar, o
+    respondió con error): se puede numerar por archivo.
+    RuntimeError: el pedido llegó y la respuesta no (o vino mal) ni siquiera
+    reintentando con la misma clave; el número puede haber quedado asignado.
+    """
+    base = (url or NUMERADOR_URL or "").rstrip("/")
+    if not base:
+        raise RuntimeError("No hay RECIBOS_NUMERADOR_URL configurada")
+    clave = clave or uuid.uuid4().hex
+    error = None
+    for intento in range(intentos):
+        req = urllib.request.Request(
+            f"{base}/api/numero",
+            data=json.dumps({"pv": pv, "clave": clave}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        if NUMERADOR_TOKEN:
+            req.add_header("X-Numerador-Token", NUMERADOR_TOKEN)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout or NUMERADOR_TIMEOUT_S) as r:
+                cuerpo = r.read()
+        except urllib.error.HTTPError as e:
+            try:
+                detalle = json.loads(e.read().decode("utf-8")).get("error", "")
+            except Exception:
+                detalle = ""
+            error = RuntimeError(f"HTTP {e.code} {detalle}".strip())
+            if intento == 0:
+                raise ConnectionError(str(error)) from e
+            continue   # en un reintento el primer pedido pudo haber asignado
+        except urllib.error.URLError as e:
+            # urllib envuelve en URLError lo que falla al conectar/enviar
+            error = e
+            if intento == 0:
+                raise ConnectionError(f"No se pudo conectar: {e.reason}") from e
+            continue
+        except OSError as e:
+            error = e   # timeout o corte esperando la respuesta: el pedido llegó
+            continue
+        try:
+            numero = json.loads(cuerpo.decode("utf-8")).get("numero", "")
+        except ValueError as e:
+            error = e
+            continue
+        m = _NUMERO.match(str(numero))
+        if not m or m.group(1) != pv:
+            raise RuntimeError(f"Respuesta inválida del numerador: {numero!r}")
+        return numero
+    raise RuntimeError(f"El numerador no respondió ({error}); el número pudo quedar asignado")
+
+# ----------------------------------------------------------------------
+# Servidor de prueba (sólo el app Flask, sin la GUI)
+# ----------------------------------------------------------------------
+@contextmanager
+def servidor_local(host: str = "127.0.0.1", puerto: int = 0):
+    """Levanta app.py en un hilo y devuelve su URL base; lo apaga al salir."""
+    import logging
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)   # sin una línea por pedido
+    srv = make_server(host, puerto, app, threaded=True)
+    hilo = threading.Thread(target=srv.serve_forever, daemon=True, name="numerador")
+    hilo.start()
+    try:
+        yield f"http://{host}:{srv.server_port}"
+    finally:
+        srv.shutdown()
+        hilo.join(timeout=5)
+
+def main(argv=None) -> int:
+    from config import DB_DIR
+
+    ap = argparse.ArgumentParser(prog="python -m utils.numerador", description="Servicio de numeración (app.py) sin la GUI.")
+    ap.add_argument("--host", default=None,
+                    help="interfaz (default: toda la LAN con RECIBOS_NUMERADOR_TOKEN, si no 127.0.0.1)")
+    ap.add_argument("--puerto", type=int, default=5000)
+    args = ap.parse_args(argv)
+    host = args.host or ("0.0.0.0" if NUMERADOR_TOKEN else "127.0.0.1")
+    if not NUMERADOR_TOKEN and host not in LOCALES:
+        print("[AVISO] Sin RECIBOS_NUMERADOR_TOKEN sólo se atienden pedidos de esta PC")
+    if str(DB_DIR).startswith(("\\\\", "//")):
+        print(f"[AVISO] {DB_DIR} es una ruta de red: el numerador tiene que correr en la PC "
+              "del share con RECIBOS_ROOT en su disco local")
+    with servidor_local(host, args.puerto) as url:
+        print(f"Numerador escuchando en {url}/api/numero (Ctrl+C para salir)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,19 +1,28 @@
 from pathlib import Path
 from io import BytesIO
 from reportlab.lib.units import mm
-from reportlab.platypus import Paragraph, Frame
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.enums import TA_LEFT
+from reportlab.platypus import Frame
 from xml.sax.saxutils import escape
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
 from reportlab.lib import colors
-from reportlab.lib.utils import ImageReader, simpleSplit
-import re
-from PyPDF2 import PdfReader, PdfWriter
-from pathlib import Path
+from reportlab.lib.utils import ImageReader
+import threading
+import zlib
+import os
+import hashlib
+import logging
+from contextlib import contextmanager
+from reportlab import rl_config
+from PyPDF2 import PdfReader, PdfWriter, PageObject
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NullObject, StreamObject,
+)
 from config import ASSETS_DIR  # ⬅️ usar ruta robusta a assets en .py y .exe
+from utils.ajuste_texto import escala, mejor_ajuste, ajustar_parrafo, ajustar_lineas
+from utils.metricas import etapa, medir_recibo
+
+logger = logging.getLogger("recibos")
 # ----------------------------------------------------------------------
 # Layout (coordenadas y estilos)
 # ----------------------------------------------------------------------
@@ -86,6 +95,17 @@ COLORS = {
 # Ancho máximo para envolver el “monto en letras”
 MONTO_LETRAS_MAX_W = 170*mm  
 MONTO_LETRAS_LINE_SPACING = 2  
+MONTO_LETRAS_MAX_LINES = 3     # caben sin pisar "En concepto de:"
+MONTO_LETRAS_MIN_SIZE = 7.0
+
+# Escalas que prueba el motor de ajuste (de mayor a menor)
+CONCEPTO_SIZES   = escala(FONTS["text"][1], 6.0, 0.25)
+CONCEPTO_LEADING_FACTORS = (1.15, 1.12, 1.08, 1.05, 1.03, 1.02, 1.00)
+FP_SIZES         = escala(FONTS["text"][1], 6.0, 0.25)
+FP_ROW_GAPS      = (4, 3, 2, 1)   # espacio extra por fila
+
+RET_LABELS = ["Ganancias", "SUSS", "TEM", "IIBB"]
+FP_HEADERS = ["Tipo", "Número", "C/Banco", "Fecha", "Importe"]
 
 # ----------------------------------------------------------------------
 # Utilidades
@@ -184,29 +204,90 @@ def _to_num(x):
         return 0.0
 
 # --- QR helper ------------------------------------------------
-def _build_qr_png_bytes(qr_data: str) -> bytes | None:
+def _build_qr(qr_data: str):
+    """QRCode armado con QR_ERROR_CORRECTION / QR_BORDER de config.py (o None)."""
     if not qr_data:
         return None
     try:
         import qrcode
-        from qrcode.constants import ERROR_CORRECT_L
+        from qrcode import constants
     except Exception:
-        print("[AVISO] Falta instalar qrcode: pip install qrcode[pil]")
+        print("[AVISO] Falta instalar qrcode: pip install qrcode")
         return None
+    from config import QR_ERROR_CORRECTION, QR_BOX_SIZE, QR_BORDER
 
     qr = qrcode.QRCode(
         version=None,                 # elige versión mínima
-        error_correction=ERROR_CORRECT_L,  # menos denso
-        box_size=10,                  # módulos grandes
-        border=2,                     # borde (2–3)
+        error_correction=getattr(constants, f"ERROR_CORRECT_{QR_ERROR_CORRECTION}", constants.ERROR_CORRECT_L),
+        box_size=QR_BOX_SIZE,         # sólo para la variante PNG
+        border=QR_BORDER,             # borde (2–3)
     )
     qr.add_data(qr_data)
     qr.make(fit=True)
+    return qr
+
+def _build_qr_png_bytes(qr_data: str) -> bytes | None:
+    """QR como PNG (requiere PIL). El PDF usa _draw_qr_vector()."""
+    qr = _build_qr(qr_data)
+    if qr is None:
+        return None
     img = qr.make_image(fill_color="black", back_color="white")
     bio = BytesIO()
     img.save(bio, format="PNG")
     return bio.getvalue()
 
+def _qr_rects(matrix) -> list[tuple[int, int, int, int]]:
+    """
+    Rectángulos (col, fila, ancho, alto) en módulos que cubren los módulos
+    negros: primero tramos horizontales por fila y después se apilan los
+    tramos idénticos de filas consecutivas.
+    """
+    rects = []
+    abiertos = {}   # (col, ancho) -> índice en rects del tramo que sigue abierto
+    for r, fila in enumerate(matrix):
+        tramos = []
+        col, n = 0, len(fila)
+        while col < n:
+            if fila[col]:
+                ini = col
+                while col < n and fila[col]:
+                    col += 1
+                tramos.append((ini, col - ini))
+            else:
+                col += 1
+        nuevos = {}
+        for t in tramos:
+            i = abiertos.get(t)
+            if i is not None and rects[i][1] + rects[i][3] == r:
+                x0, y0, w0, h0 = rects[i]
+                rects[i] = (x0, y0, w0, h0 + 1)
+                nuevos[t] = i
+            else:
+                rects.append((t[0], r, t[1], 1))
+                nuevos[t] = len(rects) - 1
+        abiertos = nuevos
+    return rects
+
+def _draw_qr_vector(c, qr_data: str, x: float, y: float, size: float) -> bool:
+    """Dibuja el QR como vectores (un solo path) en el cuadrado (x, y, size)."""
+    qr = _build_qr(qr_data)
+    if qr is None:
+        return False
+    matrix = qr.get_matrix()      # incluye el borde (quiet zone)
+    mod = size / len(matrix)
+
+    c.saveState()
+    c.setFillColor(colors.white)
+    c.rect(x, y, size, size, stroke=0, fill=1)
+    c.setFillColor(colors.black)
+    p = c.beginPath()
+    for col, fila, w, h in _qr_rects(matrix):
+        # la fila 0 de la matriz es la de arriba
+        p.rect(x + col * mod, y + size - (fila + h) * mod, w * mod, h * mod)
+    c.drawPath(p, stroke=0, fill=1)
+    c.restoreState()
+    return True
+
 # ----------------------------------------------------------------------
 # Overlay: todo lo que va por encima del template (texto, QR, firma)
 # ----------------------------------------------------------------------
@@ -215,10 +296,63 @@ def _make_overlay_page(
     logo_path: Path | None,
     firma_path: Path | None,
     anulado: bool,
-    qr_data: str | None
+    qr_data: str | None,
+    compacto: bool = False,
+    estatico: bool = True,
 ):
     buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
+    c = canvas.Canvas(buf, pagesize=A4, pageCompression=1 if compacto else None)
+    _dibujar_overlay(c, datos, logo_path, firma_path, anulado, qr_data, compacto, estatico)
+    c.showPage()
+    c.save()
+    buf.seek(0)
+    return buf.getvalue()
+
+def _dibujar_estatico(c, firma_path: Path | None, compacto: bool = False):
+    """
+    Lo que es igual en todos los recibos (títulos, rótulos, encabezados de
+    tablas y firma). Se hornea una vez en la plantilla: ver _plantilla_base().
+    """
+    c.setFont(*FONTS["title"]); c.setFillColor(COLORS["primary"])
+    c.drawString(*POS["titulo_recibo"], "RECIBO")
+
+    c.setFont(*FONTS["h1"]); c.setFillColor(COLORS["text"])
+    c.drawString(*POS["leyenda"], "Recibimos la suma de pesos:")
+    c.drawString(*POS["concepto_t"], "En concepto de:")
+    c.drawString(*POS["ret_t"], "Retenciones")
+    c.drawString(*POS["fp_t"], "Forma de pago")
+
+    c.setFont(*FONTS["small"]); c.setFillColor(COLORS["muted"])
+    for xi, k in zip(POS["ret_col_x"], RET_LABELS):
+        c.drawString(xi, POS["ret_y"], k)
+    for xi, htxt in zip(POS["fp_cells_x"], FP_HEADERS):
+        c.drawString(xi, POS["fp_y"], htxt)
+
+    # --- Firma (encima del box, escala > 1) ---
+    c.setFont(*FONTS["text"]); c.setFillColor(COLORS["muted"])
+    c.drawString(*POS["firma_lbl"], "Firma y aclaración:")
+   # c.rect(POS["firma_box"][0], POS["firma_box"][1], POS["firma_box_w"], POS["firma_box_h"], stroke=1, fill=0)
+    if firma_path and Path(firma_path).exists():
+        with etapa("firma"):
+            img = _firma_reader(Path(firma_path), compacto)
+            c.drawImage(img, *_firma_rect(), mask='auto')
+
+def _dibujar_overlay(
+    c,
+    datos: dict,
+    logo_path: Path | None,
+    firma_path: Path | None,
+    anulado: bool,
+    qr_data: str | None,
+    compacto: bool = False,
+    estatico: bool = True,
+):
+    """
+    Dibuja sobre el canvas c todo lo que va encima de la plantilla (página 1).
+    estatico=False omite la capa fija (la plantilla base ya la trae).
+    """
+    if estatico:
+        _dibujar_estatico(c, firma_path, compacto)
 
     # --- Logo (si existe) ---
     if logo_path and Path(logo_path).exists():
@@ -226,9 +360,7 @@ def _make_overlay_page(
         c.drawImage(img, POS["logo"][0], POS["logo"][1],
             width=POS["logo_w"], height=POS["logo_h"], mask='auto')
 
-    # --- Título y cabecera ---
-    c.setFont(*FONTS["title"]); c.setFillColor(COLORS["primary"])
-    c.drawString(*POS["titulo_recibo"], "RECIBO")
+    # --- Cabecera ---
     _draw_right(c, *POS["nro_recibo"], f"Nº {datos.get('numero_recibo','')}", FONTS["h1"], COLORS["text"])
     _draw_right(c, POS["nro_recibo"][0], POS["nro_recibo"][1]-12, f"Fecha: {datos.get('fecha','')}", FONTS["text"], COLORS["text"])
 
@@ -240,34 +372,27 @@ def _make_overlay_page(
     c.drawString(*POS["cuit"],      f"CUIT:      {datos.get('cuit','')}")
     c.drawString(*POS["iva"],       f"Condición IVA: {datos.get('iva','')}")
 
-    # --- Monto en letras (usando SUBTOTAL) ---
-    subtotal_val = _to_num(datos.get("subtotal", 0.0))
-    total_val    = _to_num(datos.get("total", 0.0))
-
-    c.setFont(*FONTS["h1"]); c.setFillColor(COLORS["text"])
-    c.drawString(*POS["leyenda"], "Recibimos la suma de pesos:")
+    # --- Monto en letras ---
+    total_val = _to_num(datos.get("total", 0.0))
 
-    # Texto a mostrar (cambiá a total_val si querés el TOTAL en letras)
     letras_txt = _peso_en_letras(total_val)
 
-    # Envolver el texto al ancho disponible
-    font_name, font_size = FONTS["text"]
+    # Envolver el texto al ancho disponible; si no entra en 3 líneas, achicar
+    font_name, base_size = FONTS["text"]
+    alto_letras = MONTO_LETRAS_MAX_LINES * (base_size + MONTO_LETRAS_LINE_SPACING)
+    font_size, wrapped_lines = ajustar_lineas(
+        letras_txt, font_name, MONTO_LETRAS_MAX_W, alto_letras,
+        escala(base_size, MONTO_LETRAS_MIN_SIZE, 0.25), MONTO_LETRAS_LINE_SPACING,
+    )
     c.setFont(font_name, font_size); c.setFillColor(COLORS["text"])
 
     x_letras, y_letras = POS["monto_letras"]
-    wrapped_lines = simpleSplit(letras_txt, font_name, font_size, MONTO_LETRAS_MAX_W)
-
-    # Dibujar hasta 3 líneas (caben sin pisar "En concepto de:")
-    max_lines = 3
-    for i, line in enumerate(wrapped_lines[:max_lines]):
+    for i, line in enumerate(wrapped_lines):
         y_line = y_letras - i * (font_size + MONTO_LETRAS_LINE_SPACING)
         c.drawString(x_letras, y_line, line)
 
 
     # --- Concepto ---
-    c.setFont(*FONTS["h1"]); c.setFillColor(COLORS["text"])
-    c.drawString(*POS["concepto_t"], "En concepto de:")
-
     # Geometría: usar casi todo el alto entre título y "Retenciones"
     x       = POS["concepto"][0]
     top     = POS["concepto_t"][1] - 1*mm     # ↓ achicamos margen superior
@@ -281,92 +406,42 @@ def _make_overlay_page(
     concepto_raw  = (datos.get("concepto") or "").strip()
     concepto_html = escape(concepto_raw).replace("\n", "<br/>")
 
-    # Estilo base
+    # Mayor tamaño (10 → 6 pt) y para ese tamaño el mayor interlineado
+    # (1.15 → 1.00) que entra; primero se prueba el caso común: 10 pt × 1.12
     BASE_SIZE = FONTS["text"][1]  # normalmente 10
-    style = ParagraphStyle(
-        "Concepto",
-        fontName = FONTS["text"][0],
-        fontSize = BASE_SIZE,
-        leading  = BASE_SIZE + 1,  # interlineado ajustado
-        alignment= TA_LEFT,
-        spaceBefore=0, spaceAfter=0,  # sin márgenes extra
-    )
-
-    def _measure(par: Paragraph, W, Hmax=10_000*mm):
-        """Devuelve alto necesario (pt) para renderizar par a ancho W (sin dibujar)."""
-        _, h_need = par.wrap(W, Hmax)
-        return h_need
-
-    def _make_par(sz: float, lead_factor: float) -> Paragraph:
-        style.fontSize = sz
-        # leading mínimo: igual al tamaño; con factor 1.02–1.15 vamos soltando
-        style.leading  = max(sz, round(sz * lead_factor, 2))
-        return Paragraph(concepto_html, style)
-
-    # 1) probamos con tamaño base y leading 1.12
-    p = _make_par(BASE_SIZE, 1.12)
-    h_need = _measure(p, w)
-
-    # 2) si no entra, bajamos tamaño de a 0.25 pt hasta 6.0,
-    #    y para cada tamaño compactamos leading: 1.15→1.12→1.08→1.05→1.03→1.02→1.00
-    if h_need > h_avail:
-        fitted = None
-        for sz in [BASE_SIZE - 0.25*i for i in range(int((BASE_SIZE-6.0)/0.25)+1)] + [6.0]:
-            for lf in (1.15, 1.12, 1.08, 1.05, 1.03, 1.02, 1.00):
-                cand = _make_par(sz, lf)
-                if _measure(cand, w) <= h_avail:
-                    fitted = cand
-                    break
-            if fitted:
-                break
-        p = fitted or _make_par(6.0, 1.00)  # último recurso: 6pt con leading = 6pt
-
-    # 3) dibujamos una sola vez
-    frame = Frame(
-        x, bottom, w, h_avail,
-        leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0,
-        showBoundary=0  # poné 1 para debug
-    )
-    frame.addFromList([p], c)
-
-    # --- Retenciones ---
-    c.setFont(*FONTS["h1"]); c.setFillColor(COLORS["text"])
-    c.drawString(*POS["ret_t"], "Retenciones")
-
-    c.setFont(*FONTS["small"]); c.setFillColor(COLORS["muted"])
+    with etapa("concepto"):
+        p = ajustar_parrafo(
+            concepto_html, FONTS["text"][0], w, h_avail,
+            CONCEPTO_SIZES, CONCEPTO_LEADING_FACTORS, preferido=(BASE_SIZE, 1.12),
+        )
+
+        # Dibujamos una sola vez
+        frame = Frame(
+            x, bottom, w, h_avail,
+            leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0,
+            showBoundary=0  # poné 1 para debug
+        )
+        frame.addFromList([p], c)
+
+    # --- Retenciones (los rótulos son parte de la capa estática) ---
     rets = datos.get("retenciones", {}) or {}
-    labels = [
-        ("Ganancias", rets.get("Ganancias", 0.0)),
-        ("SUSS",      rets.get("SUSS", 0.0)),
-        ("TEM",       rets.get("TEM", 0.0)),
-        ("IIBB",      rets.get("IIBB", 0.0)),
-    ]
+    labels = [(k, rets.get(k, 0.0)) for k in RET_LABELS]
+    c.setFont(*FONTS["text"]); c.setFillColor(COLORS["text"])
     for i, (k, v) in enumerate(labels):
         xi = POS["ret_col_x"][i]; yi = POS["ret_y"]
-        c.drawString(xi, yi, k)
-        c.setFont(*FONTS["text"]); c.setFillColor(COLORS["text"])
         c.drawString(xi, yi - (FONTS["text"][1] + 2), _fmt_money(v))
-        c.setFont(*FONTS["small"]); c.setFillColor(COLORS["muted"])
 
     # --- Total Retenciones (derecha) ---
     ret_total = sum(_to_num(v) for _, v in labels)
     _draw_right(c, *POS["ret_total"], f"Total Ret.: {_fmt_money(ret_total)}",
         FONTS.get("h1", FONTS["text"]), COLORS["text"])
 
-    # --- Subtotal / Total ---
-  #  _draw_right(c, *POS["subtotal"], f"Subtotal: {_fmt_money(subtotal_val)}",
-   #     FONTS["text"], COLORS["text"])
+    # --- Total ---
     _draw_right(c, *POS["total"],    f"Total: {_fmt_money(total_val)}",
         FONTS["h1"], COLORS["primary"])
 
     # --- Forma de pago (ajuste automático para que SIEMPRE entre en 1 página) ---
-    from config import FP_MAX_ROWS, FP_OVERFLOW_MODE
-    
-    c.setFont(*FONTS["h1"]); c.setFillColor(COLORS["text"])
-    c.drawString(*POS["fp_t"], "Forma de pago")
-
     HEAD_FONT   = FONTS["small"]   # encabezados
-    HEAD_COLOR  = COLORS["muted"]
     CELL_COLOR  = COLORS["text"]
     COLS_X      = POS["fp_cells_x"]           # [Tipo, Número, C/Banco, Fecha, Importe]
     HEADER_GAP  = HEAD_FONT[1] + 2            # separación entre encabezado y primera fila
@@ -378,12 +453,7 @@ def _make_overlay_page(
     elif not isinstance(fps, list):
         fps = []
 
-    # Dibujar encabezados
-    c.setFont(*HEAD_FONT); c.setFillColor(HEAD_COLOR)
-    headers = ["Tipo", "Número", "C/Banco", "Fecha", "Importe"]
-    for i, htxt in enumerate(headers):
-        c.drawString(COLS_X[i], POS["fp_y"], htxt)
-
+    # (los encabezados son parte de la capa estática)
     # Cálculo del alto disponible (desde primera fila hasta encima de firma/QR)
     y_start = POS["fp_y"] - HEADER_GAP  # primera fila
     bottom_limit = max(
@@ -396,25 +466,12 @@ def _make_overlay_page(
     datos["_fp_overflow"] = []  # anulamos overflow para no usar 2ª página ni "+N más…"
 
     if n > 0:
-        # Buscar combinación (tamaño, gap) que permita n filas dentro de avail_h
+        # Mayor combinación (tamaño, gap) que permita n filas dentro de avail_h;
+        # si no encuentra (caso extremo), usar el mínimo: 6pt y gap=1
         base_sz = float(FONTS["text"][1])  # normalmente 10
-        best = None
-        sizes = [round(base_sz - 0.25*i, 2) for i in range(int((base_sz - 6.0)/0.25) + 1)] + [6.0]
-        gaps  = [4, 3, 2, 1]  # espacio extra por fila
-
-        for sz in sizes:
-            for gap in gaps:
-                row_h = sz + gap
-                need_h = n * row_h
-                if need_h <= (avail_h / (1.0)) * 72 / 25.4:  # convertir mm→pt de forma implícita
-                    best = (sz, gap)
-                    break
-            if best:
-                break
-
-        # Si no encontró (caso extremo), usar el mínimo: 6pt y gap=1
+        best = mejor_ajuste(lambda sz, gap: n * (sz + gap), FP_SIZES, FP_ROW_GAPS, avail_h)
         if best is None:
-            best = (6.0, 1)
+            best = (FP_SIZES[-1], FP_ROW_GAPS[-1])
 
         cell_sz, row_gap = best
         row_h = cell_sz + row_gap
@@ -454,28 +511,10 @@ def _make_overlay_page(
             y -= row_h
 
 
-    # --- Firma (encima del box, escala > 1) ---
-    c.setFont(*FONTS["text"]); c.setFillColor(COLORS["muted"])
-    c.drawString(*POS["firma_lbl"], "Firma y aclaración:")
-   # c.rect(POS["firma_box"][0], POS["firma_box"][1], POS["firma_box_w"], POS["firma_box_h"], stroke=1, fill=0)
-    if firma_path and Path(firma_path).exists():
-        img = ImageReader(str(firma_path))
-        escala = 1.1  # 10% más grande que el box
-        w = (POS["firma_box_w"] - 4*mm) * escala
-        h = (POS["firma_box_h"] - 4*mm) * escala
-        x = POS["firma_box"][0] + 2*mm
-        y = POS["firma_box"][1] + 2*mm
-        c.drawImage(img, x, y, width=w, height=h, mask='auto')
-
-    # --- QR (menos denso) ---
+    # --- QR (menos denso, vectorial) ---
     if qr_data:
-        png = _build_qr_png_bytes(qr_data)
-        if png:
-            img_qr = ImageReader(BytesIO(png))
-            c.drawImage(img_qr,
-                POS["qr"][0], POS["qr"][1],
-                width=POS["qr_size"], height=POS["qr_size"],
-                preserveAspectRatio=True, mask='auto')
+        with etapa("qr"):
+            _draw_qr_vector(c, qr_data, POS["qr"][0], POS["qr"][1], POS["qr_size"])
 
     # --- Sello ANULADO (opcional) ---
     if anulado:
@@ -488,11 +527,6 @@ def _make_overlay_page(
         c.drawCentredString(0, 0, "ANULADO")
         c.restoreState()
 
-    c.showPage()
-    c.save()
-    buf.seek(0)
-    return buf.getvalue()
-
 
 # ----------------------------------------------------------------------
 # Página extra con overflow de formas de pago (si se usa)
@@ -504,7 +538,14 @@ def _make_fp_overflow_page(fps_rest: list) -> bytes:
     """
     buf = BytesIO()
     c = canvas.Canvas(buf, pagesize=A4)
+    _dibujar_fp_overflow(c, fps_rest)
+    c.showPage()
+    c.save()
+    buf.seek(0)
+    return buf.getvalue()
 
+def _dibujar_fp_overflow(c, fps_rest: list):
+    """Dibuja en el canvas c la página de continuación de formas de pago."""
     # Título de continuación
     c.setFont(*FONTS["title"]); c.setFillColor(COLORS["primary"])
     c.drawString(20*mm, 260*mm, "Detalle de pagos (continuación)")
@@ -553,14 +594,418 @@ def _make_fp_overflow_page(fps_rest: list) -> bytes:
             c.drawString(COLS_X[0], y + ROW_H/4, f"+{len(fps_rest)-MAX_ROWS_PAGE} más…")
             break
 
-    c.showPage()
-    c.save()
-    buf.seek(0)
-    return buf.getvalue()
+
+# ----------------------------------------------------------------------
+# Cache de plantilla: se lee y parsea una sola vez por proceso
+# ----------------------------------------------------------------------
+TEMPLATE_DEFAULT = ASSETS_DIR / "MODELO 2.pdf"
+FIRMA_DEFAULT    = ASSETS_DIR / "firma.png"
+
+_CACHE: dict[tuple[str, str], tuple[float, object]] = {}   # (tipo, ruta) -> (mtime, objeto)
+_CACHE_LOCK = threading.Lock()
+
+def _cacheado(tipo: str, ruta: Path, cargar, version=None):
+    """
+    Devuelve cargar(ruta) cacheado por (tipo, ruta). Se invalida solo si
+    cambia la versión: por defecto el mtime del archivo (p. ej. nueva
+    plantilla o nueva firma).
+    """
+    clave = (tipo, str(Path(ruta).resolve()))
+    if version is None:
+        version = Path(ruta).stat().st_mtime
+    with _CACHE_LOCK:
+        hit = _CACHE.get(clave)
+        if hit and hit[0] == version:
+            return hit[1]
+    obj = cargar(Path(ruta))
+    with _CACHE_LOCK:
+        _CACHE[clave] = (version, obj)
+    return obj
+
+def _pagina_plantilla(tpl_path: Path):
+    """
+    Página 0 de la plantilla ya parseada con PyPDF2 (motor "merge").
+    La página cacheada NO se debe modificar: usar _copia_plantilla().
+    """
+    # Leemos todo a memoria: el reader no queda atado al archivo del share
+    return _cacheado("pypdf2", tpl_path, lambda p: PdfReader(BytesIO(p.read_bytes())).pages[0])
+
+def _copia_pagina(page) -> PageObject:
+    """
+    Copia superficial de una página cacheada, lista para merge_page().
+    merge_page() reemplaza /Contents y /Resources en la copia (no modifica
+    los objetos compartidos), así que el original cacheado queda intacto.
+    """
+    copia = PageObject(page.pdf)
+    copia.update(page)
+    return copia
+
+def _copia_plantilla(tpl_path: Path) -> PageObject:
+    return _copia_pagina(_pagina_plantilla(tpl_path))
+
+def _xobject_de_bytes(data: bytes):
+    from pdfrw import PdfReader as RwReader
+    from pdfrw.buildxobj import pagexobj
+    return pagexobj(RwReader(fdata=data).pages[0])
+
+def _xobject_plantilla(tpl_path: Path):
+    """Página 0 de la plantilla como form XObject de pdfrw (motor "xobject")."""
+    return _cacheado("xobject", tpl_path, lambda p: _xobject_de_bytes(p.read_bytes()))
+
+# ----------------------------------------------------------------------
+# Plantilla base = plantilla + capa estática (títulos, rótulos, firma)
+# horneadas una sola vez; cada recibo dibuja sólo los campos variables
+# ----------------------------------------------------------------------
+def _plantilla_base(tpl_path: Path, firma_path: Path | None, compacto: bool):
+    """(tipo, version, bytes) del PDF de 1 página con la capa estática ya mergeada."""
+    firma = Path(firma_path) if firma_path and Path(firma_path).exists() else None
+    tipo = f"base|{firma.resolve() if firma else ''}|{int(bool(compacto))}"
+    version = (tpl_path.stat().st_mtime, firma.stat().st_mtime if firma else 0)
+    data = _cacheado(tipo, tpl_path, lambda p: _hornear_plantilla(p, firma, compacto), version)
+    return tipo, version, data
+
+def _hornear_plantilla(tpl_path: Path, firma: Path | None, compacto: bool) -> bytes:
+    from config import PLANTILLA_CACHE_DIR
+
+    # invariant=1: mismo dibujo → mismos bytes, así sirve de clave en disco
+    buf = BytesIO()
+    with dibujo_reportlab(compacto):
+        c = canvas.Canvas(buf, pagesize=A4, pageCompression=1, invariant=1)
+        _dibujar_estatico(c, firma, compacto)
+        c.showPage()
+        c.save()
+    estatico = buf.getvalue()
+
+    archivo = None
+    if PLANTILLA_CACHE_DIR:
+        h = hashlib.sha1(tpl_path.read_bytes() + estatico).hexdigest()[:20]
+        archivo = Path(PLANTILLA_CACHE_DIR) / f"plantilla_{h}.pdf"
+        try:
+            return archivo.read_bytes()
+        except OSError:
+            pass
+
+    page = _copia_plantilla(tpl_path)
+    page.merge_page(PdfReader(BytesIO(estatico)).pages[0])
+    page.compress_content_streams()
+    writer = PdfWriter()
+    writer.add_page(page)
+    out = BytesIO()
+    writer.write(out)
+    data = out.getvalue()
+
+    if archivo:
+        try:
+            archivo.parent.mkdir(parents=True, exist_ok=True)
+            tmp = archivo.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(archivo)
+        except OSError:
+            logger.warning("No se pudo guardar la plantilla base en %s", archivo)
+    return data
+
+def _pagina_base(tpl_path: Path, firma_path: Path | None, compacto: bool):
+    """Página base parseada con PyPDF2 (motor "merge"); no modificar: _copia_pagina()."""
+    tipo, version, data = _plantilla_base(tpl_path, firma_path, compacto)
+    return _cacheado("pypdf2|" + tipo, tpl_path, lambda p: PdfReader(BytesIO(data)).pages[0], version)
+
+def _xobject_base(tpl_path: Path, firma_path: Path | None, compacto: bool):
+    """Página base como form XObject de pdfrw (motor "xobject")."""
+    tipo, version, data = _plantilla_base(tpl_path, firma_path, compacto)
+    return _cacheado("xobject|" + tipo, tpl_path, lambda p: _xobject_de_bytes(data), version)
+
+def _hay_pdfrw() -> bool:
+    try:
+        import pdfrw  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+def precargar_plantilla(
+    template_pdf: Path | str | None = None,
+    motor: str | None = None,
+    firma_path: Path | str | None = None,
+    compacto: bool | None = None,
+) -> None:
+    """Precalienta plantilla, firma y plantilla base (llamar al iniciar la app)."""
+    from config import PDF_COMPACTO
+    tpl_path = Path(template_pdf) if template_pdf else TEMPLATE_DEFAULT
+    firm_path = Path(firma_path) if firma_path else FIRMA_DEFAULT
+    compacto = PDF_COMPACTO if compacto is None else compacto
+    if not tpl_path.exists():
+        return
+    if _resolver_motor(motor) == "xobject":
+        _xobject_base(tpl_path, firm_path, compacto)
+    else:
+        _pagina_base(tpl_path, firm_path, compacto)
+
+
+# ----------------------------------------------------------------------
+# Firma: se decodifica una sola vez; en modo compacto además se limpia y
+# se reescala a la resolución de impresión
+# ----------------------------------------------------------------------
+def _firma_rect():
+    """(x, y, w, h) de la firma: encima del box, 10% más grande."""
+    escala = 1.1
+    w = (POS["firma_box_w"] - 4*mm) * escala
+    h = (POS["firma_box_h"] - 4*mm) * escala
+    x = POS["firma_box"][0] + 2*mm
+    y = POS["firma_box"][1] + 2*mm
+    return x, y, w, h
+
+def _peso_imagen(im, a85: bool) -> int:
+    """Bytes aproximados que ocupa la imagen en el PDF (Flate [+ A85] + SMask)."""
+    rgb = len(zlib.compress(im.convert("RGB").tobytes()))
+    if a85:
+        rgb = rgb * 5 // 4
+    alpha = len(zlib.compress(im.getchannel("A").tobytes())) if "A" in im.getbands() else 0
+    return rgb + alpha
+
+# Ahorros que se midieron durante el generar_pdf() en curso (por hilo): lo
+# que queda cacheado (la firma reescalada, horneada en la plantilla base) se
+# cuenta sólo en el recibo que lo calculó, no en cada uno
+_RENDER = threading.local()
+
+def _anotar_ahorro(clave: str, n: int) -> None:
+    ahorro = getattr(_RENDER, "ahorro", None)
+    if ahorro is not None:
+        ahorro[clave] = ahorro.get(clave, 0) + n
+
+def _cargar_firma_compacta(ruta: Path):
+    from PIL import Image
+    from config import FIRMA_DPI
+
+    im = Image.open(ruta)
+    im.load()
+    peso_original = _peso_imagen(im, a85=True)
+    im = im.convert("RGBA")
+
+    # Reescalar sólo si supera la resolución de impresión
+    _, _, w, h = _firma_rect()
+    max_px = (max(1, round(w / 72 * FIRMA_DPI)), max(1, round(h / 72 * FIRMA_DPI)))
+    if im.width > max_px[0] or im.height > max_px[1]:
+        im.thumbnail(max_px, Image.LANCZOS)
+
+    # Los píxeles 100% transparentes no se ven: color fijo para que comprima
+    alpha = im.getchannel("A")
+    fondo = Image.new("RGBA", im.size, (255, 255, 255, 0))
+    im = Image.composite(im, fondo, alpha.point(lambda a: 255 if a else 0))
+
+    _anotar_ahorro("firma", max(0, peso_original - _peso_imagen(im, a85=False)))
+    return ImageReader(im)
+
+def _firma_reader(firma_path: Path, compacto: bool = False):
+    """ImageReader cacheado de la firma (la decodificación PNG se hace una vez)."""
+    if compacto:
+        return _cacheado("firma_compacta", firma_path, _cargar_firma_compacta)
+    return _cacheado("firma", firma_path, lambda p: ImageReader(str(p)))
+
+@contextmanager
+def dibujo_reportlab(compacto: bool = False):
+    """
+    Envuelve todo dibujo con reportlab del proceso. rl_config.useA85 es
+    global y reportlab lo lee al guardar; en modo compacto se apaga (ASCII85
+    sólo agrega ~25% a cada stream binario), así que cualquier render, en
+    cualquier modo, toma _A85_LOCK para no ver el valor de otro hilo.
+    """
+    with _A85_LOCK:
+        if not compacto:
+            yield
+            return
+        previo = rl_config.useA85
+        rl_config.useA85 = 0
+        try:
+            yield
+        finally:
+            rl_config.useA85 = previo
+
+_A85_LOCK = threading.RLock()
+
+def _dedupe_objetos(writer: PdfWriter) -> int:
+    """
+    Unifica objetos idénticos del writer (streams y diccionarios no-página):
+    las referencias apuntan al primero y los repetidos quedan como null.
+    Devuelve los bytes aproximados ahorrados (0 si no se pudo).
+
+    Usa writer._objects, que no es API pública de PyPDF2: si una versión no
+    lo tiene, se avisa y el PDF sale sin unificar.
+    """
+    objetos = getattr(writer, "_objects", None)
+    if not isinstance(objetos, list):
+        logger.warning("Esta versión de PyPDF2 no tiene PdfWriter._objects: "
+                       "no se unifican objetos duplicados")
+        return 0
+
+    def _ref_id(o):
+        return o.idnum if isinstance(o, IndirectObject) else None
+
+    def _clave(o):
+        if isinstance(o, StreamObject):
+            d = sorted((k, repr(v)) for k, v in o.items() if k != "/Length")
+            return ("stream", repr(d), bytes(o._data))
+        if isinstance(o, DictionaryObject):
+            if o.get("/Type") in ("/Page", "/Pages", "/Catalog"):
+                return None
+            return ("dict", repr(sorted((k, repr(v)) for k, v in o.items())))
+        return None
+
+    def _reapuntar(o, mapa):
+        if isinstance(o, DictionaryObject):
+            for k, v in list(o.items()):
+                if _ref_id(v) in mapa:
+                    o[k] = IndirectObject(mapa[v.idnum], 0, writer)
+                else:
+                    _reapuntar(v, mapa)
+        elif isinstance(o, ArrayObject):
+            for i, v in enumerate(o):
+                if _ref_id(v) in mapa:
+                    o[i] = IndirectObject(mapa[v.idnum], 0, writer)
+                else:
+                    _reapuntar(v, mapa)
+
+    ahorro = 0
+    for _ in range(3):   # varias pasadas: unificar hijos puede igualar a los padres
+        vistos, mapa = {}, {}
+        for i, obj in enumerate(objetos):
+            clave = _clave(obj)
+            if clave is None:
+                continue
+            idnum = i + 1
+            if clave in vistos:
+                mapa[idnum] = vistos[clave]
+                ahorro += len(clave[-1])
+            else:
+                vistos[clave] = idnum
+        if not mapa:
+            break
+        for obj in objetos:
+            if obj is not None:
+                _reapuntar(obj, mapa)
+        for idnum in mapa:
+            objetos[idnum - 1] = NullObject()
+    return ahorro
+
+def _reportar_compacto(ruta_salida: Path, ahorro: dict) -> dict:
+    total = ruta_salida.stat().st_size
+    logger.info(
+        "PDF compacto %s: %d bytes (ahorro ≈ %d bytes: %s)",
+        ruta_salida.name, total, sum(ahorro.values()),
+        ", ".join(f"{k} {v}" for k, v in ahorro.items()),
+    )
+    return {"bytes": total, "ahorro": ahorro}
+
+
+# ----------------------------------------------------------------------
+# Motores de render
+#   "merge":   overlay en reportlab → PyPDF2 lo parsea y lo mergea en la plantilla
+#   "xobject": la plantilla entra como form XObject y todo se dibuja en una
+#              sola pasada de reportlab (sin parse/merge/serialize de PyPDF2)
+# ----------------------------------------------------------------------
+MOTORES = ("merge", "xobject")
+
+def _resolver_motor(motor: str | None) -> str:
+    from config import PDF_MOTOR
+    motor = (motor or PDF_MOTOR or "merge").lower()
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de PDF desconocido: {motor!r} (opciones: {', '.join(MOTORES)})")
+    if motor == "xobject" and not _hay_pdfrw():
+        print("[AVISO] Falta instalar pdfrw (pip install pdfrw); se usa el motor 'merge'.")
+        return "merge"
+    return motor
+
+def _render_merge(datos, ruta_salida, logo_path, firm_path, anulado, qr_data, tpl_path, fps_rest, compacto):
+    # Página 1 (overlay)
+    with dibujo_reportlab(compacto), etapa("overlay"):
+        overlay_bytes = _make_overlay_page(
+            datos=datos,
+            logo_path=logo_path,
+            firma_path=str(firm_path),  # por si tu overlay espera str
+            anulado=anulado,
+            qr_data=qr_data,
+            compacto=compacto,
+            estatico=False,
+        )
+
+    writer = PdfWriter()
+    ahorro = {"streams": 0} if compacto else {}
+
+    def _comprimir(page):
+        # El merge deja el contenido sin comprimir; hay que hacerlo antes de
+        # add_page() para que el writer guarde sólo la versión comprimida
+        antes = len(page.get_contents().get_data())
+        page.compress_content_streams()
+        ahorro["streams"] += max(0, antes - len(page["/Contents"]._data))
+
+    # Merge página 1 (sobre una copia de la plantilla base cacheada)
+    with etapa("plantilla_base"):
+        base_page_1 = _copia_pagina(_pagina_base(tpl_path, firm_path, compacto))
+    with etapa("merge"):
+        overlay_page_1 = PdfReader(BytesIO(overlay_bytes)).pages[0]
+        try:
+            base_page_1.merge_page(overlay_page_1)
+        except Exception:
+            base_page_1.mergePage(overlay_page_1)
+        if compacto:
+            _comprimir(base_page_1)
+        writer.add_page(base_page_1)
+
+        # ¿Segunda página por overflow?
+        if fps_rest():
+            with dibujo_reportlab(compacto):
+                overlay2 = _make_fp_overflow_page(fps_rest())
+            base_page_2 = _copia_plantilla(tpl_path)  # mismo template
+            overlay_page_2 = PdfReader(BytesIO(overlay2)).pages[0]
+            try:
+                base_page_2.merge_page(overlay_page_2)
+            except Exception:
+                base_page_2.mergePage(overlay_page_2)
+            if compacto:
+                _comprimir(base_page_2)
+            writer.add_page(base_page_2)
+
+        if compacto:
+            ahorro["duplicados"] = _dedupe_objetos(writer)
+
+    # Guardar
+    with etapa("escritura"), open(ruta_salida, "wb") as f:
+        writer.write(f)
+    return ahorro
+
+def _render_xobject(datos, ruta_salida, logo_path, firm_path, anulado, qr_data, tpl_path, fps_rest, compacto):
+    from pdfrw.toreportlab import makerl
+
+    with etapa("plantilla_base"):
+        xobj = _xobject_base(tpl_path, firm_path, compacto)
+    bbox = [float(v) for v in xobj.BBox]
+    page_size = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+
+    # reportlab ya reutiliza imágenes y fuentes repetidas dentro del documento
+    with dibujo_reportlab(compacto):
+        c = canvas.Canvas(str(ruta_salida), pagesize=page_size, pageCompression=1 if compacto else None)
+        with etapa("merge"):
+            form = makerl(c, xobj)   # el form se registra una vez por documento
+
+            # Página 1: plantilla base + campos variables
+            c.doForm(form)
+        with etapa("overlay"):
+            _dibujar_overlay(c, datos, logo_path, str(firm_path), anulado, qr_data, compacto, estatico=False)
+        c.showPage()
+
+        # ¿Segunda página por overflow? (plantilla sin la capa estática)
+        if fps_rest():
+            with etapa("merge"):
+                c.doForm(makerl(c, _xobject_plantilla(tpl_path)))
+            with etapa("overlay"):
+                _dibujar_fp_overflow(c, fps_rest())
+            c.showPage()
+
+        with etapa("escritura"):
+            c.save()
+    return {}
 
 
 # ----------------------------------------------------------------------
-# Generación final: merge overlay + template
+# Generación final: plantilla + overlay
 # ----------------------------------------------------------------------
 def generar_pdf(
     datos: dict,
@@ -570,53 +1015,50 @@ def generar_pdf(
     anulado: bool = False,
     qr_data: str | None = None,
     template_pdf: Path | str | None = None,
+    motor: str | None = None,
+    compacto: bool | None = None,
 ):
-    from config import FP_OVERFLOW_MODE
+    """
+    Genera el recibo en ruta_salida. motor: "merge" (default) o "xobject";
+    si es None se toma PDF_MOTOR de config.py.
+    compacto: firma reescalada/limpia, streams comprimidos y objetos
+    duplicados unificados (None → PDF_COMPACTO de config.py). En ese modo
+    devuelve {"bytes", "ahorro"} y lo deja en el log; si no, None. El ahorro
+    de la firma aparece sólo en el recibo que la reescaló: después ya está
+    en la plantilla base cacheada.
+    """
+    from config import FP_OVERFLOW_MODE, PDF_COMPACTO
+    if compacto is None:
+        compacto = PDF_COMPACTO
 
     # Normalizar rutas
     ruta_salida = Path(ruta_salida)
     ruta_salida.parent.mkdir(parents=True, exist_ok=True)
 
     # Defaults robustos (sirven en .py y .exe)
-    tpl_path = Path(template_pdf) if template_pdf else (ASSETS_DIR / "MODELO 2.pdf")
-    firm_path = Path(firma_path) if firma_path else (ASSETS_DIR / "firma.png")
+    tpl_path = Path(template_pdf) if template_pdf else TEMPLATE_DEFAULT
+    firm_path = Path(firma_path) if firma_path else FIRMA_DEFAULT
 
     if not tpl_path.exists():
         raise FileNotFoundError(f"Plantilla no encontrada: {tpl_path.resolve()}")
 
-    # Página 1 (overlay)
-    overlay_bytes = _make_overlay_page(
-        datos=datos,
-        logo_path=logo_path,
-        firma_path=str(firm_path),  # por si tu overlay espera str
-        anulado=anulado,
-        qr_data=qr_data,
-    )
-
-    reader_tpl = PdfReader(str(tpl_path))
-    writer = PdfWriter()
+    # El overlay de la página 1 completa datos["_fp_overflow"]: se consulta después
+    def fps_rest():
+        if FP_OVERFLOW_MODE != "segunda_pagina":
+            return []
+        return datos.get("_fp_overflow") or []
 
-    # Merge página 1
-    base_page_1 = reader_tpl.pages[0]
-    overlay_page_1 = PdfReader(BytesIO(overlay_bytes)).pages[0]
+    motor = _resolver_motor(motor)
+    render = _render_xobject if motor == "xobject" else _render_merge
+    _RENDER.ahorro = {} if compacto else None
     try:
-        base_page_1.merge_page(overlay_page_1)
-    except Exception:
-        base_page_1.mergePage(overlay_page_1)
-    writer.add_page(base_page_1)
-
-    # ¿Segunda página por overflow?
-    fps_rest = datos.get("_fp_overflow") or []
-    if FP_OVERFLOW_MODE == "segunda_pagina" and fps_rest:
-        overlay2 = _make_fp_overflow_page(fps_rest)
-        base_page_2 = reader_tpl.pages[0]  # mismo template
-        overlay_page_2 = PdfReader(BytesIO(overlay2)).pages[0]
-        try:
-            base_page_2.merge_page(overlay_page_2)
-        except Exception:
-            base_page_2.mergePage(overlay_page_2)
-        writer.add_page(base_page_2)
-
-    # Guardar
-    with open(ruta_salida, "wb") as f:
-        writer.write(f)
+        with medir_recibo() as m:
+            m.setdefault("recibo", datos.get("numero_recibo"))
+            m["motor"] = motor
+            ahorro = render(datos, ruta_salida, logo_path, firm_path, anulado, qr_data, tpl_path, fps_rest, compacto)
+        medidos = _RENDER.ahorro
+    finally:
+        _RENDER.ahorro = None
+    if not compacto:
+        return None
+    return _reportar_compacto(ruta_salida, {**medidos, **ahorro})
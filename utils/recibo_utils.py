@@ -1,62 +1,36 @@
-from pathlib import Path
-from openpyxl import load_workbook, Workbook
+from config import HISTORIAL_XLSX  # DATA_DIR/historial/recibos.xlsx (RECIBOS_HISTORIAL_XLSX)
 
-# Intentamos tomar la ruta del historial desde config.py; si no existe, usamos una por defecto
-try:
-    from config import HISTORIAL_XLSX  # ej: Path("historial/recibos.xlsx")
-except Exception:
-    HISTORIAL_XLSX = Path("historial/recibos.xlsx")
+def nombre_pdf(numero_recibo: str, cliente: str) -> str:
+    """Nombre estándar del PDF: Recibo_0001-00000001__Cliente.pdf"""
+    cliente_sanit = (cliente or "Cliente").replace(" ", "_")
+    return f"Recibo_{numero_recibo}__{cliente_sanit}.pdf"
 
-def _asegurar_historial():
-    """Crea el archivo de historial si no existe, con las columnas estándar."""
-    p = Path(HISTORIAL_XLSX)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    if not p.exists():
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Recibos"
-        ws.append(["Número", "Cliente", "Fecha", "Subtotal", "Total", "Estado"])
-        wb.save(p)
-def posible_duplicado(cliente: str, fecha: str, total: float) -> bool:
+def buscar_duplicados(cliente: str, fecha: str, total: float, dias: int = 0) -> list[dict]:
     """
-    True si ya hay una fila con el mismo (cliente, fecha, total).
+    Recibos vigentes con el mismo cliente y total y fecha dentro de ±dias.
+    Consulta el libro de recibos por índice; la planilla sólo se relee si
+    cambió desde la última vez.
     """
-    _asegurar_historial()
-    wb = load_workbook(HISTORIAL_XLSX)
-    ws = wb.active
-    cli_norm = (cliente or "").strip().lower()
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        _num, _cli, _fec, _sub, _tot, _est = row
-        try:
-            tot_val = float(str(_tot).replace(",", "."))
-        except Exception:
-            tot_val = None
-        if (str(_fec) == fecha
-            and (str(_cli or "").strip().lower() == cli_norm)
-            and tot_val is not None
-            and abs(tot_val - float(total)) < 0.01):
-            return True
-    return False
+    from utils import libro_recibos
+    try:
+        libro_recibos.sincronizar_planilla(HISTORIAL_XLSX)
+    except Exception as e:
+        print(f"[AVISO] No se pudo leer el historial {HISTORIAL_XLSX}: {e}")
+    return libro_recibos.buscar_duplicados(cliente, fecha, total, dias)
 
-def marcar_anulado(numero: str):
+def posible_duplicado(cliente: str, fecha: str, total: float, dias: int = 0) -> bool:
     """
-    Marca como 'Anulado' el recibo con ese número en el historial.
-    Si no existe, agrega una fila nueva con Estado = 'Anulado'.
+    True si ya hay un recibo vigente con el mismo (cliente, fecha, total);
+    con dias > 0 acepta fechas hasta esa cantidad de días antes o después.
     """
-    _asegurar_historial()
-    wb = load_workbook(HISTORIAL_XLSX)
-    ws = wb.active
+    return bool(buscar_duplicados(cliente, fecha, total, dias))
 
-    encontrado = False
-    for row in ws.iter_rows(min_row=2):
-        if str(row[0].value) == str(numero):
-            # Columna 6 = 'Estado' (índice 5)
-            row[5].value = "Anulado"
-            encontrado = True
-            break
-
-    if not encontrado:
-        # Si no estaba en el historial, lo agregamos como anulado
-        ws.append([numero, "", "", "", "", "Anulado"])
-
-    wb.save(HISTORIAL_XLSX)
+def marcar_anulado(numero: str, ruta_pdf=None):
+    """
+    Marca como 'Anulado' el recibo con ese número en el libro de recibos
+    (queda el evento en su diario). Si no estaba en el libro, lo agrega ya
+    anulado. La planilla de historial no se toca: se regenera desde el libro
+    (python -m utils.libro_recibos --planilla).
+    """
+    from utils import libro_recibos
+    libro_recibos.anular(numero, ruta_pdf)